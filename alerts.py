@@ -1,42 +1,332 @@
-from twilio.rest import Client
-from database import log_alert
+import atexit
+import heapq
+import itertools
+import queue
+import random
+import threading
+import time
+from database import log_alerts, get_recent_alert_times
 import config
 
-def send_whatsapp_alert(bin_name, location, fill_level, hours_to_overflow=None):
+
+def format_alert_message(bin_name, location, fill_level, hours_to_overflow=None):
+    if hours_to_overflow:
+        return (
+            f"🚨 *WASTE ALERT — SmartWaste AI*\n\n"
+            f"📍 *Location:* {location}\n"
+            f"🗑️ *Bin:* {bin_name}\n"
+            f"📊 *Fill Level:* {fill_level}%\n"
+            f"⏰ *Overflow in:* {hours_to_overflow} hours\n\n"
+            f"⚡ Immediate collection required!"
+        )
+    return (
+        f"⚠️ *WASTE ALERT — SmartWaste AI*\n\n"
+        f"📍 *Location:* {location}\n"
+        f"🗑️ *Bin:* {bin_name}\n"
+        f"📊 *Fill Level:* {fill_level}%\n\n"
+        f"📅 Schedule collection today."
+    )
+
+
+# ─────────────────────────────────────────
+# TRANSPORTS
+# ─────────────────────────────────────────
+class TransportError(Exception):
     """
-    Sends real WhatsApp message to truck driver
-    via Twilio API
+    Send failure; retryable=False for errors a retry cannot fix (bad number, auth)
     """
-    try:
-        client = Client(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN)
-
-        if hours_to_overflow:
-            message_body = (
-                f"🚨 *WASTE ALERT — SmartWaste AI*\n\n"
-                f"📍 *Location:* {location}\n"
-                f"🗑️ *Bin:* {bin_name}\n"
-                f"📊 *Fill Level:* {fill_level}%\n"
-                f"⏰ *Overflow in:* {hours_to_overflow} hours\n\n"
-                f"⚡ Immediate collection required!"
-            )
-        else:
-            message_body = (
-                f"⚠️ *WASTE ALERT — SmartWaste AI*\n\n"
-                f"📍 *Location:* {location}\n"
-                f"🗑️ *Bin:* {bin_name}\n"
-                f"📊 *Fill Level:* {fill_level}%\n\n"
-                f"📅 Schedule collection today."
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class TwilioTransport:
+    """
+    WhatsApp via Twilio, one Client (and its pooled HTTP session) for all sends
+    """
+
+    name = "twilio"
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        with self._lock:
+            if self._client is None:
+                from twilio.rest import Client
+                self._client = Client(config.TWILIO_ACCOUNT_SID, config.TWILIO_AUTH_TOKEN)
+            return self._client
+
+    def send(self, to, body):
+        from twilio.base.exceptions import TwilioRestException
+        try:
+            message = self._get_client().messages.create(
+                body=body,
+                from_=f"whatsapp:{config.TWILIO_WHATSAPP_FROM}",
+                to=f"whatsapp:{to}"
             )
+            return message.sid
+        except TwilioRestException as e:
+            # Rate limited or Twilio-side trouble is worth retrying; the rest is not
+            raise TransportError(str(e), retryable=e.status == 429 or e.status >= 500)
+        except Exception as e:
+            raise TransportError(str(e))
+
+
+class FakeTransport:
+    """
+    Offline transport: records messages instead of sending them
+    fail_first=N makes the first N sends fail (retryable), to exercise retries
+    """
+
+    name = "fake"
+
+    def __init__(self, fail_first=0, latency=0.0):
+        self.sent = []
+        self.attempts = 0
+        self.fail_first = fail_first
+        self.latency = latency
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
 
-        message = client.messages.create(
-            body=message_body,
-            from_=f"whatsapp:{config.TWILIO_WHATSAPP_FROM}",
-            to=f"whatsapp:{config.DRIVER_PHONE_NUMBER}"
+    def send(self, to, body):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.attempts += 1
+            if self.attempts <= self.fail_first:
+                raise TransportError("fake transient failure")
+            sid = f"FAKE{next(self._ids):08d}"
+            self.sent.append({"sid": sid, "to": to, "body": body, "at": time.time()})
+        return sid
+
+
+def make_transport(name=None):
+    name = name or config.ALERT_TRANSPORT
+    if name == "twilio":
+        return TwilioTransport()
+    if name == "fake":
+        return FakeTransport()
+    raise ValueError(f"Unknown alert transport '{name}'")
+
+
+# ─────────────────────────────────────────
+# RATE LIMITING
+# ─────────────────────────────────────────
+class TokenBucket:
+    """
+    rate tokens per second, up to burst stored; reserve() returns how long
+    to wait before the reserved token is available
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+# ─────────────────────────────────────────
+# ALERT DISPATCHER
+# ─────────────────────────────────────────
+class AlertDispatcher:
+    """
+    Request handlers and the pipeline only enqueue(); a small worker pool
+    sends through one shared transport with exponential backoff + full
+    jitter and a token bucket per recipient. A message that has to wait
+    (rate limited, or backing off before a retry) is parked with a
+    not-before time instead of holding a worker; a scheduler thread puts
+    it back on the queue when it is due. Alert rows are written to the
+    database in batches by a separate log writer
+    """
+
+    def __init__(self, transport=None, workers=None, queue_size=None):
+        self.transport = transport or make_transport()
+        self.workers = workers or config.ALERT_WORKERS
+        self.queue = queue.Queue(maxsize=queue_size or config.ALERT_QUEUE_SIZE)
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "retries": 0, "dropped": 0, "logged": 0}
+        self._stats_lock = threading.Lock()
+        self._buckets = {}
+        self._delayed = []
+        self._delayed_ids = itertools.count()
+        self._delayed_ready = threading.Condition()
+        self._log_rows = []
+        self._log_lock = threading.Lock()
+        self._log_ready = threading.Event()
+        self._started = False
+        self._start_lock = threading.Lock()
+
+    def _start(self):
+        with self._start_lock:
+            if self._started:
+                return
+            for i in range(self.workers):
+                threading.Thread(target=self._work, daemon=True, name=f"alert-{i}").start()
+            threading.Thread(target=self._schedule, daemon=True, name="alert-delay").start()
+            threading.Thread(target=self._log_writer, daemon=True, name="alert-log").start()
+            self._started = True
+
+    def enqueue(self, bin_id, bin_name, location, fill_level, hours_to_overflow=None,
+                to=None, log_message=None):
+        """
+        Queues one single-bin alert without blocking; False if the queue is full
+        """
+        return self.enqueue_message(
+            to or config.DRIVER_PHONE_NUMBER,
+            format_alert_message(bin_name, location, fill_level, hours_to_overflow),
+            [(bin_id, log_message or f"Auto alert sent — fill level {fill_level}%")]
         )
 
+    def enqueue_message(self, to, body, log_rows):
+        """
+        Queues a prepared message; log_rows = [(bin_id, log message)] written
+        to the alerts table once it has been sent (or given up on)
+        """
+        self._start()
+        try:
+            self.queue.put_nowait({"to": to, "body": body, "log": log_rows, "attempt": 0, "reserved": False})
+        except queue.Full:
+            self._count("dropped")
+            print(f"[Alerts] Queue full, dropped alert for bins {[row[0] for row in log_rows]}")
+            return False
+        self._count("queued")
+        return True
+
+    def _count(self, name, n=1):
+        with self._stats_lock:
+            self.stats[name] += n
+
+    def _bucket(self, to):
+        bucket = self._buckets.get(to)
+        if bucket is None:
+            bucket = self._buckets.setdefault(
+                to, TokenBucket(config.ALERT_RATE_PER_MINUTE / 60, config.ALERT_BURST)
+            )
+        return bucket
+
+    def _work(self):
+        while True:
+            alert = self.queue.get()
+            try:
+                self._deliver(alert)
+            except Exception as e:
+                print(f"[Alerts Error] {e}")
+            finally:
+                self.queue.task_done()
+
+    def _deliver(self, alert):
+        # One token per message, however many attempts it takes
+        if not alert["reserved"]:
+            alert["reserved"] = True
+            wait = self._bucket(alert["to"]).reserve()
+            if wait:
+                self._delay(alert, wait)
+                return None
+
+        attempt = alert["attempt"]
+        try:
+            sid = self.transport.send(alert["to"], alert["body"])
+            self._count("sent")
+            self._log(alert["log"])
+            return sid
+        except TransportError as e:
+            if not e.retryable or attempt == config.ALERT_MAX_RETRIES:
+                self._count("failed")
+                print(f"[Alerts] Giving up on message to {alert['to']}: {e}")
+                # Logged like before: the alert log records attempts, not deliveries
+                self._log(alert["log"])
+                return None
+            self._count("retries")
+            ceiling = min(config.ALERT_RETRY_MAX_SECONDS, config.ALERT_RETRY_BASE_SECONDS * 2 ** attempt)
+            alert["attempt"] = attempt + 1
+            self._delay(alert, random.uniform(0, ceiling))
+            return None
+
+    # ── delayed messages ──
+    def _delay(self, alert, seconds):
+        with self._delayed_ready:
+            heapq.heappush(self._delayed, (time.monotonic() + seconds, next(self._delayed_ids), alert))
+            self._delayed_ready.notify()
+
+    def _schedule(self):
+        with self._delayed_ready:
+            while True:
+                if not self._delayed or self._delayed[0][0] > time.monotonic():
+                    self._delayed_ready.wait(self._delayed[0][0] - time.monotonic() if self._delayed else None)
+                    continue
+                # Moved under the lock so drain() never sees it in neither place;
+                # already accepted once, so a full queue means retry shortly, not drop
+                try:
+                    self.queue.put_nowait(self._delayed[0][2])
+                except queue.Full:
+                    self._delayed_ready.wait(0.05)
+                    continue
+                heapq.heappop(self._delayed)
+
+    # ── batched alert log ──
+    def _log(self, log_rows):
+        sent_at = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+        with self._log_lock:
+            self._log_rows.extend((bin_id, message, sent_at) for bin_id, message in log_rows)
+            if len(self._log_rows) >= config.ALERT_LOG_BATCH:
+                self._log_ready.set()
+
+    def _log_writer(self):
+        while True:
+            self._log_ready.wait(config.ALERT_LOG_FLUSH_SECONDS)
+            self.flush_log()
+
+    def flush_log(self):
+        with self._log_lock:
+            rows, self._log_rows = self._log_rows, []
+            self._log_ready.clear()
+        if rows:
+            try:
+                log_alerts(rows)
+                self._count("logged", len(rows))
+            except Exception as e:
+                print(f"[Alerts Error] Could not log {len(rows)} alerts: {e}")
+
+    def drain(self, timeout=5.0):
+        """
+        Waits up to timeout for queued alerts to go out, then flushes the log
+        """
+        deadline = time.monotonic() + timeout
+        while (self.queue.unfinished_tasks or self._delayed) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.flush_log()
+
+
+dispatcher = AlertDispatcher()
+atexit.register(dispatcher.drain, 2.0)
+
+
+def send_whatsapp_alert(bin_name, location, fill_level, hours_to_overflow=None):
+    """
+    Sends real WhatsApp message to truck driver
+    synchronously, through the dispatcher's shared transport
+    """
+    try:
+        sid = dispatcher.transport.send(
+            config.DRIVER_PHONE_NUMBER,
+            format_alert_message(bin_name, location, fill_level, hours_to_overflow)
+        )
         return {
             "success": True,
-            "message_sid": message.sid,
+            "message_sid": sid,
             "message": f"Alert sent to driver for {bin_name}"
         }
 
@@ -47,31 +337,188 @@ def send_whatsapp_alert(bin_name, location, fill_level, hours_to_overflow=None):
         }
 
 
-def check_and_alert(bins):
+# ─────────────────────────────────────────
+# ALERT POLICY — suppression + per-driver digests
+# ─────────────────────────────────────────
+def format_digest_message(bins):
     """
-    Automatically checks all bins and sends
+    One message for several bins, most urgent first
+    """
+    lines = []
+    for i, bin in enumerate(bins, 1):
+        line = f"{i}. 🗑️ {bin['name']} — {bin['location']} ({bin['fill_level']}%"
+        if bin.get("hours_to_overflow"):
+            line += f", overflow in {bin['hours_to_overflow']}h"
+        lines.append(line + ")")
+    return (
+        f"🚨 *WASTE ALERT — SmartWaste AI*\n\n"
+        f"🗑️ *{len(bins)} bins need collection:*\n\n"
+        + "\n".join(lines)
+        + "\n\n⚡ Collect in the order listed."
+    )
+
+
+def driver_for(bin_id):
+    for phone, bin_ids in config.DRIVER_ASSIGNMENTS.items():
+        if bin_id in bin_ids:
+            return phone
+    return config.DRIVER_PHONE_NUMBER
+
+
+class AlertPolicy:
+    """
+    Decides which full bins get an alert and batches them
+    - a bin alerted within ALERT_SUPPRESS_MINUTES is skipped; the last alert
+      time per bin is kept in memory, seeded from the alerts table
+    - the map is per process: a bin that is not suppressed here is checked
+      against the alerts table again (at most every ALERT_RESEED_SECONDS) so
+      alerts sent by other workers are seen once they are logged
+    - bins accepted within ALERT_DIGEST_SECONDS of each other are sent to
+      their driver as one digest, highest priority first
+    """
+
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        self.stats = {"accepted": 0, "suppressed": 0, "digests": 0}
+        self._last_alert = None
+        self._seeded = 0
+        self._pending = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+
+    def _load(self, now):
+        # Caller holds self._lock
+        if self._last_alert is None:
+            self._last_alert = {}
+        elif now - self._seeded < config.ALERT_RESEED_SECONDS:
+            return
+        self._seeded = now
+        for bin_id, sent in get_recent_alert_times(config.ALERT_SUPPRESS_MINUTES).items():
+            if sent > self._last_alert.get(bin_id, 0):
+                self._last_alert[bin_id] = sent
+
+    def _suppressed(self, bin_id, now):
+        last = self._last_alert.get(bin_id)
+        return last is not None and now - last < config.ALERT_SUPPRESS_MINUTES * 60
+
+    def submit(self, bin_id, name, location, fill_level, hours_to_overflow=None,
+               log_message=None, force=False):
+        """
+        Returns True if the bin was added to a digest, False if suppressed
+        force=True ignores the suppression window (manual alerts)
+        """
+        now = time.time()
+        to = driver_for(bin_id)
+        with self._lock:
+            if self._last_alert is None:
+                self._load(now)
+            if not force and self._suppressed(bin_id, now):
+                self.stats["suppressed"] += 1
+                return False
+            # A miss may be stale: another process could have alerted since the last seed
+            if not force:
+                self._load(now)
+                if self._suppressed(bin_id, now):
+                    self.stats["suppressed"] += 1
+                    return False
+            self._last_alert[bin_id] = now
+            self.stats["accepted"] += 1
+
+            self._pending.setdefault(to, {})[bin_id] = {
+                "bin_id": bin_id,
+                "name": name,
+                "location": location,
+                "fill_level": fill_level,
+                "hours_to_overflow": hours_to_overflow,
+                "log": log_message or f"Auto alert sent — fill level {fill_level}%"
+            }
+            if config.ALERT_DIGEST_SECONDS > 0 and to not in self._timers:
+                timer = threading.Timer(config.ALERT_DIGEST_SECONDS, self.flush, args=(to,))
+                timer.daemon = True
+                self._timers[to] = timer
+                timer.start()
+
+        if config.ALERT_DIGEST_SECONDS <= 0:
+            self.flush(to)
+        return True
+
+    def flush(self, to=None):
+        """
+        Sends pending digests now (one driver, or all)
+        """
+        with self._lock:
+            drivers = [to] if to is not None else list(self._pending)
+            batches = []
+            for driver in drivers:
+                timer = self._timers.pop(driver, None)
+                if timer is not None:
+                    timer.cancel()
+                pending = self._pending.pop(driver, None)
+                if pending:
+                    batches.append((driver, list(pending.values())))
+
+        for driver, bins in batches:
+            bins.sort(key=lambda b: (b["hours_to_overflow"] is None, b["hours_to_overflow"] or 0, -b["fill_level"]))
+            if len(bins) == 1:
+                bin = bins[0]
+                body = format_alert_message(bin["name"], bin["location"], bin["fill_level"], bin["hours_to_overflow"])
+            else:
+                body = format_digest_message(bins)
+            self.dispatcher.enqueue_message(driver, body, [(b["bin_id"], b["log"]) for b in bins])
+            with self._lock:
+                self.stats["digests"] += 1
+
+    def reset(self):
+        with self._lock:
+            self._last_alert = None
+            self._seeded = 0
+
+
+policy = AlertPolicy(dispatcher)
+atexit.register(policy.flush)
+
+
+def hours_to_overflow(bin_ids):
+    """
+    {bin_id: estimated hours to overflow} for bins with a known fill rate
+    Used to put the most urgent bins first in a digest; a failed
+    prediction just leaves the order to fill level
+    """
+    if not bin_ids:
+        return {}
+    try:
+        from predictor import predict_from_estimates
+        predictions = predict_from_estimates(bin_ids)
+    except Exception as e:
+        print(f"[Alerts Error] Overflow estimate: {e}")
+        return {}
+    return {p["bin_id"]: p["hours_to_overflow"] for p in predictions if p.get("hours_to_overflow") is not None}
+
+
+def check_and_alert(bins, force=False):
+    """
+    Automatically checks all bins and queues
     alerts for any above 80% fill level
+    Bins alerted recently are skipped unless force=True
     """
-    alerts_sent = []
+    alerts_queued = []
+    full = [bin for bin in bins if bin[5] >= config.FILL_THRESHOLD]
+    overflow = hours_to_overflow([bin[0] for bin in full])
 
-    for bin in bins:
+    for bin in full:
         bin_id = bin[0]
         name = bin[1]
         location = bin[2]
         fill_level = bin[5]
 
-        if fill_level >= 80:
-            result = send_whatsapp_alert(
-                bin_name=name,
-                location=location,
-                fill_level=fill_level
-            )
-
-            log_alert(bin_id, f"Auto alert sent — fill level {fill_level}%")
-            alerts_sent.append({
+        if policy.submit(bin_id, name, location, fill_level,
+                         hours_to_overflow=overflow.get(bin_id), force=force):
+            alerts_queued.append({
                 "bin": name,
                 "fill_level": fill_level,
-                "alert_result": result
+                "alert_result": {"queued": True}
             })
 
-    return alerts_sent
\ No newline at end of file
+    if force:
+        policy.flush()
+    return alerts_queued
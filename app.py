@@ -1,20 +1,73 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, url_for, redirect
 from flask_cors import CORS
-from database import init_db, get_all_bins, update_fill_level
-from detector import analyze_bin_image
-from optimizer import optimize_route
+import hashlib
+import config
+from database import init_db, get_all_bins, update_fill_level, ingest_readings, get_data_version, get_ingest_stats
+from detector import analyze_bin_image, analyze_bin_images, cache_stats, ImageTooLarge
+from jobs import job_manager, job_key, JobQueueFull, UnknownJobType
+from optimizer import optimize_route, optimize_fleet, optimize_city, fast_route, get_refined_route
 from predictor import predict_all_bins
-from alerts import check_and_alert
-from pathway_pipeline import start_pipeline_thread
+from alerts import check_and_alert, dispatcher, policy
+from pathway_pipeline import start_pipeline_thread, get_pipeline_status
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize database on startup
-init_db()
+def start_background():
+    """
+    Stands for election: the one elected process runs the real-time
+    pipeline and the history retention job
+    """
+    start_pipeline_thread()
+
+
+def warm_up():
+    """
+    Imports the heavy modules the detector, optimizer and alerts load on
+    first use. gunicorn.conf.py calls this in the master when the app is
+    preloaded, so forked workers share them instead of each paying for them
+    """
+    import cv2
+    from ortools.constraint_solver import pywrapcp
+    if config.ALERT_TRANSPORT == "twilio":
+        from twilio.rest import Client
+
+
+# Process-pool workers (spawn) re-run `python app.py`'s top level as __mp_main__;
+# they only need the functions, not a database init or a pipeline candidate
+if __name__ != "__mp_main__":
+    # Initialize database on startup
+    init_db()
+
+    # Under gunicorn, workers call start_background() after fork instead (gunicorn.conf.py)
+    if config.START_BACKGROUND_ON_IMPORT:
+        start_background()
+
+# Rendered JSON bodies of read endpoints, keyed by endpoint -> (data version, body)
+_response_cache = {}
+
+
+def cached_json(key, build):
+    """
+    Serves build()'s JSON from cache until the data version changes
+    A matching If-None-Match gets a 304 without touching the database
+    """
+    version = get_data_version()
+    etag = f"{key}-{version}"
+
+    if etag in request.if_none_match:
+        response = app.response_class(status=304)
+    else:
+        cached = _response_cache.get(key)
+        if cached is None or cached[0] != version:
+            cached = (version, app.json.dumps(build()))
+            _response_cache[key] = cached
+        response = app.response_class(cached[1], mimetype="application/json")
+
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
-# Start Pathway real-time pipeline
-start_pipeline_thread()
 
 # ─────────────────────────────────────────
 # MAIN DASHBOARD
@@ -29,6 +82,10 @@ def index():
 # ─────────────────────────────────────────
 @app.route("/api/bins", methods=["GET"])
 def get_bins():
+    return cached_json("bins", build_bins)
+
+
+def build_bins():
     bins = get_all_bins()
     result = []
     for bin in bins:
@@ -41,7 +98,22 @@ def get_bins():
             "fill_level": bin[5],
             "last_updated": bin[6]
         })
-    return jsonify(result)
+    return result
+
+
+# ─────────────────────────────────────────
+# LIVE CHANGE STREAM
+# ─────────────────────────────────────────
+@app.route("/api/stream", methods=["GET"])
+def stream():
+    # Long-lived SSE connections would pin a sync worker each, so the stream
+    # is served by the asyncio gateway; 503 makes the dashboard poll instead
+    if not config.STREAM_URL:
+        return jsonify({"error": "Change stream not configured"}), 503
+    target = config.STREAM_URL
+    if request.query_string:
+        target += ("&" if "?" in target else "?") + request.query_string.decode()
+    return redirect(target, code=307)
 
 
 # ─────────────────────────────────────────
@@ -60,7 +132,10 @@ def detect():
     image_bytes = image.read()
 
     # Analyze image
-    result = analyze_bin_image(image_bytes)
+    try:
+        result = analyze_bin_image(image_bytes)
+    except ImageTooLarge as e:
+        return jsonify({"error": str(e)}), 413
 
     # Update database
     update_fill_level(int(bin_id), result["fill_level"])
@@ -79,6 +154,14 @@ def detect():
     })
 
 
+# ─────────────────────────────────────────
+# DETECTION CACHE STATS
+# ─────────────────────────────────────────
+@app.route("/api/detect/cache", methods=["GET"])
+def detect_cache():
+    return jsonify(cache_stats())
+
+
 # ─────────────────────────────────────────
 # MANUAL UPDATE FILL LEVEL
 # ─────────────────────────────────────────
@@ -104,11 +187,62 @@ def update():
     })
 
 
+# ─────────────────────────────────────────
+# BATCH UPDATE FILL LEVELS
+# ─────────────────────────────────────────
+@app.route("/api/update/batch", methods=["POST"])
+def update_batch():
+    data = request.get_json(silent=True)
+    readings = data.get("readings") if isinstance(data, dict) else data
+
+    if not isinstance(readings, list) or not readings:
+        return jsonify({"error": "Expected a non-empty readings list"}), 400
+
+    try:
+        rows = [(int(r["bin_id"]), float(r["fill_level"])) for r in readings]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Each reading needs a numeric bin_id and fill_level"}), 400
+
+    over_threshold = ingest_readings(rows)
+
+    # Send alerts once for the whole batch
+    if over_threshold:
+        check_and_alert(get_all_bins())
+
+    return jsonify({
+        "success": True,
+        "readings": len(rows),
+        "over_threshold": over_threshold
+    })
+
+
+# ─────────────────────────────────────────
+# HISTORY WRITE SAVINGS (deadband)
+# ─────────────────────────────────────────
+@app.route("/api/ingest/stats", methods=["GET"])
+def ingest_stats():
+    return jsonify(get_ingest_stats())
+
+
 # ─────────────────────────────────────────
 # OPTIMIZE ROUTE
 # ─────────────────────────────────────────
 @app.route("/api/optimize", methods=["GET"])
 def optimize():
+    return jsonify(run_optimize(optimize_params(request.args)))
+
+
+def optimize_params(args):
+    return {
+        "mode": args.get("mode"),
+        "vehicles": args.get("vehicles", type=int),
+        "capacity": args.get("capacity", type=int),
+        "shift_minutes": args.get("shift_minutes", type=int),
+        "clusters": args.get("clusters", type=int)
+    }
+
+
+def run_optimize(params):
     bins = get_all_bins()
     bin_list = []
     for bin in bins:
@@ -121,8 +255,27 @@ def optimize():
             "fill_level": bin[5]
         })
 
-    result = optimize_route(bin_list)
-    return jsonify(result)
+    # Any fleet parameter switches to capacitated multi-truck routing
+    mode = params.get("mode")
+    vehicles = params.get("vehicles")
+    capacity = params.get("capacity")
+    shift = params.get("shift_minutes")
+    if mode == "city":
+        return optimize_city(bin_list, clusters=params.get("clusters"), vehicles=vehicles,
+                             capacity=capacity, shift_minutes=shift)
+    if mode == "fleet" or vehicles or capacity or shift:
+        return optimize_fleet(bin_list, vehicles=vehicles, capacity=capacity, shift_minutes=shift)
+    if mode == "fast":
+        return fast_route(bin_list)
+    return optimize_route(bin_list)
+
+
+@app.route("/api/optimize/jobs/<job_id>", methods=["GET"])
+def optimize_job(job_id):
+    job = get_refined_route(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job)
 
 
 # ─────────────────────────────────────────
@@ -130,10 +283,88 @@ def optimize():
 # ─────────────────────────────────────────
 @app.route("/api/predict", methods=["GET"])
 def predict():
+    return cached_json("predict", build_predictions)
+
+
+def build_predictions():
     bins = get_all_bins()
     bin_ids = [bin[0] for bin in bins]
-    predictions = predict_all_bins(bin_ids)
-    return jsonify(predictions)
+    return predict_all_bins(bin_ids)
+
+
+# ─────────────────────────────────────────
+# BACKGROUND JOBS — submit, then poll / long-poll
+# ─────────────────────────────────────────
+def run_detect_batch(items):
+    """
+    items = [(bin_id, image bytes)]; analyzes all images and ingests the levels
+    """
+    results = analyze_bin_images([image_bytes for _, image_bytes in items])
+    over_threshold = ingest_readings([(bin_id, r["fill_level"]) for (bin_id, _), r in zip(items, results)])
+    if over_threshold:
+        check_and_alert(get_all_bins())
+    return [dict(r, bin_id=bin_id) for (bin_id, _), r in zip(items, results)]
+
+
+job_manager.register("optimize", run_optimize, limit=config.JOB_LIMIT_OPTIMIZE)
+job_manager.register("predict", build_predictions, limit=config.JOB_LIMIT_PREDICT)
+job_manager.register("detect", run_detect_batch, limit=config.JOB_LIMIT_DETECT)
+
+
+@app.route("/api/jobs/<job_type>", methods=["POST"])
+def submit_job(job_type):
+    # Results depend on the data, so identical requests only share a job within one data version
+    version = get_data_version()
+
+    if job_type == "optimize":
+        params = optimize_params(request.args)
+        body = request.get_json(silent=True)
+        if isinstance(body, dict):
+            params.update({k: body[k] for k in params if body.get(k) is not None})
+        args, key = (params,), job_key(params, version)
+    elif job_type == "predict":
+        args, key = (), job_key(version)
+    elif job_type == "detect":
+        images = request.files.getlist("image")
+        bin_ids = request.form.getlist("bin_id")
+        if not images or len(images) != len(bin_ids):
+            return jsonify({"error": "Send one bin_id per image"}), 400
+        try:
+            items = [(int(bin_id), image.read()) for bin_id, image in zip(bin_ids, images)]
+        except ValueError:
+            return jsonify({"error": "bin_id must be an integer"}), 400
+        args = (items,)
+        key = job_key([(bin_id, hashlib.sha1(data).hexdigest()) for bin_id, data in items], version)
+    else:
+        return jsonify({"error": f"Unknown job type '{job_type}'"}), 404
+
+    try:
+        job, deduplicated = job_manager.submit(job_type, *args, key=key)
+    except JobQueueFull as e:
+        response = jsonify({"error": f"Job queue full: {e}"})
+        response.headers["Retry-After"] = "5"
+        return response, 503
+    except UnknownJobType:
+        return jsonify({"error": f"Unknown job type '{job_type}'"}), 404
+
+    response = jsonify(dict(job.as_dict(), deduplicated=deduplicated))
+    response.headers["Location"] = url_for("get_job", job_id=job.id)
+    return response, 202
+
+
+@app.route("/api/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    # ?wait=N long-polls up to N seconds (capped) for the job to finish
+    wait = min(request.args.get("wait", 0, type=float), config.JOB_MAX_WAIT_SECONDS)
+    job = job_manager.wait(job_id, wait)
+    if job is None:
+        return jsonify({"error": "Unknown or expired job"}), 404
+    return jsonify(job.as_dict())
+
+
+@app.route("/api/jobs", methods=["GET"])
+def job_stats():
+    return jsonify(job_manager.stats())
 
 
 # ─────────────────────────────────────────
@@ -142,7 +373,8 @@ def predict():
 @app.route("/api/alert", methods=["POST"])
 def alert():
     bins = get_all_bins()
-    results = check_and_alert(bins)
+    # Manual trigger: ignore the suppression window and send right away
+    results = check_and_alert(bins, force=True)
     return jsonify({
         "success": True,
         "alerts_sent": len(results),
@@ -150,17 +382,18 @@ def alert():
     })
 
 
+@app.route("/api/alert/stats", methods=["GET"])
+def alert_stats():
+    return jsonify(dict(dispatcher.stats, transport=dispatcher.transport.name,
+                        pending=dispatcher.queue.qsize(), policy=policy.stats))
+
+
 # ─────────────────────────────────────────
 # PATHWAY PIPELINE STATUS
 # ─────────────────────────────────────────
 @app.route("/api/pipeline/status", methods=["GET"])
 def pipeline_status():
-    return jsonify({
-        "status": "RUNNING",
-        "message": "Pathway real-time pipeline is active",
-        "update_interval": "10 seconds",
-        "bins_monitored": 6
-    })
+    return jsonify(get_pipeline_status())
 
 
 if __name__ == "__main__":
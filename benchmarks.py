@@ -0,0 +1,349 @@
+import argparse
+import math
+import os
+import random
+import tempfile
+import time
+
+import config
+import database
+
+
+# ─────────────────────────────────────────
+# SYNTHETIC FLEET
+# ─────────────────────────────────────────
+def use_temp_db():
+    """
+    Points database.py at a throwaway file so benchmarks never touch real data
+    """
+    path = os.path.join(tempfile.mkdtemp(prefix="smartwaste-bench-"), "waste.db")
+    database.DB_PATH = path
+    database.init_db()
+    return path
+
+
+def seed_fleet(n_bins, readings_per_bin=20, seed=42):
+    """
+    Adds bins around Noida with `readings_per_bin` rows of history each
+    """
+    rng = random.Random(seed)
+    bins = []
+    history = []
+    for bin_id in range(7, n_bins + 1):
+        bins.append((
+            bin_id, f"Bin {bin_id}", f"Synthetic {bin_id}",
+            28.50 + rng.random() * 0.15, 77.28 + rng.random() * 0.12,
+            rng.uniform(0, 100)
+        ))
+    for bin_id in range(1, n_bins + 1):
+        level = rng.uniform(0, 40)
+        for i in range(readings_per_bin):
+            level = min(100, level + rng.uniform(0, 3))
+            history.append((bin_id, round(level, 2), f"-{(readings_per_bin - i) * 10} minutes"))
+
+    with database.transaction() as cursor:
+        cursor.executemany(
+            "INSERT INTO bins (id, name, location, latitude, longitude, fill_level) VALUES (?,?,?,?,?,?)",
+            bins
+        )
+        cursor.executemany(
+            "INSERT INTO fill_history (bin_id, fill_level, recorded_at) VALUES (?,?,datetime('now', ?))",
+            history
+        )
+    database.refresh_live_state()
+
+
+def timed(label, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<40} {elapsed * 1000:10.1f} ms")
+    return result, elapsed
+
+
+# ─────────────────────────────────────────
+# PREDICTION
+# ─────────────────────────────────────────
+def bench_predict(n_bins):
+    from predictor import predict_overflow, predict_fleet, predict_all_bins
+
+    use_temp_db()
+    seed_fleet(n_bins)
+    bin_ids = [row[0] for row in database.get_all_bins()]
+    print(f"Prediction — {len(bin_ids)} bins x 20 readings")
+
+    def per_bin():
+        results = [predict_overflow(bin_id) for bin_id in bin_ids]
+        results.sort(key=lambda x: x.get("hours_to_overflow") or 9999)
+        return results
+
+    def whole_fleet():
+        results = predict_fleet(bin_ids)
+        results.sort(key=lambda x: x.get("hours_to_overflow") or 9999)
+        return results
+
+    baseline, t_loop = timed("predict_overflow per bin", per_bin)
+    fleet, t_fleet = timed("predict_fleet (history)", whole_fleet)
+
+    print(f"  speedup x{t_loop / t_fleet:.1f}, identical results: {baseline == fleet}")
+
+    # Two ingest rounds give every bin an online estimate
+    for _ in range(2):
+        database.ingest_readings([(bin_id, 50) for bin_id in bin_ids])
+    timed("predict_all_bins (online estimates)", predict_all_bins, bin_ids)
+
+
+# ─────────────────────────────────────────
+# ROUTING: MONOLITHIC VS DECOMPOSED
+# ─────────────────────────────────────────
+def synthetic_bins(n_bins, seed=7):
+    rng = random.Random(seed)
+    return [{
+        "id": bin_id,
+        "name": f"Bin {bin_id}",
+        "location": f"Synthetic {bin_id}",
+        "latitude": 28.45 + rng.random() * 0.25,
+        "longitude": 77.25 + rng.random() * 0.20,
+        "fill_level": rng.uniform(70, 100)
+    } for bin_id in range(1, n_bins + 1)]
+
+
+def bench_optimize(n_bins, clusters=None):
+    from optimizer import optimize_fleet, optimize_city
+
+    use_temp_db()
+    bins = synthetic_bins(n_bins)
+    # Same fleet for both: enough trucks to carry every bin
+    vehicles = math.ceil(sum(round(b["fill_level"]) for b in bins) / config.TRUCK_CAPACITY)
+    print(f"Routing — {n_bins} bins over threshold, {vehicles} trucks")
+
+    mono, t_mono = timed("optimize_fleet (monolithic)", optimize_fleet, bins, vehicles=vehicles)
+    city, t_city = timed("optimize_city (decomposed)", optimize_city, bins, clusters=clusters, vehicles=vehicles)
+
+    for label, result in (("monolithic", mono), ("decomposed", city)):
+        print(f"  {label:<12} {result['status']:<8} trucks={len(result['routes']):<4} "
+              f"served={result.get('total_bins_in_route', 0):<6} dropped={len(result.get('dropped', [])):<5} "
+              f"distance={result['total_distance_km']} km")
+    print(f"  decomposed stages: {city.get('timings')}")
+    print(f"  speedup x{t_mono / t_city:.1f}")
+
+
+# ─────────────────────────────────────────
+# HISTORY DEADBAND
+# ─────────────────────────────────────────
+def bench_deadband(n_bins, minutes):
+    from predictor import predict_fleet
+
+    rng = random.Random(3)
+    start = time.time() - minutes * 60
+    true_rate = {}
+    series = {}
+    for bin_id in range(1, n_bins + 1):
+        # Noisy sensors over a steady fill; a quarter of the bins sit full at 100
+        rate = rng.uniform(0.5, 4.0) / 60
+        level = 100.0 if bin_id % 4 == 0 else rng.uniform(0, 40)
+        true_rate[bin_id] = 0.0 if level >= 100 else rate * 60
+        points = []
+        for minute in range(minutes):
+            level = min(100.0, level + rate) if level < 100 else 100.0
+            points.append((start + minute * 60, round(min(100.0, max(0.0, level + rng.gauss(0, 0.15))), 2)))
+        series[bin_id] = points
+
+    def history_rows(compress):
+        rows = []
+        for bin_id, points in series.items():
+            watermarks = {}
+            for ts, level in points:
+                if compress:
+                    kept, stored = database._deadband([(bin_id, level, None)], watermarks, ts)
+                    if not kept:
+                        continue
+                    watermarks[bin_id] = (stored[bin_id], ts, None)
+                rows.append((bin_id, level, time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts))))
+        return rows
+
+    print(f"Deadband — {n_bins} bins x {minutes} readings (1/min), "
+          f"tolerance {config.HISTORY_DEADBAND}, max interval {config.HISTORY_MAX_INTERVAL_MINUTES} min")
+    results = {}
+    for label, compress in (("every reading", False), ("deadband", True)):
+        use_temp_db()
+        seed_fleet(n_bins, readings_per_bin=0)
+        rows = history_rows(compress)
+        with database.transaction() as cursor:
+            cursor.executemany("INSERT INTO fill_history (bin_id, fill_level, recorded_at) VALUES (?,?,?)", rows)
+        predictions = {p["bin_id"]: p for p in predict_fleet(list(series))}
+        errors = [abs((predictions[b].get("fill_rate_per_hour") or 0) - true_rate[b]) for b in series]
+        results[label] = len(rows)
+        print(f"  {label:<14} rows={len(rows):<8} mean |rate error|={sum(errors) / len(errors):.3f} %/h")
+
+    saving = 100 * (1 - results["deadband"] / results["every reading"])
+    print(f"  history writes saved: {saving:.1f}%")
+
+
+# ─────────────────────────────────────────
+# SENSOR GATEWAY THROUGHPUT
+# ─────────────────────────────────────────
+def bench_gateway(n_readings, n_bins, batch):
+    import asyncio
+    import json
+    import socket
+    import threading
+    from gateway import SensorGateway
+
+    use_temp_db()
+    seed_fleet(n_bins, readings_per_bin=1)
+    rng = random.Random(1)
+    lines = [json.dumps({"bin_id": rng.randint(1, n_bins), "fill_level": round(rng.uniform(0, 79), 1)}).encode()
+             for _ in range(n_readings)]
+
+    gateway = SensorGateway(host="127.0.0.1", http_port=0, tcp_port=0)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    def serve():
+        asyncio.set_event_loop(loop)
+        loop.run_until_complete(gateway.start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=serve, daemon=True).start()
+    ready.wait()
+    print(f"Gateway — {n_readings} readings over {n_bins} bins, {batch} per request")
+
+    def post_all():
+        conn = socket.create_connection(("127.0.0.1", gateway.http_port))
+        stream = conn.makefile("rb")
+        for i in range(0, len(lines), batch):
+            body = b"\n".join(lines[i:i + batch])
+            conn.sendall(b"POST /ingest HTTP/1.1\r\nHost: bench\r\nContent-Length: %d\r\n\r\n%s" % (len(body), body))
+            length = 0
+            while True:
+                header = stream.readline()
+                if header.lower().startswith(b"content-length:"):
+                    length = int(header.split(b":")[1])
+                if header in (b"\r\n", b""):
+                    break
+            stream.read(length)
+        conn.close()
+
+    def send_tcp():
+        conn = socket.create_connection(("127.0.0.1", gateway.tcp_port))
+        conn.sendall(b"\n".join(lines) + b"\n")
+        conn.close()
+
+    _, t_http = timed("HTTP NDJSON (keep-alive)", post_all)
+    _, t_tcp = timed("raw TCP NDJSON (send only)", send_tcp)
+    asyncio.run_coroutine_threadsafe(asyncio.sleep(1), loop).result()
+    asyncio.run_coroutine_threadsafe(gateway.stop(), loop).result()
+
+    stats = gateway.buffer.stats
+    print(f"  HTTP {n_readings / t_http:,.0f} readings/s")
+    print(f"  accepted={stats['accepted']} coalesced={stats['coalesced']} "
+          f"flushed={stats['flushed']} rows in {stats['flushes']} flushes")
+
+
+# ─────────────────────────────────────────
+# WORKER COLD START
+# ─────────────────────────────────────────
+IMPORT_PROBE = """
+import sys, time
+t0 = time.perf_counter()
+import database
+database.DB_PATH = {path!r}
+import app
+t1 = time.perf_counter()
+if {warm}:
+    app.warm_up()
+t2 = time.perf_counter()
+heavy = [m for m in ("cv2", "ortools", "twilio", "PIL") if m in sys.modules]
+print(t1 - t0, t2 - t1, ",".join(heavy) or "-")
+"""
+
+
+def _import_app(path, warm, importtime=False):
+    """
+    Imports the app in a fresh interpreter, as a gunicorn worker boot does
+    Returns (import seconds, warm-up seconds, heavy modules loaded, -X importtime report)
+    """
+    import subprocess
+    import sys
+
+    cmd = [sys.executable] + (["-X", "importtime"] if importtime else [])
+    cmd += ["-c", IMPORT_PROBE.format(path=path, warm=warm)]
+    env = dict(os.environ, START_BACKGROUND_ON_IMPORT="0")
+    proc = subprocess.run(cmd, capture_output=True, text=True, env=env,
+                          cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    t_import, t_warm, heavy = proc.stdout.strip().splitlines()[-1].split(" ")
+    return float(t_import), float(t_warm), heavy, proc.stderr
+
+
+def _top_imports(report, limit):
+    """
+    Top-level and first-level modules from a -X importtime report, slowest first
+    """
+    rows = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth <= 1:
+            rows.append((int(cumulative), name.rstrip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def bench_importtime(runs, top):
+    path = use_temp_db()
+    print(f"Worker cold start — import app in a fresh interpreter, median of {runs}")
+    _import_app(path, False)  # warm the OS file cache
+
+    results = {}
+    for label, warm in (("lazy (import app)", False), ("eager (import app + warm_up)", True)):
+        samples = sorted(_import_app(path, warm)[:3] for _ in range(runs))
+        t_import, t_warm, heavy = samples[len(samples) // 2]
+        results[warm] = t_import + t_warm
+        print(f"  {label:<40} {(t_import + t_warm) * 1000:10.1f} ms   heavy modules: {heavy}")
+    print(f"  cold start saved by lazy imports      {(results[True] - results[False]) * 1000:10.1f} ms"
+          f" ({(1 - results[False] / results[True]) * 100:.0f}%)")
+
+    for label, warm in (("lazy", False), ("eager", True)):
+        print(f"\n  -X importtime, {label}: slowest imports (cumulative)")
+        for cumulative, name in _top_imports(_import_app(path, warm, importtime=True)[3], top):
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="SmartWaste AI benchmarks")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    predict = sub.add_parser("predict", help="per-bin vs fleet overflow prediction")
+    predict.add_argument("--bins", type=int, default=10000)
+
+    optimize = sub.add_parser("optimize", help="monolithic vs clustered CVRP")
+    optimize.add_argument("--bins", type=int, default=1000)
+    optimize.add_argument("--clusters", type=int, default=None)
+
+    gateway = sub.add_parser("gateway", help="asyncio ingestion gateway throughput")
+    gateway.add_argument("--readings", type=int, default=200000)
+    gateway.add_argument("--bins", type=int, default=5000)
+    gateway.add_argument("--batch", type=int, default=1000)
+
+    deadband = sub.add_parser("deadband", help="fill_history write savings and prediction error")
+    deadband.add_argument("--bins", type=int, default=500)
+    deadband.add_argument("--minutes", type=int, default=240)
+
+    importtime = sub.add_parser("importtime", help="worker cold-start time with lazy vs eager heavy imports")
+    importtime.add_argument("--runs", type=int, default=5)
+    importtime.add_argument("--top", type=int, default=12)
+
+    args = parser.parse_args()
+    if args.bench == "predict":
+        bench_predict(args.bins)
+    elif args.bench == "optimize":
+        bench_optimize(args.bins, args.clusters)
+    elif args.bench == "deadband":
+        bench_deadband(args.bins, args.minutes)
+    elif args.bench == "gateway":
+        bench_gateway(args.readings, args.bins, args.batch)
+    elif args.bench == "importtime":
+        bench_importtime(args.runs, args.top)
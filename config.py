@@ -1,3 +1,4 @@
+import json
 import os
 
 TWILIO_ACCOUNT_SID = os.environ.get("TWILIO_ACCOUNT_SID", "")
@@ -6,4 +7,131 @@ TWILIO_WHATSAPP_FROM = os.environ.get("TWILIO_WHATSAPP_FROM", "")
 DRIVER_PHONE_NUMBER = os.environ.get("DRIVER_PHONE_NUMBER", "")
 DEBUG = False
 FILL_THRESHOLD = 80
-COLLECTION_THRESHOLD = 70
\ No newline at end of file
+COLLECTION_THRESHOLD = 70
+
+# Detector batch scoring
+DETECT_POOL_WORKERS = int(os.environ.get("DETECT_POOL_WORKERS", os.cpu_count() or 1))
+DETECT_POOL_MIN_BATCH = 4
+
+# Detector input limits
+DETECT_FAST_DECODE = os.environ.get("DETECT_FAST_DECODE", "1") == "1"
+DETECT_MAX_UPLOAD_BYTES = int(os.environ.get("DETECT_MAX_UPLOAD_BYTES", 20 * 1024 * 1024))
+DETECT_MAX_PIXELS = int(os.environ.get("DETECT_MAX_PIXELS", 50_000_000))
+
+# Detector result cache
+DETECT_CACHE_MAX_ENTRIES = int(os.environ.get("DETECT_CACHE_MAX_ENTRIES", 1024))
+DETECT_CACHE_MAX_BYTES = int(os.environ.get("DETECT_CACHE_MAX_BYTES", 1024 * 1024))
+DETECT_CACHE_PERSIST = os.environ.get("DETECT_CACHE_PERSIST", "0") == "1"
+
+# Camera / video ingestion
+VIDEO_FRAME_SKIP = int(os.environ.get("VIDEO_FRAME_SKIP", 25))
+VIDEO_SMOOTHING_WINDOW = int(os.environ.get("VIDEO_SMOOTHING_WINDOW", 5))
+VIDEO_MIN_CHANGE = float(os.environ.get("VIDEO_MIN_CHANGE", 2.0))
+VIDEO_QUEUE_SIZE = int(os.environ.get("VIDEO_QUEUE_SIZE", 2))
+VIDEO_WORKERS = int(os.environ.get("VIDEO_WORKERS", os.cpu_count() or 1))
+
+# SQLite connection tuning
+DB_BUSY_TIMEOUT_MS = int(os.environ.get("DB_BUSY_TIMEOUT_MS", 5000))
+DB_SYNCHRONOUS = os.environ.get("DB_SYNCHRONOUS", "NORMAL")
+DB_CACHED_STATEMENTS = 256
+
+# History retention / rollup
+HISTORY_RAW_RETENTION_HOURS = int(os.environ.get("HISTORY_RAW_RETENTION_HOURS", 48))
+HISTORY_HOURLY_RETENTION_DAYS = int(os.environ.get("HISTORY_HOURLY_RETENTION_DAYS", 30))
+HISTORY_DAILY_RETENTION_DAYS = int(os.environ.get("HISTORY_DAILY_RETENTION_DAYS", 0))
+ALERT_RETENTION_DAYS = int(os.environ.get("ALERT_RETENTION_DAYS", 90))
+RETENTION_INTERVAL_MINUTES = int(os.environ.get("RETENTION_INTERVAL_MINUTES", 60))
+
+# Deadband compression of fill_history: write a reading only if it moved more
+# than HISTORY_DEADBAND points (negative = write all) or the interval passed
+HISTORY_DEADBAND = float(os.environ.get("HISTORY_DEADBAND", 0.5))
+HISTORY_MAX_INTERVAL_MINUTES = float(os.environ.get("HISTORY_MAX_INTERVAL_MINUTES", 30))
+
+# Online fill-rate estimator
+ESTIMATOR_HALF_LIFE_HOURS = float(os.environ.get("ESTIMATOR_HALF_LIFE_HOURS", 2.0))
+EMPTYING_DROP = float(os.environ.get("EMPTYING_DROP", 20.0))
+
+# Route optimization
+SOLVER_MIN_SECONDS = float(os.environ.get("SOLVER_MIN_SECONDS", 2))
+SOLVER_SECONDS_PER_NODE = float(os.environ.get("SOLVER_SECONDS_PER_NODE", 0.05))
+SOLVER_MAX_SECONDS = float(os.environ.get("SOLVER_MAX_SECONDS", 60))
+FLEET_VEHICLES = int(os.environ.get("FLEET_VEHICLES", 3))
+TRUCK_CAPACITY = int(os.environ.get("TRUCK_CAPACITY", 800))
+TRUCK_SPEED_KMH = float(os.environ.get("TRUCK_SPEED_KMH", 20))
+BIN_SERVICE_MINUTES = float(os.environ.get("BIN_SERVICE_MINUTES", 4))
+SHIFT_MAX_MINUTES = int(os.environ.get("SHIFT_MAX_MINUTES", 480))
+FAST_ROUTE_BUDGET_MS = int(os.environ.get("FAST_ROUTE_BUDGET_MS", 150))
+FAST_ROUTE_NN_MAX_NODES = int(os.environ.get("FAST_ROUTE_NN_MAX_NODES", 1500))
+SOLUTION_CACHE_SIZE = int(os.environ.get("SOLUTION_CACHE_SIZE", 64))
+WARM_START_MAX_CHANGES = int(os.environ.get("WARM_START_MAX_CHANGES", 10))
+WARM_START_TIME_FRACTION = float(os.environ.get("WARM_START_TIME_FRACTION", 0.3))
+CITY_CLUSTER_SIZE = int(os.environ.get("CITY_CLUSTER_SIZE", 150))
+CITY_WORKERS = int(os.environ.get("CITY_WORKERS", os.cpu_count() or 1))
+
+# Background jobs (optimize / predict / batch detect / route refinement)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", 600))
+JOB_MAX_PENDING = int(os.environ.get("JOB_MAX_PENDING", 64))
+JOB_MAX_WAIT_SECONDS = float(os.environ.get("JOB_MAX_WAIT_SECONDS", 25))
+# How often a long-poll re-reads a job that another worker is running
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", 0.25))
+JOB_LIMIT_OPTIMIZE = int(os.environ.get("JOB_LIMIT_OPTIMIZE", 1))
+JOB_LIMIT_PREDICT = int(os.environ.get("JOB_LIMIT_PREDICT", 2))
+JOB_LIMIT_DETECT = int(os.environ.get("JOB_LIMIT_DETECT", 1))
+JOB_LIMIT_REFINE = int(os.environ.get("JOB_LIMIT_REFINE", 1))
+# Refinements have their own pending budget, outside JOB_MAX_PENDING
+JOB_MAX_PENDING_REFINE = int(os.environ.get("JOB_MAX_PENDING_REFINE", 8))
+
+# Streaming pipeline: synthetic[:interval] | replay:<path>[@speed] | udp:<host>:<port> | tcp:<host>:<port>
+PIPELINE_SOURCE = os.environ.get("PIPELINE_SOURCE", "synthetic:10")
+PIPELINE_BATCH_SIZE = int(os.environ.get("PIPELINE_BATCH_SIZE", 500))
+PIPELINE_BATCH_MAX_DELAY_MS = int(os.environ.get("PIPELINE_BATCH_MAX_DELAY_MS", 200))
+PIPELINE_QUEUE_SIZE = int(os.environ.get("PIPELINE_QUEUE_SIZE", 10000))
+PIPELINE_LOG_READINGS = int(os.environ.get("PIPELINE_LOG_READINGS", 20))
+# Pipeline + retention run in one elected process. PIPELINE_EMBEDDED=0 keeps web
+# workers out of the election; run `python -m pathway_pipeline` separately instead
+PIPELINE_EMBEDDED = os.environ.get("PIPELINE_EMBEDDED", "1") != "0"
+LEADER_LEASE_SECONDS = float(os.environ.get("LEADER_LEASE_SECONDS", 15))
+LEADER_RETRY_SECONDS = float(os.environ.get("LEADER_RETRY_SECONDS", 5))
+# python app.py starts background work at import; gunicorn.conf.py sets 0 and
+# starts it per worker after fork, so nothing runs in a preloading master
+START_BACKGROUND_ON_IMPORT = os.environ.get("START_BACKGROUND_ON_IMPORT", "1") != "0"
+
+# asyncio sensor gateway (python gateway.py)
+GATEWAY_HOST = os.environ.get("GATEWAY_HOST", "0.0.0.0")
+GATEWAY_HTTP_PORT = int(os.environ.get("GATEWAY_HTTP_PORT", 8081))
+GATEWAY_TCP_PORT = int(os.environ.get("GATEWAY_TCP_PORT", 8082))  # -1 disables
+GATEWAY_FLUSH_MS = int(os.environ.get("GATEWAY_FLUSH_MS", 250))
+GATEWAY_MAX_BODY_BYTES = int(os.environ.get("GATEWAY_MAX_BODY_BYTES", 8 * 1024 * 1024))
+
+# Alert dispatch (transport: twilio | fake; fake records messages offline)
+ALERT_TRANSPORT = os.environ.get("ALERT_TRANSPORT", "twilio" if TWILIO_ACCOUNT_SID else "fake")
+ALERT_WORKERS = int(os.environ.get("ALERT_WORKERS", 2))
+ALERT_QUEUE_SIZE = int(os.environ.get("ALERT_QUEUE_SIZE", 1000))
+ALERT_MAX_RETRIES = int(os.environ.get("ALERT_MAX_RETRIES", 4))
+ALERT_RETRY_BASE_SECONDS = float(os.environ.get("ALERT_RETRY_BASE_SECONDS", 1))
+ALERT_RETRY_MAX_SECONDS = float(os.environ.get("ALERT_RETRY_MAX_SECONDS", 30))
+# Messages per recipient per minute, after a burst of ALERT_BURST (0 = no limit)
+ALERT_RATE_PER_MINUTE = max(0.0, float(os.environ.get("ALERT_RATE_PER_MINUTE", 20)))
+ALERT_BURST = int(os.environ.get("ALERT_BURST", 5))
+ALERT_LOG_BATCH = int(os.environ.get("ALERT_LOG_BATCH", 50))
+ALERT_LOG_FLUSH_SECONDS = float(os.environ.get("ALERT_LOG_FLUSH_SECONDS", 1))
+
+# Alert policy: one alert per bin per suppression window; bins crossing the
+# threshold within ALERT_DIGEST_SECONDS go to their driver as one digest (0 = no digest)
+ALERT_SUPPRESS_MINUTES = float(os.environ.get("ALERT_SUPPRESS_MINUTES", 30))
+ALERT_DIGEST_SECONDS = float(os.environ.get("ALERT_DIGEST_SECONDS", 60))
+# Suppression is tracked per process; other workers' alerts are picked up from
+# the alerts table at most this often, and only once they have been sent and logged
+ALERT_RESEED_SECONDS = float(os.environ.get("ALERT_RESEED_SECONDS", 30))
+# Extra drivers as JSON {"+91...": [bin ids]}; unassigned bins go to DRIVER_PHONE_NUMBER
+DRIVER_ASSIGNMENTS = json.loads(os.environ.get("DRIVER_ASSIGNMENTS", "{}"))
+
+# Change stream (SSE, served by gateway.py). STREAM_URL is the gateway's public
+# /api/stream URL; when empty the dashboard falls back to polling /api/bins
+STREAM_URL = os.environ.get("STREAM_URL", "")
+STREAM_POLL_MS = int(os.environ.get("STREAM_POLL_MS", 500))
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get("STREAM_HEARTBEAT_SECONDS", 15))
+STREAM_CLIENT_BUFFER = int(os.environ.get("STREAM_CLIENT_BUFFER", 256))
+STREAM_BACKFILL_MAX = int(os.environ.get("STREAM_BACKFILL_MAX", 10000))
+STREAM_CHANGES_RETENTION_MINUTES = int(os.environ.get("STREAM_CHANGES_RETENTION_MINUTES", 120))
@@ -1,5 +1,14 @@
 import sqlite3
 import os
+import json
+import threading
+import time
+from calendar import timegm
+from contextlib import contextmanager
+from datetime import datetime
+import config
+from estimator import FillEstimate, update_estimate
+from live_state import LiveState
 
 # Use /tmp for Render deployment, local database folder otherwise
 if os.environ.get("RENDER"):
@@ -7,115 +16,750 @@ if os.environ.get("RENDER"):
 else:
     DB_PATH = os.path.join(os.path.dirname(__file__), 'database', 'waste.db')
 
+# Statements live here so each connection's statement cache prepares them once
+SQL_BIN_INFO = "SELECT id, name, location FROM bins"
+SQL_LIVE_ROWS = """
+    SELECT id, latitude, longitude, fill_level, CAST(strftime('%s', last_updated) AS REAL) FROM bins
+"""
+SQL_BINS_BY_ID = """
+    SELECT b.id, b.name, b.location, b.fill_level, e.level, e.rate, e.last_ts, e.samples,
+           w.level, w.stored_ts, w.tolerance
+    FROM bins AS b
+    LEFT JOIN fill_estimates AS e ON e.bin_id = b.id
+    LEFT JOIN history_watermarks AS w ON w.bin_id = b.id
+    WHERE b.id IN (SELECT value FROM json_each(?))
+"""
+SQL_UPSERT_WATERMARK = """
+    INSERT INTO history_watermarks (bin_id, level, stored_ts) VALUES (?,?,?)
+    ON CONFLICT (bin_id) DO UPDATE SET level = excluded.level, stored_ts = excluded.stored_ts
+"""
+SQL_SET_TOLERANCE = """
+    INSERT INTO history_watermarks (bin_id, tolerance) VALUES (?,?)
+    ON CONFLICT (bin_id) DO UPDATE SET tolerance = excluded.tolerance
+"""
+SQL_COUNT_INGEST = """
+    INSERT INTO ingest_counters (name, value) VALUES (?,?)
+    ON CONFLICT (name) DO UPDATE SET value = value + excluded.value
+"""
+SQL_UPSERT_ESTIMATE = """
+    INSERT INTO fill_estimates (bin_id, level, rate, last_ts, samples) VALUES (?,?,?,?,?)
+    ON CONFLICT (bin_id) DO UPDATE SET
+        level = excluded.level, rate = excluded.rate,
+        last_ts = excluded.last_ts, samples = excluded.samples
+"""
+SQL_ESTIMATES = "SELECT bin_id, level, rate, last_ts, samples FROM fill_estimates WHERE bin_id IN (SELECT value FROM json_each(?))"
+SQL_UPDATE_FILL = "UPDATE bins SET fill_level=?, last_updated=COALESCE(?, CURRENT_TIMESTAMP) WHERE id=?"
+SQL_INSERT_HISTORY = "INSERT INTO fill_history (bin_id, fill_level) VALUES (?,?)"
+SQL_FILL_HISTORY = "SELECT fill_level, recorded_at FROM fill_history WHERE bin_id=? ORDER BY recorded_at DESC LIMIT 20"
+SQL_RECENT_HISTORY_MANY = """
+    SELECT h.bin_id, h.fill_level, CAST(strftime('%s', h.recorded_at) AS INTEGER)
+    FROM json_each(?) AS b
+    JOIN fill_history AS h ON h.id IN (
+        SELECT id FROM fill_history WHERE bin_id = b.value
+        ORDER BY recorded_at DESC, id DESC LIMIT ?
+    )
+    ORDER BY h.bin_id, h.recorded_at, h.id
+"""
+SQL_ALERTS_TODAY = "SELECT COUNT(*) FROM alerts WHERE sent_at > datetime('now', '-24 hours')"
+SQL_INSERT_CHANGE = "INSERT INTO bin_changes (bin_id, fill_level, changed_at) VALUES (?,?,COALESCE(?, CURRENT_TIMESTAMP))"
+SQL_CHANGES_SINCE = "SELECT seq, bin_id, fill_level, changed_at FROM bin_changes WHERE seq > ? ORDER BY seq LIMIT ?"
+SQL_RECENT_ALERT_TIMES = """
+    SELECT bin_id, CAST(strftime('%s', MAX(sent_at)) AS REAL) FROM alerts
+    WHERE sent_at > datetime('now', ?) GROUP BY bin_id
+"""
+SQL_CLAIM_LEASE = """
+    INSERT INTO leases (name, holder, acquired_at, renewed_at, expires_at, info) VALUES (?,?,?,?,?,?)
+    ON CONFLICT (name) DO UPDATE SET
+        holder = excluded.holder,
+        acquired_at = CASE WHEN leases.holder = excluded.holder THEN leases.acquired_at ELSE excluded.acquired_at END,
+        renewed_at = excluded.renewed_at, expires_at = excluded.expires_at, info = excluded.info
+    WHERE leases.holder = excluded.holder OR leases.expires_at < excluded.renewed_at
+"""
+SQL_SAVE_JOB = """
+    INSERT INTO jobs (id, type, status, created, started, finished, result, error, preview) VALUES (?,?,?,?,?,?,?,?,?)
+    ON CONFLICT (id) DO UPDATE SET
+        status = excluded.status, started = excluded.started, finished = excluded.finished,
+        result = excluded.result, error = excluded.error
+"""
+SQL_INSERT_ALERT = "INSERT INTO alerts (bin_id, message, sent_at) VALUES (?,?,COALESCE(?, CURRENT_TIMESTAMP))"
+
+_local = threading.local()
+
+
+# ─────────────────────────────────────────
+# CONNECTION MANAGER
+# ─────────────────────────────────────────
+def _connect():
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=config.DB_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=config.DB_CACHED_STATEMENTS
+    )
+    # WAL lets readers run alongside the single writer
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={config.DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA busy_timeout={int(config.DB_BUSY_TIMEOUT_MS)}")
+    return conn
+
+
+def get_connection():
+    """
+    Returns this thread's persistent connection, opening it on first use
+    Reopens after a fork (gunicorn workers) or if DB_PATH was changed
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid() or _local.path != DB_PATH:
+        conn = _connect()
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.path = DB_PATH
+    return conn
+
+
+@contextmanager
+def transaction():
+    """
+    Yields a cursor on this thread's connection; commits on success,
+    rolls back on error
+    """
+    conn = get_connection()
+    with conn:
+        yield conn.cursor()
+
+
+def close_connection():
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+# ─────────────────────────────────────────
+# LIVE STATE (current levels shared across processes)
+# ─────────────────────────────────────────
+_live = {"store": None, "pid": None, "path": None}
+_live_lock = threading.Lock()
+
+# Names / locations never change at runtime: read once per table layout
+_bin_info = {"key": None, "rows": {}}
+
+
+def live_state():
+    """
+    The LiveState store next to DB_PATH; reopened after a fork or a DB_PATH change
+    """
+    with _live_lock:
+        if _live["store"] is None or _live["pid"] != os.getpid() or _live["path"] != DB_PATH:
+            os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+            _live["store"] = LiveState(DB_PATH + ".live")
+            _live["pid"] = os.getpid()
+            _live["path"] = DB_PATH
+        return _live["store"]
+
+
+def _to_epoch(timestamp):
+    # Reading timestamps are UTC text (SQLite's CURRENT_TIMESTAMP format);
+    # an explicit offset is honoured, anything unparseable counts as now
+    if timestamp:
+        try:
+            recorded = datetime.fromisoformat(str(timestamp))
+        except ValueError:
+            return time.time()
+        if recorded.tzinfo is None:
+            return float(timegm(recorded.timetuple()))
+        return recorded.timestamp()
+    return time.time()
+
+
+def _load_live_state(cursor):
+    now = time.time()
+    rows = [
+        (bin_id, lat, lng, level or 0.0, ts if ts is not None else now)
+        for bin_id, lat, lng, level, ts in cursor.execute(SQL_LIVE_ROWS).fetchall()
+    ]
+    live_state().load(rows)
+
+
+def refresh_live_state():
+    """
+    Reloads the live store from the bins table, e.g. after bins were added
+    or levels changed with plain SQL. Holds the write lock so no ingest
+    can land between the read and the load
+    """
+    with transaction() as cursor:
+        cursor.execute("BEGIN IMMEDIATE")
+        _load_live_state(cursor)
+    bump_data_version()
+
+
+# ─────────────────────────────────────────
+# DATA VERSION (cache invalidation)
+# ─────────────────────────────────────────
+def bump_data_version():
+    """
+    Marks bin levels / history as changed for every process using this DB
+    Call after the write has committed. The counter lives in the live
+    store's header, so bumping it is a locked increment in shared memory
+    """
+    live_state().bump_version()
+
+
+def get_data_version():
+    """
+    Current data version token; equal tokens mean no write happened in between
+    """
+    return live_state().version()
+
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS bins (
-            id INTEGER PRIMARY KEY,
-            name TEXT NOT NULL,
-            location TEXT NOT NULL,
-            latitude REAL NOT NULL,
-            longitude REAL NOT NULL,
-            fill_level REAL DEFAULT 0,
-            last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS fill_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            bin_id INTEGER,
-            fill_level REAL,
-            recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    with transaction() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS bins (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL,
+                location TEXT NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                fill_level REAL DEFAULT 0,
+                last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS fill_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                bin_id INTEGER,
+                fill_level REAL,
+                recorded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                bin_id INTEGER,
+                message TEXT,
+                sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS fill_history_hourly (
+                bin_id INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                samples INTEGER NOT NULL,
+                fill_sum REAL NOT NULL,
+                fill_min REAL NOT NULL,
+                fill_max REAL NOT NULL,
+                PRIMARY KEY (bin_id, bucket)
+            )
+        """)
+
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS fill_history_daily (
+                bin_id INTEGER NOT NULL,
+                bucket TEXT NOT NULL,
+                samples INTEGER NOT NULL,
+                fill_sum REAL NOT NULL,
+                fill_min REAL NOT NULL,
+                fill_max REAL NOT NULL,
+                PRIMARY KEY (bin_id, bucket)
+            )
+        """)
+
+        # Online fill-rate state, updated on every ingested reading
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS fill_estimates (
+                bin_id INTEGER PRIMARY KEY,
+                level REAL NOT NULL,
+                rate REAL,
+                last_ts REAL,
+                samples INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+        # Deadband state: last level written to fill_history per bin, and an
+        # optional per-bin tolerance (NULL = config.HISTORY_DEADBAND)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS history_watermarks (
+                bin_id INTEGER PRIMARY KEY,
+                level REAL,
+                stored_ts REAL,
+                tolerance REAL
+            )
+        """)
+
+        # Change log behind the /api/stream push channel; seq is the resume token
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS bin_changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                bin_id INTEGER NOT NULL,
+                fill_level REAL NOT NULL,
+                changed_at TIMESTAMP NOT NULL
+            )
+        """)
+
+        # Running totals of readings ingested vs history rows written
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingest_counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+
+        # Leader election: one row per background role, renewed by its holder
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS leases (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                acquired_at REAL NOT NULL,
+                renewed_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                info TEXT
+            )
+        """)
+
+        # Background job records, so a job is visible from every worker
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                type TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created REAL NOT NULL,
+                started REAL,
+                finished REAL,
+                result TEXT,
+                error TEXT,
+                preview TEXT
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_finished ON jobs (finished)")
+
+        # Prediction reads the latest rows per bin, alert checks filter by bin + time,
+        # retention deletes by time
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_fill_history_bin_time ON fill_history (bin_id, recorded_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_fill_history_time ON fill_history (recorded_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_bin_time ON alerts (bin_id, sent_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_time ON alerts (sent_at)")
+
+        # Insert default bins if empty
+        cursor.execute("SELECT COUNT(*) FROM bins")
+        if cursor.fetchone()[0] == 0:
+            bins = [
+                (1, "Bin A", "Sector 18 Market", 28.5700, 77.3210, 12.5),
+                (2, "Bin B", "Sector 62 Metro", 28.6270, 77.3660, 8.3),
+                (3, "Bin C", "Botanical Garden", 28.5622, 77.3352, 23.7),
+                (4, "Bin D", "Sector 15 Park", 28.5850, 77.3150, 5.1),
+                (5, "Bin E", "DLF Mall Noida", 28.5672, 77.3210, 17.8),
+                (6, "Bin F", "Sector 29 Market", 28.5750, 77.3350, 31.2),
+            ]
+            cursor.executemany(
+                "INSERT INTO bins (id, name, location, latitude, longitude, fill_level) VALUES (?,?,?,?,?,?)",
+                bins
+            )
+
+    # SQLite is the durable copy; the live store is rebuilt from it on every start
+    refresh_live_state()
+
+
+def _bin_info_for(store):
+    key = (DB_PATH, store.layout())
+    if _bin_info["key"] != key:
+        rows = get_connection().execute(SQL_BIN_INFO).fetchall()
+        _bin_info["rows"] = {bin_id: (name, location) for bin_id, name, location in rows}
+        _bin_info["key"] = key
+    return _bin_info["rows"]
+
+
+def get_all_bins():
+    """
+    (id, name, location, latitude, longitude, fill_level, last_updated) per bin,
+    read from the live store
+    """
+    store = live_state()
+    rows = store.snapshot()
+    info = _bin_info_for(store)
+    # "YYYY-MM-DDTHH:MM:SS" from numpy, as SQLite's "YYYY-MM-DD HH:MM:SS"
+    stamps = rows["last_updated"].astype("datetime64[s]").astype(str).tolist()
+    return [
+        (bin_id, *info.get(bin_id, (None, None)), lat, lng, level, stamp.replace("T", " "))
+        for bin_id, lat, lng, level, stamp in zip(
+            rows["id"].tolist(), rows["latitude"].tolist(), rows["longitude"].tolist(),
+            rows["fill_level"].tolist(), stamps
         )
-    """)
-
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS alerts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            bin_id INTEGER,
-            message TEXT,
-            sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    ]
+
+
+def get_fill_levels():
+    """
+    Returns {bin_id: fill_level} for every bin
+    """
+    rows = live_state().snapshot()
+    return dict(zip(rows["id"].tolist(), rows["fill_level"].tolist()))
+
+
+def update_fill_level(bin_id, fill_level, timestamp=None):
+    ingest_readings([(bin_id, fill_level, timestamp)])
+
+
+def ingest_readings(readings):
+    """
+    Applies a micro-batch of readings in one transaction
+    readings = iterable of (bin_id, fill_level) or (bin_id, fill_level, timestamp)
+    A missing/None timestamp means CURRENT_TIMESTAMP; readings for unknown bins are skipped
+
+    Returns the bins at or above config.FILL_THRESHOLD after the batch:
+    [{"bin_id", "name", "location", "fill_level", "previous_level"}, ...]
+    previous_level lets callers tell a fresh crossing from a bin that was already full
+    """
+    rows = []
+    for reading in readings:
+        bin_id, fill_level = int(reading[0]), float(reading[1])
+        timestamp = reading[2] if len(reading) > 2 else None
+        rows.append((bin_id, fill_level, timestamp))
+
+    if not rows:
+        return []
+
+    now = time.time()
+    try:
+        over_threshold = _ingest(rows, now)
+    except Exception:
+        # The live store may already hold levels from the rolled-back batch
+        refresh_live_state()
+        raise
+    if over_threshold is not None:
+        bump_data_version()
+    return over_threshold or []
+
+
+def _ingest(rows, now):
+    with transaction() as cursor:
+        ids = sorted({row[0] for row in rows})
+        cursor.execute(SQL_BINS_BY_ID, (json.dumps(ids),))
+        known = {}
+        estimates = {}
+        watermarks = {}
+        for (bin_id, name, location, previous, level, rate, last_ts, samples,
+             stored_level, stored_ts, tolerance) in cursor.fetchall():
+            known[bin_id] = (bin_id, name, location, previous)
+            if level is not None:
+                estimates[bin_id] = FillEstimate(level, rate, last_ts, samples)
+            watermarks[bin_id] = (stored_level, stored_ts, tolerance)
+
+        rows = [row for row in rows if row[0] in known]
+        cursor.executemany(SQL_UPDATE_FILL, [(level, ts, bin_id) for bin_id, level, ts in rows])
+
+        history, stored = _deadband(rows, watermarks, now)
+        cursor.executemany(SQL_INSERT_HISTORY, history)
+        cursor.executemany(SQL_UPSERT_WATERMARK, [(bin_id, level, now) for bin_id, level in stored.items()])
+        cursor.executemany(SQL_COUNT_INGEST, [("readings", len(rows)), ("history_rows", len(history))])
+
+        # Fold every reading into the bin's online estimate at its own time
+        for bin_id, level, ts in rows:
+            estimates[bin_id] = update_estimate(estimates.get(bin_id), level, _to_epoch(ts) if ts else now)
+        cursor.executemany(
+            SQL_UPSERT_ESTIMATE,
+            [estimates[bin_id].as_row(bin_id) for bin_id in {row[0] for row in rows}]
         )
-    """)
-
-    # Insert default bins if empty
-    cursor.execute("SELECT COUNT(*) FROM bins")
-    if cursor.fetchone()[0] == 0:
-        bins = [
-            (1, "Bin A", "Sector 18 Market", 28.5700, 77.3210, 12.5),
-            (2, "Bin B", "Sector 62 Metro", 28.6270, 77.3660, 8.3),
-            (3, "Bin C", "Botanical Garden", 28.5622, 77.3352, 23.7),
-            (4, "Bin D", "Sector 15 Park", 28.5850, 77.3150, 5.1),
-            (5, "Bin E", "DLF Mall Noida", 28.5672, 77.3210, 17.8),
-            (6, "Bin F", "Sector 29 Market", 28.5750, 77.3350, 31.2),
-        ]
+
+        # Last reading per bin wins, same as the UPDATEs above
+        latest = {}
+        for bin_id, level, ts in rows:
+            latest[bin_id] = (level, ts)
+
+        # One change-log row per bin whose level actually moved
         cursor.executemany(
-            "INSERT INTO bins (id, name, location, latitude, longitude, fill_level) VALUES (?,?,?,?,?,?)",
-            bins
+            SQL_INSERT_CHANGE,
+            [(bin_id, level, ts) for bin_id, (level, ts) in latest.items() if level != known[bin_id][3]]
         )
 
-    conn.commit()
-    conn.close()
+        # Still inside the transaction: the SQLite write lock orders live-store
+        # updates the same way as the commits
+        if latest:
+            store = live_state()
+            missing = store.update([(bin_id, level, _to_epoch(ts)) for bin_id, (level, ts) in latest.items()])
+            if missing:
+                _load_live_state(cursor)
 
+    if not rows:
+        return None
+
+    over_threshold = []
+    for bin_id, (level, _) in latest.items():
+        if level >= config.FILL_THRESHOLD:
+            _, name, location, previous = known[bin_id]
+            over_threshold.append({
+                "bin_id": bin_id,
+                "name": name,
+                "location": location,
+                "fill_level": level,
+                "previous_level": previous
+            })
+    return over_threshold
+
+
+def _deadband(rows, watermarks, now):
+    """
+    Deadband compression of fill_history: a reading is written only if it
+    moved more than the bin's tolerance from the last written level, or
+    HISTORY_MAX_INTERVAL_MINUTES passed since that write
+    Emptyings (a drop of more than EMPTYING_DROP) are always written, and
+    a negative tolerance writes every reading
+    Returns (history rows to insert, {bin_id: last level written})
+    """
+    max_interval = config.HISTORY_MAX_INTERVAL_MINUTES * 60
+    history = []
+    stored = {}
+    for bin_id, level, _ in rows:
+        last_level, last_ts, tolerance = watermarks.get(bin_id, (None, None, None))
+        if tolerance is None:
+            tolerance = config.HISTORY_DEADBAND
+        if bin_id in stored:
+            last_level, last_ts = stored[bin_id], now
+
+        if (last_level is None or tolerance < 0 or abs(level - last_level) > tolerance
+                or last_level - level > config.EMPTYING_DROP or now - last_ts >= max_interval):
+            history.append((bin_id, level))
+            stored[bin_id] = level
+    return history, stored
 
-def get_all_bins():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name, location, latitude, longitude, fill_level, last_updated FROM bins")
-    bins = cursor.fetchall()
-    conn.close()
-    return bins
-
-
-def update_fill_level(bin_id, fill_level):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "UPDATE bins SET fill_level=?, last_updated=CURRENT_TIMESTAMP WHERE id=?",
-        (fill_level, bin_id)
-    )
-    cursor.execute(
-        "INSERT INTO fill_history (bin_id, fill_level) VALUES (?,?)",
-        (bin_id, fill_level)
-    )
-    conn.commit()
-    conn.close()
+
+def set_history_deadband(bin_id, tolerance):
+    """
+    Per-bin deadband in fill-level points; None goes back to config.HISTORY_DEADBAND
+    """
+    with transaction() as cursor:
+        cursor.execute(SQL_SET_TOLERANCE, (bin_id, tolerance))
+
+
+def get_ingest_stats():
+    """
+    Readings ingested vs fill_history rows written since the counters started
+    """
+    counters = dict(get_connection().execute("SELECT name, value FROM ingest_counters").fetchall())
+    readings = counters.get("readings", 0)
+    written = counters.get("history_rows", 0)
+    return {
+        "readings": readings,
+        "history_rows": written,
+        "rows_skipped": readings - written,
+        "write_saving_pct": round(100 * (readings - written) / readings, 1) if readings else 0.0,
+        "deadband": config.HISTORY_DEADBAND,
+        "max_interval_minutes": config.HISTORY_MAX_INTERVAL_MINUTES
+    }
+
+
+def get_changes_since(seq, limit=1000):
+    """
+    Change-log rows after seq: [(seq, bin_id, fill_level, changed_at)], oldest first
+    """
+    return get_connection().execute(SQL_CHANGES_SINCE, (seq, limit)).fetchall()
+
+
+def get_change_bounds():
+    """
+    (oldest retained seq or None, latest seq ever assigned)
+    """
+    conn = get_connection()
+    oldest, newest = conn.execute("SELECT MIN(seq), MAX(seq) FROM bin_changes").fetchone()
+    if newest is None:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'bin_changes'").fetchone()
+        newest = row[0] if row else 0
+    return oldest, newest
 
 
 def get_fill_history(bin_id):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT fill_level, recorded_at FROM fill_history WHERE bin_id=? ORDER BY recorded_at DESC LIMIT 20",
-        (bin_id,)
-    )
-    history = cursor.fetchall()
-    conn.close()
-    return history
+    return get_connection().execute(SQL_FILL_HISTORY, (bin_id,)).fetchall()
+
+
+def get_recent_history_many(bin_ids, limit=20):
+    """
+    Last `limit` readings for many bins in one query
+    Returns (bin_id, fill_level, epoch_seconds) rows, grouped by bin, oldest first
+    Each bin is an index seek on idx_fill_history_bin_time, so cost does not
+    grow with the total size of fill_history
+    """
+    ids = sorted({int(bin_id) for bin_id in bin_ids})
+    return get_connection().execute(SQL_RECENT_HISTORY_MANY, (json.dumps(ids), limit)).fetchall()
+
+
+def get_estimates(bin_ids):
+    """
+    Returns {bin_id: FillEstimate} for bins that have one
+    """
+    ids = sorted({int(bin_id) for bin_id in bin_ids})
+    rows = get_connection().execute(SQL_ESTIMATES, (json.dumps(ids),)).fetchall()
+    return {row[0]: FillEstimate(*row[1:]) for row in rows}
 
 
 def get_alerts_count_today():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT COUNT(*) FROM alerts
-        WHERE sent_at > datetime('now', '-24 hours')
-    """)
-    count = cursor.fetchone()[0]
-    conn.close()
-    return count
+    return get_connection().execute(SQL_ALERTS_TODAY).fetchone()[0]
+
+
+def get_recent_alert_times(minutes):
+    """
+    {bin_id: epoch of its latest alert} for alerts in the last N minutes
+    """
+    rows = get_connection().execute(SQL_RECENT_ALERT_TIMES, (f"-{int(minutes)} minutes",)).fetchall()
+    return dict(rows)
 
 
 def log_alert(bin_id, message):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO alerts (bin_id, message) VALUES (?,?)",
-        (bin_id, message)
-    )
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    log_alerts([(bin_id, message, None)])
+
+
+def log_alerts(rows):
+    """
+    Writes many alert rows in one transaction
+    rows = (bin_id, message, sent_at) with sent_at as UTC "YYYY-MM-DD HH:MM:SS" or None for now
+    """
+    with transaction() as cursor:
+        cursor.executemany(SQL_INSERT_ALERT, rows)
+
+
+# ─────────────────────────────────────────
+# LEADER LEASES
+# ─────────────────────────────────────────
+def claim_lease(name, holder, ttl, info=None):
+    """
+    Takes or renews lease `name` for ttl seconds; True if holder now owns it
+    Succeeds only if holder already owns it or the current lease has expired
+    """
+    now = time.time()
+    with transaction() as cursor:
+        cursor.execute(SQL_CLAIM_LEASE, (name, holder, now, now, now + ttl, info))
+        return cursor.rowcount == 1
+
+
+def release_lease(name, holder):
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM leases WHERE name = ? AND holder = ?", (name, holder))
+
+
+def get_lease(name):
+    """
+    {"holder", "acquired_at", "renewed_at", "expires_at", "info"} or None
+    """
+    row = get_connection().execute(
+        "SELECT holder, acquired_at, renewed_at, expires_at, info FROM leases WHERE name = ?", (name,)
+    ).fetchone()
+    if row is None:
+        return None
+    return dict(zip(("holder", "acquired_at", "renewed_at", "expires_at", "info"), row))
+
+
+# ─────────────────────────────────────────
+# JOB RECORDS
+# ─────────────────────────────────────────
+JOB_COLUMNS = ("id", "type", "status", "created", "started", "finished", "result", "error", "preview")
+
+
+def save_job(row):
+    """
+    Inserts or updates a job record; row = tuple in JOB_COLUMNS order,
+    result / preview as JSON text
+    """
+    with transaction() as cursor:
+        cursor.execute(SQL_SAVE_JOB, row)
+
+
+def load_job(job_id):
+    row = get_connection().execute(
+        f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    return dict(zip(JOB_COLUMNS, row)) if row else None
+
+
+def prune_jobs(finished_before):
+    with transaction() as cursor:
+        cursor.execute("DELETE FROM jobs WHERE finished < ?", (finished_before,))
+        return cursor.rowcount
+
+
+# ─────────────────────────────────────────
+# RETENTION / ROLLUP
+# ─────────────────────────────────────────
+SQL_ROLLUP_UPSERT = """
+    ON CONFLICT (bin_id, bucket) DO UPDATE SET
+        samples = samples + excluded.samples,
+        fill_sum = fill_sum + excluded.fill_sum,
+        fill_min = MIN(fill_min, excluded.fill_min),
+        fill_max = MAX(fill_max, excluded.fill_max)
+"""
+
+
+def rollup_and_prune(raw_hours, hourly_days, daily_days=0, alert_days=0, changes_minutes=0):
+    """
+    Rolls raw fill_history older than raw_hours into hourly buckets,
+    hourly buckets older than hourly_days into daily buckets, then deletes
+    what was rolled up. daily_days / alert_days / changes_minutes of 0 keep
+    those forever.
+    Cutoffs are aligned to bucket boundaries so no bucket is split.
+    Returns row counts per step.
+    """
+    with transaction() as cursor:
+        raw_cutoff = cursor.execute(
+            "SELECT strftime('%Y-%m-%d %H:00:00', 'now', ?)", (f"-{int(raw_hours)} hours",)
+        ).fetchone()[0]
+        hourly_cutoff = cursor.execute(
+            "SELECT strftime('%Y-%m-%d 00:00:00', 'now', ?)", (f"-{int(hourly_days)} days",)
+        ).fetchone()[0]
+
+        cursor.execute("""
+            INSERT INTO fill_history_hourly (bin_id, bucket, samples, fill_sum, fill_min, fill_max)
+            SELECT bin_id, strftime('%Y-%m-%d %H:00:00', recorded_at),
+                   COUNT(*), SUM(fill_level), MIN(fill_level), MAX(fill_level)
+            FROM fill_history
+            WHERE recorded_at < ?
+            GROUP BY bin_id, strftime('%Y-%m-%d %H:00:00', recorded_at)
+        """ + SQL_ROLLUP_UPSERT, (raw_cutoff,))
+        hourly_rows = cursor.rowcount
+        cursor.execute("DELETE FROM fill_history WHERE recorded_at < ?", (raw_cutoff,))
+        raw_deleted = cursor.rowcount
+
+        cursor.execute("""
+            INSERT INTO fill_history_daily (bin_id, bucket, samples, fill_sum, fill_min, fill_max)
+            SELECT bin_id, date(bucket),
+                   SUM(samples), SUM(fill_sum), MIN(fill_min), MAX(fill_max)
+            FROM fill_history_hourly
+            WHERE bucket < ?
+            GROUP BY bin_id, date(bucket)
+        """ + SQL_ROLLUP_UPSERT, (hourly_cutoff,))
+        daily_rows = cursor.rowcount
+        cursor.execute("DELETE FROM fill_history_hourly WHERE bucket < ?", (hourly_cutoff,))
+        hourly_deleted = cursor.rowcount
+
+        daily_deleted = 0
+        if daily_days:
+            cursor.execute(
+                "DELETE FROM fill_history_daily WHERE bucket < date('now', ?)", (f"-{int(daily_days)} days",)
+            )
+            daily_deleted = cursor.rowcount
+
+        alerts_deleted = 0
+        if alert_days:
+            cursor.execute(
+                "DELETE FROM alerts WHERE sent_at < datetime('now', ?)", (f"-{int(alert_days)} days",)
+            )
+            alerts_deleted = cursor.rowcount
+
+        changes_deleted = 0
+        if changes_minutes:
+            cursor.execute(
+                # By seq, so the retained log stays gap-free even if sensor clocks disagree
+                "DELETE FROM bin_changes WHERE seq <= (SELECT MAX(seq) FROM bin_changes WHERE changed_at < datetime('now', ?))",
+                (f"-{int(changes_minutes)} minutes",)
+            )
+            changes_deleted = cursor.rowcount
+
+    return {
+        "hourly_upserted": hourly_rows,
+        "raw_deleted": raw_deleted,
+        "daily_upserted": daily_rows,
+        "hourly_deleted": hourly_deleted,
+        "daily_deleted": daily_deleted,
+        "alerts_deleted": alerts_deleted,
+        "changes_deleted": changes_deleted
+    }
@@ -0,0 +1,148 @@
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from database import get_connection, transaction
+
+
+# ─────────────────────────────────────────
+# BOUNDED LRU RESULT CACHE
+# ─────────────────────────────────────────
+class ResultCache:
+    """
+    In-memory LRU of JSON-serialisable results, bounded by entry count
+    and by total serialised size, with an optional SQLite tier that
+    survives restarts and is shared across gunicorn workers
+    """
+
+    def __init__(self, max_entries, max_bytes, persist=False, disk_max_entries=10000):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.persist = persist
+        self.disk_max_entries = disk_max_entries
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_writes = 0
+        self._disk_ready = False
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    # ── memory tier ──
+    def _put_memory(self, key, payload):
+        size = len(key) + len(payload)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(key) + len(old)
+
+            self._entries[key] = payload
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                old_key, old_payload = self._entries.popitem(last=False)
+                self._bytes -= len(old_key) + len(old_payload)
+                self.evictions += 1
+
+    def _get_memory(self, key):
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is not None:
+                self._entries.move_to_end(key)
+            return payload
+
+    # ── disk tier ──
+    def _ensure_table(self):
+        if self._disk_ready:
+            return
+        with transaction() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS detect_cache (
+                    key TEXT PRIMARY KEY,
+                    result TEXT NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+        self._disk_ready = True
+
+    def _get_disk(self, key):
+        try:
+            self._ensure_table()
+            row = get_connection().execute("SELECT result FROM detect_cache WHERE key=?", (key,)).fetchone()
+        except sqlite3.Error as e:
+            print(f"[Cache Error] {e}")
+            return None
+        return row[0] if row else None
+
+    def _put_disk(self, key, payload):
+        try:
+            self._ensure_table()
+            with transaction() as cursor:
+                cursor.execute(
+                    "INSERT OR REPLACE INTO detect_cache (key, result) VALUES (?,?)",
+                    (key, payload)
+                )
+                self._disk_writes += 1
+
+                # Trim the oldest rows every so often instead of on every write
+                if self._disk_writes % 100 == 0:
+                    cursor.execute("""
+                        DELETE FROM detect_cache WHERE key IN (
+                            SELECT key FROM detect_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                        )
+                    """, (self.disk_max_entries,))
+        except sqlite3.Error as e:
+            print(f"[Cache Error] {e}")
+
+    # ── public API ──
+    def get(self, key):
+        payload = self._get_memory(key)
+        if payload is not None:
+            self.hits += 1
+            return json.loads(payload)
+
+        if self.persist:
+            payload = self._get_disk(key)
+            if payload is not None:
+                self.disk_hits += 1
+                self._put_memory(key, payload)
+                return json.loads(payload)
+
+        self.misses += 1
+        return None
+
+    def put(self, key, result):
+        payload = json.dumps(result)
+        self._put_memory(key, payload)
+        if self.persist:
+            self._put_disk(key, payload)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+            size = self._bytes
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": size,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0,
+            "disk_tier": self.persist
+        }
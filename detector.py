@@ -1,68 +1,280 @@
-import cv2
 import numpy as np
-from PIL import Image
-import io
+import hashlib
+import struct
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import config
+from detect_cache import ResultCache
 
-def detect_fill_level(image_bytes):
+# Every image is scored at this size (width, height)
+FRAME_SIZE = (300, 400)
+
+# A row counts as "filled" when more than this share of its pixels is waste
+ROW_FILL_RATIO = 0.3
+
+# HSV ranges for dark regions and brown/green waste
+DARK_RANGE = ([0, 0, 0], [180, 255, 100])
+WASTE_RANGE = ([10, 30, 30], [80, 255, 200])
+
+# Canny thresholds and the weights of the two signals
+CANNY_THRESHOLDS = (50, 150)
+FILL_WEIGHT = 0.7
+EDGE_WEIGHT = 0.3
+
+# JPEG downscale-on-decode flags (cv2 attribute names), largest factor first
+REDUCED_DECODE_FLAGS = [
+    (8, "IMREAD_REDUCED_COLOR_8"),
+    (4, "IMREAD_REDUCED_COLOR_4"),
+    (2, "IMREAD_REDUCED_COLOR_2"),
+]
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, arithmetic)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+def _detector_version(fast_decode):
+    return hashlib.sha1(repr((
+        FRAME_SIZE, ROW_FILL_RATIO, DARK_RANGE, WASTE_RANGE,
+        CANNY_THRESHOLDS, FILL_WEIGHT, EDGE_WEIGHT, fast_decode
+    )).encode()).hexdigest()[:12]
+
+
+# Any change to the scoring parameters changes this, so stale cached results are never served
+DETECTOR_VERSION = _detector_version(config.DETECT_FAST_DECODE)
+
+_decode_pool = None
+
+_result_cache = ResultCache(
+    max_entries=config.DETECT_CACHE_MAX_ENTRIES,
+    max_bytes=config.DETECT_CACHE_MAX_BYTES,
+    persist=config.DETECT_CACHE_PERSIST
+)
+
+
+class ImageTooLarge(ValueError):
+    """Upload exceeds DETECT_MAX_UPLOAD_BYTES or DETECT_MAX_PIXELS"""
+
+
+def _jpeg_size(image_bytes):
+    pos = 2
+    end = len(image_bytes)
+    while pos + 4 <= end:
+        if image_bytes[pos] != 0xFF:
+            return None
+        marker = image_bytes[pos + 1]
+        # Fill bytes and standalone markers carry no length
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            pos += 2
+            continue
+        length = struct.unpack(">H", image_bytes[pos + 2:pos + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            if pos + 9 > end:
+                return None
+            height, width = struct.unpack(">HH", image_bytes[pos + 5:pos + 9])
+            return width, height
+        pos += 2 + length
+    return None
+
+
+def read_image_size(image_bytes):
     """
-    Takes image bytes, returns fill level percentage (0-100)
-    Uses color + edge detection to estimate how full a bin is
+    Reads (width, height) from a JPEG or PNG header without decoding
+    Returns None for other formats or truncated headers
     """
-    # Convert bytes to numpy array
+    if image_bytes[:2] == b"\xff\xd8":
+        return _jpeg_size(image_bytes)
+    if image_bytes[:8] == b"\x89PNG\r\n\x1a\n" and len(image_bytes) >= 24:
+        return struct.unpack(">II", image_bytes[16:24])
+    return None
+
+
+def _check_limits(image_bytes):
+    """
+    Enforces the upload caps, returns header size or None
+    """
+    if len(image_bytes) > config.DETECT_MAX_UPLOAD_BYTES:
+        raise ImageTooLarge(
+            f"Image is {len(image_bytes)} bytes, limit is {config.DETECT_MAX_UPLOAD_BYTES}"
+        )
+
+    size = read_image_size(image_bytes)
+    if size and size[0] * size[1] > config.DETECT_MAX_PIXELS:
+        raise ImageTooLarge(
+            f"Image is {size[0]}x{size[1]}, limit is {config.DETECT_MAX_PIXELS} pixels"
+        )
+    return size
+
+
+def _decode_flag(image_bytes, size):
+    """
+    Picks the smallest JPEG decode that still covers FRAME_SIZE
+    The shorter side must cover the longer frame side, so EXIF rotation is safe
+    """
+    import cv2
+    if not config.DETECT_FAST_DECODE or size is None or image_bytes[:2] != b"\xff\xd8":
+        return cv2.IMREAD_COLOR
+
+    short_side = min(size)
+    for factor, flag in REDUCED_DECODE_FLAGS:
+        if short_side // factor >= max(FRAME_SIZE):
+            return getattr(cv2, flag)
+    return cv2.IMREAD_COLOR
+
+
+def _decode_image(image_bytes):
+    """
+    Decodes image bytes and resizes to FRAME_SIZE
+    Returns None if the bytes are not a readable image
+    Raises ImageTooLarge if the upload is over the configured caps
+    """
+    import cv2
+    size = _check_limits(image_bytes)
+
     nparr = np.frombuffer(image_bytes, np.uint8)
-    img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+    img = cv2.imdecode(nparr, _decode_flag(image_bytes, size))
 
     if img is None:
-        return 0
+        return None
+
+    # Formats without a readable header are checked after decode
+    if size is None and img.shape[0] * img.shape[1] > config.DETECT_MAX_PIXELS:
+        raise ImageTooLarge(
+            f"Image is {img.shape[1]}x{img.shape[0]}, limit is {config.DETECT_MAX_PIXELS} pixels"
+        )
 
     # Resize for consistency
-    img = cv2.resize(img, (300, 400))
-    height, width = img.shape[:2]
+    return cv2.resize(img, FRAME_SIZE)
+
 
+def _waste_mask(img):
+    """
+    Returns the combined dark + waste-colour mask (0 or 255 per pixel)
+    """
+    import cv2
     # Convert to HSV for better color detection
     hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
 
     # Detect dark regions (waste is usually darker)
-    lower_dark = np.array([0, 0, 0])
-    upper_dark = np.array([180, 255, 100])
+    lower_dark = np.array(DARK_RANGE[0])
+    upper_dark = np.array(DARK_RANGE[1])
     dark_mask = cv2.inRange(hsv, lower_dark, upper_dark)
 
     # Detect brown/green waste colors
-    lower_waste = np.array([10, 30, 30])
-    upper_waste = np.array([80, 255, 200])
+    lower_waste = np.array(WASTE_RANGE[0])
+    upper_waste = np.array(WASTE_RANGE[1])
     waste_mask = cv2.inRange(hsv, lower_waste, upper_waste)
 
     # Combine masks
-    combined_mask = cv2.bitwise_or(dark_mask, waste_mask)
+    return cv2.bitwise_or(dark_mask, waste_mask)
 
-    # Find fill level by scanning from bottom up
-    fill_rows = 0
-    for row in range(height - 1, -1, -1):
-        row_pixels = combined_mask[row, :]
-        if np.sum(row_pixels) > width * 0.3 * 255:
-            fill_rows += 1
-        else:
-            break
 
-    fill_percentage = (fill_rows / height) * 100
+def _fill_rows(masks):
+    """
+    Counts filled rows from the bottom up for a stack of masks
+    masks = array of shape (n_images, height, width)
+    Returns array of n_images row counts
+    """
+    n, height, width = masks.shape
+
+    # Per-row pixel sums, flipped so index 0 is the bottom row
+    row_sums = masks.sum(axis=2, dtype=np.int64)[:, ::-1]
+    filled = row_sums > width * ROW_FILL_RATIO * 255
 
-    # Edge detection for additional accuracy
+    # First row that fails the test; rows below it are the fill
+    first_gap = np.argmin(filled, axis=1)
+    return np.where(filled.all(axis=1), height, first_gap)
+
+
+def _edge_density(img):
+    import cv2
+    height, width = img.shape[:2]
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    edges = cv2.Canny(gray, 50, 150)
-    edge_density = np.sum(edges) / (height * width * 255)
-    
+    edges = cv2.Canny(gray, *CANNY_THRESHOLDS)
+    return np.sum(edges) / (height * width * 255)
+
+
+def _combine(fill_rows, height, edge_density):
+    fill_percentage = (fill_rows / height) * 100
+
     # Combine both signals
-    final_fill = min(100, (fill_percentage * 0.7) + (edge_density * 100 * 0.3))
-    
+    final_fill = min(100, (fill_percentage * FILL_WEIGHT) + (edge_density * 100 * EDGE_WEIGHT))
+
     return round(final_fill, 2)
 
 
-def analyze_bin_image(image_bytes):
+def _score_images(images):
     """
-    Full analysis — returns fill level + status + recommendation
+    Scores a list of decoded images (None entries score 0)
+    The fill-line scan runs once over the whole stack
+    """
+    scores = [0] * len(images)
+    valid = [i for i, img in enumerate(images) if img is not None]
+    if not valid:
+        return scores
+
+    masks = np.stack([_waste_mask(images[i]) for i in valid])
+    rows = _fill_rows(masks)
+    height = masks.shape[1]
+
+    for i, fill_rows in zip(valid, rows):
+        scores[i] = _combine(int(fill_rows), height, _edge_density(images[i]))
+
+    return scores
+
+
+def detect_fill_level(image_bytes):
+    """
+    Takes image bytes, returns fill level percentage (0-100)
+    Uses color + edge detection to estimate how full a bin is
+    """
+    return _score_images([_decode_image(image_bytes)])[0]
+
+
+def score_frame(frame):
+    """
+    Scores an already decoded BGR frame (e.g. from cv2.VideoCapture)
+    """
+    import cv2
+    return _score_images([cv2.resize(frame, FRAME_SIZE)])[0]
+
+
+def _get_decode_pool():
+    global _decode_pool
+    if _decode_pool is None:
+        # spawn: forking a web worker with live threads can deadlock the child
+        _decode_pool = ProcessPoolExecutor(
+            max_workers=config.DETECT_POOL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _decode_pool
+
+
+def detect_fill_levels(images):
+    """
+    Batch version of detect_fill_level
+    images = list of image bytes, returns list of fill levels in the same order
+    Decoding is spread across a process pool for larger batches
     """
-    fill_level = detect_fill_level(image_bytes)
+    images = list(images)
 
+    # Reject oversized uploads before anything is shipped to the pool
+    for image_bytes in images:
+        _check_limits(image_bytes)
+
+    if len(images) < config.DETECT_POOL_MIN_BATCH or config.DETECT_POOL_WORKERS <= 1:
+        decoded = [_decode_image(image_bytes) for image_bytes in images]
+    else:
+        decoded = list(_get_decode_pool().map(_decode_image, images))
+
+    return _score_images(decoded)
+
+
+def classify_fill_level(fill_level):
+    """
+    Maps a fill level to status + recommendation
+    """
     if fill_level >= 90:
         status = "CRITICAL"
         color = "red"
@@ -85,4 +297,39 @@ def analyze_bin_image(image_bytes):
         "status": status,
         "color": color,
         "action": action
-    }
\ No newline at end of file
+    }
+
+
+def _cache_key(image_bytes):
+    return f"{DETECTOR_VERSION}:{hashlib.sha256(image_bytes).hexdigest()}"
+
+
+def analyze_bin_image(image_bytes):
+    """
+    Full analysis — returns fill level + status + recommendation
+    Identical uploads are served from the result cache
+    """
+    key = _cache_key(image_bytes)
+    cached = _result_cache.get(key)
+    if cached is not None:
+        return cached
+
+    result = classify_fill_level(detect_fill_level(image_bytes))
+    _result_cache.put(key, result)
+    return result
+
+
+def cache_stats():
+    """
+    Hit/miss counters and size of the analyze_bin_image cache
+    """
+    stats = _result_cache.stats()
+    stats["detector_version"] = DETECTOR_VERSION
+    return stats
+
+
+def analyze_bin_images(images):
+    """
+    Full analysis for a batch of images, same order as input
+    """
+    return [classify_fill_level(level) for level in detect_fill_levels(images)]
@@ -0,0 +1,62 @@
+import config
+
+# Readings closer together than this are folded into the next one;
+# a rate over a sub-second gap is mostly sensor noise
+MIN_INTERVAL_HOURS = 1 / 3600
+
+
+# ─────────────────────────────────────────
+# ONLINE FILL-RATE ESTIMATOR
+# ─────────────────────────────────────────
+class FillEstimate:
+    """
+    Per-bin state: last level, smoothed fill rate (% per hour),
+    time of the last reading (epoch seconds) and how many rate
+    samples went into the current estimate
+    """
+
+    __slots__ = ("level", "rate", "last_ts", "samples")
+
+    def __init__(self, level, rate=None, last_ts=None, samples=0):
+        self.level = level
+        self.rate = rate
+        self.last_ts = last_ts
+        self.samples = samples
+
+    def as_row(self, bin_id):
+        return (bin_id, self.level, self.rate, self.last_ts, self.samples)
+
+
+def update_estimate(state, level, ts):
+    """
+    O(1) update of a bin's estimate with one reading at epoch time ts
+    state = FillEstimate or None for a bin never seen before
+
+    The rate is an EWMA whose weight depends on the time since the last
+    reading (half-life ESTIMATOR_HALF_LIFE_HOURS). A drop of more than
+    EMPTYING_DROP points is a collection: the rate starts over instead
+    of averaging in a huge negative slope.
+    """
+    if state is None or state.last_ts is None:
+        return FillEstimate(level, None, ts, 0)
+
+    if level < state.level - config.EMPTYING_DROP:
+        return FillEstimate(level, None, ts, 0)
+
+    dt_hours = (ts - state.last_ts) / 3600
+    if dt_hours < 0:
+        # Out of order (late or replayed): too stale for a rate sample, but
+        # the level is still taken so a bad clock cannot freeze the estimate
+        return FillEstimate(level, state.rate, state.last_ts, state.samples)
+    if dt_hours < MIN_INTERVAL_HOURS:
+        # Too close for a rate sample, but the level is still the newest
+        return FillEstimate(level, state.rate, ts, state.samples)
+
+    observed = (level - state.level) / dt_hours
+    if state.rate is None:
+        rate = observed
+    else:
+        alpha = 1 - 0.5 ** (dt_hours / config.ESTIMATOR_HALF_LIFE_HOURS)
+        rate = state.rate + alpha * (observed - state.rate)
+
+    return FillEstimate(level, rate, ts, state.samples + 1)
@@ -0,0 +1,392 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+import config
+from database import get_changes_since, get_change_bounds
+from pathway_pipeline import process_batch
+from sensor_sources import parse_reading
+
+HTTP_REASONS = {200: "OK", 202: "Accepted", 400: "Bad Request", 404: "Not Found",
+                405: "Method Not Allowed", 413: "Payload Too Large"}
+
+
+# ─────────────────────────────────────────
+# COALESCING BUFFER
+# ─────────────────────────────────────────
+class Coalescer:
+    """
+    Latest reading per bin since the last flush
+    Several readings for one bin inside a flush window become one row
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.stats = {"accepted": 0, "rejected": 0, "coalesced": 0, "flushed": 0, "flushes": 0}
+
+    def add_lines(self, lines):
+        """
+        Parses NDJSON / CSV lines (or the items of a JSON array); returns
+        (accepted, rejected). Everything is parsed before anything is
+        buffered, so a failure part-way never leaves half a request ingested
+        """
+        readings = []
+        rejected = 0
+        for line in lines:
+            if not isinstance(line, (dict, str, bytes)):
+                rejected += 1
+                continue
+            reading = parse_reading(line)
+            if reading is None:
+                if isinstance(line, dict) or line.strip():
+                    rejected += 1
+                continue
+            readings.append(reading)
+
+        pending = self.pending
+        for reading in readings:
+            if reading.bin_id in pending:
+                self.stats["coalesced"] += 1
+            pending[reading.bin_id] = reading
+        self.stats["accepted"] += len(readings)
+        self.stats["rejected"] += rejected
+        return len(readings), rejected
+
+    def take(self):
+        batch, self.pending = list(self.pending.values()), {}
+        return batch
+
+
+# ─────────────────────────────────────────
+# CHANGE STREAM (SSE)
+# ─────────────────────────────────────────
+def format_event(rows, event="bins"):
+    """
+    One SSE event for change-log rows; the last seq is the event id
+    Several changes to one bin collapse to the newest
+    """
+    latest = {}
+    for seq, bin_id, fill_level, changed_at in rows:
+        latest[bin_id] = {"id": bin_id, "fill_level": fill_level, "last_updated": changed_at}
+    data = json.dumps(list(latest.values()))
+    return f"id: {rows[-1][0]}\nevent: {event}\ndata: {data}\n\n".encode()
+
+
+class ChangeStream:
+    """
+    Fans the bin_changes log out to SSE subscribers
+    One poller task reads new rows every STREAM_POLL_MS while anyone is
+    subscribed, so the database sees one query per interval however many
+    dashboards are open. Each subscriber has a bounded queue; one that
+    falls behind is disconnected and resumes from its Last-Event-ID
+    """
+
+    def __init__(self, reader):
+        self._reader = reader
+        self.subscribers = set()
+        self.last_seq = None
+        self._task = None
+
+    def shutdown(self):
+        if self._task is not None:
+            self._task.cancel()
+        self._reader.shutdown(wait=True)
+
+    async def _read(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._reader, fn, *args)
+
+    async def subscribe(self):
+        """
+        Returns (queue, seq): the queue gets every event after seq
+        """
+        if self.last_seq is None:
+            self.last_seq = (await self._read(get_change_bounds))[1]
+        queue = asyncio.Queue(maxsize=config.STREAM_CLIENT_BUFFER)
+        self.subscribers.add(queue)
+        if self._task is None:
+            self._task = asyncio.create_task(self._poll())
+        return queue, self.last_seq
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    def close(self):
+        # None tells each open stream to end its response
+        for queue in list(self.subscribers):
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(None)
+        self.subscribers.clear()
+
+    async def _poll(self):
+        try:
+            while self.subscribers:
+                rows = await self._read(get_changes_since, self.last_seq, config.STREAM_BACKFILL_MAX)
+                if rows:
+                    self.last_seq = rows[-1][0]
+                    event = format_event(rows)
+                    for queue in list(self.subscribers):
+                        try:
+                            queue.put_nowait(event)
+                        except asyncio.QueueFull:
+                            # Too slow: drop it; the browser reconnects and backfills
+                            self.subscribers.discard(queue)
+                            queue.get_nowait()
+                            queue.put_nowait(None)
+                if len(rows) < config.STREAM_BACKFILL_MAX:
+                    await asyncio.sleep(config.STREAM_POLL_MS / 1000)
+        finally:
+            # Forget the position so the next subscriber starts from the live end
+            self._task = None
+            self.last_seq = None
+
+    async def backfill(self, since, until):
+        """
+        Events for changes in (since, until]; None if the log no longer
+        reaches back that far, or the client is ahead of it (the database
+        was reset or restored): either way it must reload everything
+        """
+        if since > until:
+            return None
+        if since == until:
+            return []
+        oldest, _ = await self._read(get_change_bounds)
+        if oldest is None or oldest > since + 1:
+            return None
+        rows = await self._read(get_changes_since, since, config.STREAM_BACKFILL_MAX)
+        rows = [row for row in rows if row[0] <= until]
+        if rows and rows[-1][0] < until:
+            return None
+        return [format_event(rows)] if rows else []
+
+
+# ─────────────────────────────────────────
+# GATEWAY SERVER
+# ─────────────────────────────────────────
+class SensorGateway:
+    """
+    asyncio ingestion server, separate from the Flask app
+    - HTTP: POST /ingest with an NDJSON (or JSON array) body, GET /health
+    - raw TCP: newline-delimited readings, no response
+    - GET /api/stream: Server-Sent Events of bin level changes
+    Port 0 picks a free port; a negative port disables that listener
+    Readings are validated and coalesced on the event loop; every
+    flush_interval seconds the batch goes to process_batch on one
+    background thread, so SQLite writes never block the loop
+    """
+
+    def __init__(self, host=None, http_port=None, tcp_port=None, flush_interval=None):
+        self.host = host or config.GATEWAY_HOST
+        self.http_port = config.GATEWAY_HTTP_PORT if http_port is None else http_port
+        self.tcp_port = config.GATEWAY_TCP_PORT if tcp_port is None else tcp_port
+        self.flush_interval = flush_interval or config.GATEWAY_FLUSH_MS / 1000
+        self.buffer = Coalescer()
+        self.routes = {
+            ("POST", "/ingest"): self._ingest,
+            ("GET", "/health"): self._health
+        }
+        self.streams = {"/api/stream": self._stream}
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gateway-flush")
+        self.changes = ChangeStream(ThreadPoolExecutor(max_workers=1, thread_name_prefix="gateway-read"))
+        self._servers = []
+        self._flusher = None
+        self.started = time.time()
+
+    async def start(self):
+        if self.http_port >= 0:
+            server = await asyncio.start_server(self._handle_http, self.host, self.http_port)
+            self.http_port = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+            print(f"[Gateway] HTTP on {self.host}:{self.http_port}")
+        if self.tcp_port >= 0:
+            server = await asyncio.start_server(self._handle_tcp, self.host, self.tcp_port)
+            self.tcp_port = server.sockets[0].getsockname()[1]
+            self._servers.append(server)
+            print(f"[Gateway] TCP on {self.host}:{self.tcp_port}")
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def serve_forever(self):
+        await self.start()
+        await asyncio.gather(*(server.serve_forever() for server in self._servers))
+
+    async def stop(self):
+        self.changes.close()
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        if self._flusher:
+            self._flusher.cancel()
+        await self.flush()
+        self._writer.shutdown(wait=True)
+        self.changes.shutdown()
+
+    # ── flushing ──
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    async def flush(self):
+        batch = self.buffer.take()
+        if not batch:
+            return
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._writer, process_batch, batch)
+        self.buffer.stats["flushed"] += len(batch)
+        self.buffer.stats["flushes"] += 1
+
+    # ── raw TCP ──
+    async def _handle_tcp(self, reader, writer):
+        tail = b""
+        try:
+            while True:
+                chunk = await reader.read(65536)
+                if not chunk:
+                    self.buffer.add_lines([tail])
+                    break
+                # The last piece may be a partial line; keep it for the next read
+                lines = (tail + chunk).split(b"\n")
+                tail = lines.pop()
+                if len(tail) > 4096:
+                    tail = b""
+                self.buffer.add_lines(lines)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    # ── HTTP ──
+    async def _handle_http(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._respond(writer, 400, {"error": "Malformed request line"}, close=True)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                raw_length = headers.get("content-length") or "0"
+                if not (raw_length.isascii() and raw_length.isdigit()):
+                    await self._respond(writer, 400, {"error": "Invalid Content-Length"}, close=True)
+                    break
+                length = int(raw_length)
+                close = headers.get("connection", "").lower() == "close"
+                if length > config.GATEWAY_MAX_BODY_BYTES:
+                    await self._respond(writer, 413, {"error": "Body too large"}, close=True)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                route, _, query = path.partition("?")
+                if method == "GET" and route in self.streams:
+                    # Streams own the connection until the client goes away
+                    await self.streams[route](writer, headers, query)
+                    break
+
+                handler = self.routes.get((method, route))
+                if handler is None:
+                    known = any(key[1] == route for key in self.routes)
+                    status, payload = (405, {"error": "Method not allowed"}) if known else (404, {"error": "Not found"})
+                else:
+                    status, payload = handler(body)
+                await self._respond(writer, status, payload, close=close)
+                if close:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, writer, status, payload, close=False):
+        body = json.dumps(payload).encode()
+        head = (
+            f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'close' if close else 'keep-alive'}\r\n\r\n"
+        )
+        writer.write(head.encode() + body)
+        await writer.drain()
+
+    def _ingest(self, body):
+        stripped = body.lstrip()
+        if stripped.startswith(b"["):
+            try:
+                lines = json.loads(stripped)
+            except ValueError:
+                return 400, {"error": "Invalid JSON array"}
+        else:
+            lines = body.split(b"\n")
+        accepted, rejected = self.buffer.add_lines(lines)
+        return 202, {"accepted": accepted, "rejected": rejected}
+
+    def _health(self, body):
+        return 200, dict(self.buffer.stats, pending=len(self.buffer.pending),
+                         subscribers=len(self.changes.subscribers),
+                         uptime_s=round(time.time() - self.started, 1))
+
+    async def _stream(self, writer, headers, query):
+        params = dict(p.partition("=")[::2] for p in query.split("&") if p)
+        since = headers.get("last-event-id") or params.get("since")
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/event-stream\r\n"
+            b"Cache-Control: no-cache\r\n"
+            b"Connection: keep-alive\r\n"
+            b"X-Accel-Buffering: no\r\n"
+            b"Access-Control-Allow-Origin: *\r\n\r\n"
+            b"retry: 3000\n\n"
+        )
+
+        queue, seq = await self.changes.subscribe()
+        try:
+            backlog = None
+            if since is not None and since.isdigit():
+                backlog = await self.changes.backfill(int(since), seq)
+            if backlog is None:
+                # Fresh client, or too far behind: it (re)loads /api/bins, then applies events
+                event = "hello" if since is None else "reset"
+                backlog = [f"id: {seq}\nevent: {event}\ndata: {{}}\n\n".encode()]
+            for event in backlog:
+                writer.write(event)
+            await writer.drain()
+
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), config.STREAM_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    event = b": ping\n\n"
+                if event is None:
+                    break
+                writer.write(event)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.changes.unsubscribe(queue)
+
+
+def run_gateway():
+    gateway = SensorGateway()
+    print("[Gateway] Sensor ingestion gateway starting")
+    try:
+        asyncio.run(gateway.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    from database import init_db
+    init_db()
+    run_gateway()
@@ -0,0 +1,27 @@
+import os
+
+# Workers start the pipeline election themselves after fork (post_worker_init),
+# so no background thread is ever started in the master
+os.environ.setdefault("START_BACKGROUND_ON_IMPORT", "0")
+
+# Threaded workers: a long-poll (GET /api/jobs/<id>?wait=N) or a slow upload
+# holds one thread, not a whole worker process
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# GUNICORN_PRELOAD=1 imports the app once in the master; workers fork from it
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1"
+
+
+def when_ready(server):
+    # Master, after a preloaded app is imported and before any worker forks:
+    # load OpenCV / OR-Tools once so workers share the pages copy-on-write
+    if preload_app and os.environ.get("GUNICORN_WARMUP", "1") != "0":
+        from app import warm_up
+        warm_up()
+        server.log.info("Heavy modules preloaded")
+
+
+def post_worker_init(worker):
+    from app import start_background
+    start_background()
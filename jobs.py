@@ -0,0 +1,273 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import config
+from database import save_job, load_job, prune_jobs
+
+QUEUED, RUNNING, DONE, FAILED = "QUEUED", "RUNNING", "DONE", "FAILED"
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+class UnknownJobType(KeyError):
+    pass
+
+
+# ─────────────────────────────────────────
+# JOB RECORD
+# ─────────────────────────────────────────
+class Job:
+    """
+    One submitted unit of work. `done` is set once the job is DONE or FAILED
+    so callers can long-poll with Event.wait
+    `preview` is an optional interim result shown while the job runs
+    """
+
+    __slots__ = ("id", "type", "key", "fn", "args", "status", "result",
+                 "error", "created", "started", "finished", "done", "preview")
+
+    def __init__(self, job_type, key, fn, args, preview=None):
+        self.id = uuid.uuid4().hex
+        self.type = job_type
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.done = threading.Event()
+        self.preview = preview
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Read-only snapshot of a job owned by another process
+        """
+        job = cls(row["type"], None, None, None, json.loads(row["preview"]) if row["preview"] else None)
+        job.id = row["id"]
+        job.status = row["status"]
+        job.created, job.started, job.finished = row["created"], row["started"], row["finished"]
+        job.result = json.loads(row["result"]) if row["result"] else None
+        job.error = row["error"]
+        if job.finished is not None:
+            job.done.set()
+        return job
+
+    def as_row(self):
+        return (self.id, self.type, self.status, self.created, self.started, self.finished,
+                None if self.result is None else json.dumps(self.result, default=str), self.error,
+                None if self.preview is None else json.dumps(self.preview, default=str))
+
+    def as_dict(self):
+        return {
+            "job_id": self.id,
+            "type": self.type,
+            "status": self.status,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "result": self.result,
+            "error": self.error
+        }
+
+
+# ─────────────────────────────────────────
+# JOB MANAGER
+# ─────────────────────────────────────────
+class JobManager:
+    """
+    Bounded in-process job runner
+    - one shared thread pool (max_workers), created on first submit
+    - per-type concurrency limits: extra jobs wait in a per-type queue
+      instead of holding a pool thread
+    - identical in-flight jobs (same type + key) share one job id
+    - finished jobs are kept for ttl_seconds, then dropped
+    - every state change is also written to the jobs table, so any gunicorn
+      worker can answer (and long-poll) a job another worker is running
+    - at most max_pending jobs queued or running at once; a type registered
+      with its own max_pending counts against that budget instead
+    """
+
+    def __init__(self, max_workers, ttl_seconds, max_pending):
+        self.max_workers = max_workers
+        self.ttl_seconds = ttl_seconds
+        self.max_pending = max_pending
+        self._handlers = {}
+        self._limits = {}
+        self._budgets = {}
+        self._running = {}
+        self._waiting = {}
+        self._jobs = {}
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._last_db_prune = 0
+
+    def register(self, job_type, fn, limit=1, max_pending=None):
+        """
+        fn(*args) runs the job; its return value must be JSON-serializable
+        max_pending gives the type its own pending budget, so internal work
+        (e.g. route refinement) cannot crowd out jobs submitted through the API
+        """
+        with self._lock:
+            self._handlers[job_type] = fn
+            self._limits[job_type] = max(1, limit)
+            self._budgets[job_type] = max_pending
+            self._running.setdefault(job_type, 0)
+            self._waiting.setdefault(job_type, deque())
+
+    def submit(self, job_type, *args, key=None, preview=None):
+        """
+        Queues fn(*args) for job_type. Returns (job, deduplicated)
+        With a key, a job of the same type and key that is still queued or
+        running in this process is returned instead of starting another one
+        """
+        with self._lock:
+            if job_type not in self._handlers:
+                raise UnknownJobType(job_type)
+            self._prune()
+
+            if key is not None:
+                existing = self._in_flight.get((job_type, key))
+                if existing is not None:
+                    return existing, True
+
+            # Types with their own budget are counted apart from the shared one
+            own = self._budgets[job_type]
+            types = [job_type] if own is not None else [t for t, b in self._budgets.items() if b is None]
+            pending = sum(len(self._waiting[t]) + self._running[t] for t in types)
+            if pending >= (self.max_pending if own is None else own):
+                raise JobQueueFull(f"{pending} {job_type + ' ' if own is not None else ''}jobs already pending")
+
+            job = Job(job_type, key, self._handlers[job_type], args, preview)
+            self._jobs[job.id] = job
+            if key is not None:
+                self._in_flight[(job_type, key)] = job
+            # Recorded before it can start, so the RUNNING update never lands first
+            self._save(job)
+            self._waiting[job_type].append(job)
+            self._dispatch(job_type)
+        return job, False
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+        return job if job is not None else self._load(job_id)
+
+    def wait(self, job_id, timeout):
+        """
+        Blocks up to timeout seconds for the job to finish; None if unknown
+        Jobs of other processes are polled from the jobs table
+        """
+        job = self.get(job_id)
+        if job is None or timeout <= 0:
+            return job
+        if job.fn is not None:
+            job.done.wait(timeout)
+            return job
+
+        deadline = time.monotonic() + timeout
+        while not job.done.is_set() and time.monotonic() < deadline:
+            time.sleep(min(config.JOB_POLL_SECONDS, max(0, deadline - time.monotonic())))
+            job = self._load(job_id) or job
+        return job
+
+    def stats(self):
+        with self._lock:
+            return {
+                job_type: {
+                    "running": self._running[job_type],
+                    "queued": len(self._waiting[job_type]),
+                    "limit": self._limits[job_type]
+                }
+                for job_type in self._handlers
+            }
+
+    # Caller holds self._lock
+    def _dispatch(self, job_type):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="job")
+        queue = self._waiting[job_type]
+        while queue and self._running[job_type] < self._limits[job_type]:
+            job = queue.popleft()
+            self._running[job_type] += 1
+            self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        job.status = RUNNING
+        job.started = time.time()
+        self._save(job)
+        try:
+            job.result = job.fn(*job.args)
+            job.status = DONE
+        except Exception as e:
+            print(f"[Jobs Error] {job.type} {job.id}: {e}")
+            job.error = str(e)
+            job.status = FAILED
+
+        with self._lock:
+            job.finished = time.time()
+            job.args = None
+            self._running[job.type] -= 1
+            if job.key is not None and self._in_flight.get((job.type, job.key)) is job:
+                del self._in_flight[(job.type, job.key)]
+            self._dispatch(job.type)
+        self._save(job)
+        job.done.set()
+
+    # ── shared job records ──
+    def _save(self, job):
+        # The in-process record stays authoritative if the database is unavailable
+        try:
+            save_job(job.as_row())
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"[Jobs Error] saving {job.type} {job.id}: {e}")
+
+    def _load(self, job_id):
+        try:
+            row = load_job(job_id)
+        except sqlite3.Error as e:
+            print(f"[Jobs Error] loading {job_id}: {e}")
+            return None
+        if row is None or (row["finished"] and row["finished"] < time.time() - self.ttl_seconds):
+            return None
+        return Job.from_row(row)
+
+    # Caller holds self._lock
+    def _prune(self):
+        cutoff = time.time() - self.ttl_seconds
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and job.finished < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+        # Expired records of every process, at most once a minute
+        now = time.time()
+        if now - self._last_db_prune > 60:
+            self._last_db_prune = now
+            try:
+                prune_jobs(cutoff)
+            except sqlite3.Error as e:
+                print(f"[Jobs Error] pruning: {e}")
+
+
+def job_key(*parts):
+    """
+    Stable dedup key from JSON-serializable parts (e.g. params + data version)
+    """
+    raw = json.dumps(parts, sort_keys=True, default=str).encode()
+    return hashlib.sha1(raw).hexdigest()
+
+
+# Shared by the web app and the optimizer's background refinements
+job_manager = JobManager(config.JOB_WORKERS, config.JOB_TTL_SECONDS, config.JOB_MAX_PENDING)
@@ -0,0 +1,108 @@
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+import config
+from database import claim_lease, release_lease
+
+
+# ─────────────────────────────────────────
+# LEADER ELECTION
+# ─────────────────────────────────────────
+class LeaderElector:
+    """
+    Runs a background role in exactly one process out of many
+    Every candidate (gunicorn worker, standalone runner) tries to claim a
+    SQLite lease row; the holder renews it every ttl/3 seconds and the
+    others retry every LEADER_RETRY_SECONDS, taking over once a dead
+    leader's lease expires. on_elected / on_demoted start and stop the work;
+    status() is stored with each renewal so any process can report on it.
+    The lease is only renewed while healthy() says the work is still
+    running; otherwise the leader steps down and releases it
+    """
+
+    def __init__(self, name, on_elected, on_demoted, status=None, ttl=None, retry=None, healthy=None):
+        self.name = name
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.status = status
+        self.healthy = healthy
+        self.ttl = ttl or config.LEADER_LEASE_SECONDS
+        self.retry = retry or config.LEADER_RETRY_SECONDS
+        self.holder = None
+        self.is_leader = False
+        self.expires_at = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return self._thread
+        # The holder id is taken here, not in __init__, so each forked worker gets its own
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._campaign, daemon=True, name=f"leader-{self.name}")
+        self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _campaign(self):
+        while not self._stop.is_set():
+            self._tick()
+            self._stop.wait(self.ttl / 3 if self.is_leader else self.retry)
+        if self.is_leader:
+            self._demote("shutting down")
+            try:
+                release_lease(self.name, self.holder)
+            except Exception as e:
+                print(f"[Leader Error] {self.name}: {e}")
+
+    def _tick(self):
+        if self.is_leader and self.healthy is not None and not self.healthy():
+            # Holding the lease with dead workers would block every other candidate
+            self._demote("background work stopped")
+            try:
+                release_lease(self.name, self.holder)
+            except Exception as e:
+                print(f"[Leader Error] {self.name}: {e}")
+            return
+
+        try:
+            info = json.dumps(self.status()) if self.status and self.is_leader else None
+            claimed = claim_lease(self.name, self.holder, self.ttl, info)
+        except Exception as e:
+            # A slow or locked database is not proof someone else took over:
+            # keep leading until our own lease would have run out
+            print(f"[Leader Error] {self.name}: {e}")
+            if self.is_leader and time.time() >= self.expires_at:
+                self._demote("lease could not be renewed")
+            return
+
+        if claimed:
+            self.expires_at = time.time() + self.ttl
+            if not self.is_leader:
+                self.is_leader = True
+                print(f"[Leader] {self.holder} elected for {self.name}")
+                try:
+                    self.on_elected()
+                except Exception as e:
+                    # Could not start the work: hand the role to another candidate
+                    print(f"[Leader Error] {self.name}: {e}")
+                    self.is_leader = False
+                    release_lease(self.name, self.holder)
+        elif self.is_leader:
+            self._demote("lease taken over")
+
+    def _demote(self, reason):
+        self.is_leader = False
+        print(f"[Leader] {self.holder} stepped down from {self.name} ({reason})")
+        try:
+            self.on_demoted()
+        except Exception as e:
+            print(f"[Leader Error] {self.name}: {e}")
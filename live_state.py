@@ -0,0 +1,187 @@
+import mmap
+import os
+import threading
+import uuid
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process locking only
+    fcntl = None
+
+MAGIC = b"SWLIVE01"
+HEADER_SIZE = 64
+HEADER_DTYPE = np.dtype([
+    ("magic", "S8"),
+    ("epoch", "S16"),      # random per file: versions never repeat across rebuilt files
+    ("layout", "<u8"),     # bumped when the set of bins changes
+    ("seq", "<u8"),        # seqlock: odd while a writer is mid-update
+    ("version", "<u8"),    # data version, bumped on every committed write
+    ("capacity", "<u4"),
+    ("count", "<u4"),
+])
+RECORD_DTYPE = np.dtype([
+    ("id", "<i8"),
+    ("latitude", "<f8"),
+    ("longitude", "<f8"),
+    ("fill_level", "<f8"),
+    ("last_updated", "<f8"),   # epoch seconds (UTC)
+])
+
+
+# ─────────────────────────────────────────
+# LIVE STATE STORE
+# ─────────────────────────────────────────
+class LiveState:
+    """
+    Current level of every bin in an mmap'd file shared by all processes
+    on the host (gunicorn workers, pipeline, gateway)
+    Rows are sorted by bin id. Readers never lock: a seqlock counter in the
+    header tells them to retry if a write overlapped their copy. Writers
+    serialize on a thread lock plus flock on the file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._map = None
+        self._mapped_capacity = -1
+        with self._exclusive():
+            if os.fstat(self._fd).st_size < HEADER_SIZE:
+                self._create(0)
+            self._remap()
+            if self._header["magic"] != MAGIC:
+                self._create(0)
+
+    # ── mapping ──
+    def _create(self, capacity):
+        os.ftruncate(self._fd, HEADER_SIZE + capacity * RECORD_DTYPE.itemsize)
+        self._remap()
+        self._map[:HEADER_SIZE] = bytes(HEADER_SIZE)
+        header = self._header
+        header["magic"] = MAGIC
+        header["epoch"] = uuid.uuid4().hex[:16].encode()
+        header["capacity"] = capacity
+        header["count"] = 0
+
+    def _remap(self):
+        # The old map is not closed: concurrent readers may still hold views of
+        # it, and it is freed once the last view goes away
+        size = os.fstat(self._fd).st_size
+        self._map = mmap.mmap(self._fd, size)
+        self._header = np.ndarray((), HEADER_DTYPE, buffer=self._map)
+        capacity = (size - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        self._records = np.ndarray((capacity,), RECORD_DTYPE, buffer=self._map, offset=HEADER_SIZE)
+        self._mapped_capacity = capacity
+
+    def _ensure_mapped(self):
+        if self._header["capacity"] > self._mapped_capacity:
+            self._remap()
+
+    def _exclusive(self):
+        return _FileLock(self._lock, self._fd)
+
+    # ── reads ──
+    def snapshot(self):
+        """
+        Consistent copy of all rows (structured array sorted by id)
+        """
+        spins = 0
+        while True:
+            self._ensure_mapped()
+            seq = int(self._header["seq"])
+            if seq % 2:
+                spins += 1
+                if spins > 10000:
+                    self._repair()
+                continue
+            count = int(self._header["count"])
+            rows = self._records[:count].copy()
+            # len check: another thread may have swapped in a larger map meanwhile
+            if int(self._header["seq"]) == seq and len(rows) == count:
+                return rows
+
+    def _repair(self):
+        # A writer died mid-update: under the lock no write can be in flight
+        with self._exclusive():
+            if int(self._header["seq"]) % 2:
+                self._header["seq"] += 1
+
+    def layout(self):
+        return int(self._header["layout"])
+
+    def version(self):
+        return f"{self._header['epoch'][()].decode()}-{int(self._header['version'])}"
+
+    # ── writes ──
+    def load(self, rows):
+        """
+        Replaces the whole table; rows = (id, lat, lng, fill_level, last_updated epoch)
+        """
+        table = np.array(sorted(rows), dtype=RECORD_DTYPE) if rows else np.empty(0, RECORD_DTYPE)
+        with self._exclusive():
+            if len(table) > self._header["capacity"]:
+                os.ftruncate(self._fd, HEADER_SIZE + max(1024, 2 * len(table)) * RECORD_DTYPE.itemsize)
+                self._remap()
+                self._header["capacity"] = self._mapped_capacity
+            self._ensure_mapped()
+            header = self._header
+            header["seq"] += 1
+            self._records[:len(table)] = table
+            header["count"] = len(table)
+            header["layout"] += 1
+            header["version"] += 1
+            header["seq"] += 1
+
+    def update(self, levels):
+        """
+        levels = iterable of (bin_id, fill_level, epoch), at most one per bin
+        Returns the ids not in the table so the caller can reload it
+        """
+        levels = list(levels)
+        if not levels:
+            return []
+        with self._exclusive():
+            self._ensure_mapped()
+            count = int(self._header["count"])
+            ids = self._records["id"][:count]
+            wanted = np.array([row[0] for row in levels], dtype=np.int64)
+            pos = np.searchsorted(ids, wanted)
+            found = pos < count
+            found[found] = ids[pos[found]] == wanted[found]
+
+            rows = pos[found]
+            values = np.array([row[1:] for row in levels], dtype=np.float64)[found]
+
+            header = self._header
+            header["seq"] += 1
+            self._records["fill_level"][rows] = values[:, 0]
+            self._records["last_updated"][rows] = values[:, 1]
+            header["version"] += 1
+            header["seq"] += 1
+        return [row[0] for row, ok in zip(levels, found.tolist()) if not ok]
+
+    def bump_version(self):
+        with self._exclusive():
+            self._header["version"] += 1
+
+    def close(self):
+        self._header = self._records = self._map = None
+        os.close(self._fd)
+
+
+class _FileLock:
+    def __init__(self, lock, fd):
+        self.lock = lock
+        self.fd = fd
+
+    def __enter__(self):
+        self.lock.acquire()
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.lock.release()
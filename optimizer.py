@@ -1,13 +1,41 @@
-from ortools.constraint_solver import routing_enums_pb2
-from ortools.constraint_solver import pywrapcp
+import hashlib
 import math
+import os
+import threading
+import time
+from collections import OrderedDict
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import config
+import database
+from jobs import job_manager, job_key, JobQueueFull
+from route_heuristics import heuristic_tour, strip_tour, tour_length
+
+EARTH_RADIUS_M = 6371000
+
+# Depot = municipal office in Noida (Sector 6)
+DEPOT = {"name": "Depot (Municipal Office)", "latitude": 28.5706, "longitude": 77.3219}
+
+# Depot + every bin; rebuilt only when the set of bin locations changes
+_fleet_matrix = {"fingerprint": None, "index": None, "matrix": None}
+_fleet_lock = threading.Lock()
+
+# Single-truck solutions: (fleet fingerprint, bin id set) -> (bin id order, meters)
+_solution_cache = OrderedDict()
+_last_solution = {"fingerprint": None, "order": None}
+_solution_lock = threading.Lock()
+
+# Worker processes for city-scale cluster solves (created on first use)
+_city_pool = None
+_city_pool_lock = threading.Lock()
 
 def calculate_distance(coord1, coord2):
     """
     Calculate distance between two coordinates in meters
     using Haversine formula (real geographic distance)
     """
-    R = 6371000  # Earth radius in meters
+    R = EARTH_RADIUS_M
     lat1, lon1 = math.radians(coord1[0]), math.radians(coord1[1])
     lat2, lon2 = math.radians(coord2[0]), math.radians(coord2[1])
 
@@ -20,36 +48,181 @@ def calculate_distance(coord1, coord2):
     return int(R * c)
 
 
+# Cells computed per block in haversine_matrix; bounds its float64 temporaries
+_HAVERSINE_BLOCK = 1 << 20
+
+
+def haversine_matrix(coords_a, coords_b=None):
+    """
+    Broadcast haversine between two lists of (lat, lng)
+    Returns an int32 matrix of meters, truncated like calculate_distance
+    Rows are computed in blocks into the preallocated result, so peak
+    memory is the int32 output plus a few MB of float64 scratch
+    """
+    a = np.radians(np.asarray(coords_a, dtype=np.float64).reshape(-1, 2))
+    b = a if coords_b is None else np.radians(np.asarray(coords_b, dtype=np.float64).reshape(-1, 2))
+
+    lat2, lon2 = b[:, 0], b[:, 1]
+    cos_lat2 = np.cos(lat2)
+    out = np.empty((len(a), len(b)), dtype=np.int32)
+    rows = max(1, _HAVERSINE_BLOCK // max(1, len(b)))
+
+    for start in range(0, len(a), rows):
+        lat1, lon1 = a[start:start + rows, 0:1], a[start:start + rows, 1:2]
+        h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * cos_lat2 * np.sin((lon2 - lon1) / 2) ** 2
+        np.clip(h, 0.0, 1.0, out=h)
+        c = 2 * np.arctan2(np.sqrt(h), np.sqrt(1 - h))
+        out[start:start + rows] = EARTH_RADIUS_M * c
+
+    return out
+
+
+def haversine_legs(coords):
+    """
+    Meters between consecutive (lat, lng) points, truncated like calculate_distance
+    """
+    p = np.radians(np.asarray(coords, dtype=np.float64).reshape(-1, 2))
+    lat1, lon1, lat2, lon2 = p[:-1, 0], p[:-1, 1], p[1:, 0], p[1:, 1]
+    h = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    h = np.clip(h, 0.0, 1.0)
+    return (EARTH_RADIUS_M * 2 * np.arctan2(np.sqrt(h), np.sqrt(1 - h))).astype(np.int32)
+
+
 def build_distance_matrix(locations):
     """
     Build full distance matrix between all locations
     locations = list of (lat, lng) tuples
     """
-    size = len(locations)
-    matrix = []
-    for i in range(size):
-        row = []
-        for j in range(size):
-            if i == j:
-                row.append(0)
-            else:
-                row.append(calculate_distance(locations[i], locations[j]))
-        matrix.append(row)
-    return matrix
+    return haversine_matrix(locations).tolist()
+
+
+def _matrix_cache_path(fingerprint):
+    return f"{database.DB_PATH}.distances-{fingerprint}.npy"
+
+
+def _fleet_coords(bins):
+    return np.array(
+        [(DEPOT["latitude"], DEPOT["longitude"])] + [(b["latitude"], b["longitude"]) for b in bins],
+        dtype=np.float64
+    )
+
+
+def fleet_fingerprint(bins, coords=None):
+    """
+    Hash of every bin's id and coordinates (plus the depot)
+    """
+    if coords is None:
+        coords = _fleet_coords(bins)
+    ids = np.asarray([b["id"] for b in bins], dtype=np.int64)
+    return hashlib.sha1(ids.tobytes() + coords.tobytes()).hexdigest()[:16]
+
+
+def fleet_distance_matrix(bins, build=True):
+    """
+    Distance matrix over depot + all bins, cached in memory and on disk
+    Returns ({bin_id: row}, matrix) with the depot at row 0
+    The cache key is a hash of every bin's id and coordinates, so it
+    is only rebuilt when a bin is added, removed or moved
+    build=False returns None instead of building a missing matrix
+    """
+    ids = [b["id"] for b in bins]
+    coords = _fleet_coords(bins)
+    fingerprint = fleet_fingerprint(bins, coords)
+
+    with _fleet_lock:
+        if _fleet_matrix["fingerprint"] == fingerprint:
+            return _fleet_matrix["index"], _fleet_matrix["matrix"]
+
+        # Memory-mapped read-only: every worker shares the file's page cache
+        # instead of holding its own n² copy (~400 MB at 10k bins)
+        path = _matrix_cache_path(fingerprint)
+        try:
+            matrix = np.load(path, mmap_mode="r")
+        except (OSError, ValueError):
+            if not build:
+                return None
+            matrix = haversine_matrix(coords)
+            try:
+                # Write then rename, so other workers never load a partial file
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    np.save(f, matrix)
+                os.replace(tmp, path)
+                matrix = np.load(path, mmap_mode="r")
+                old_path = _fleet_matrix["fingerprint"] and _matrix_cache_path(_fleet_matrix["fingerprint"])
+                if old_path and os.path.exists(old_path):
+                    os.remove(old_path)
+            except (OSError, ValueError) as e:
+                print(f"[Optimizer] Could not persist distance matrix: {e}")
+
+        index = {bin_id: i + 1 for i, bin_id in enumerate(ids)}
+        _fleet_matrix.update(fingerprint=fingerprint, index=index, matrix=matrix)
+        return index, matrix
+
+
+def _route_array(bins, stops, use_fleet_cache=True):
+    """
+    Distance matrix (numpy) for depot + stops, sliced from the fleet matrix
+    """
+    if use_fleet_cache and all("id" in b for b in bins):
+        index, matrix = fleet_distance_matrix(bins)
+        nodes = [0] + [index[stop["id"]] for stop in stops]
+        return matrix[np.ix_(nodes, nodes)]
+
+    coords = [(DEPOT["latitude"], DEPOT["longitude"])] + [(s["latitude"], s["longitude"]) for s in stops]
+    return haversine_matrix(coords)
+
+
+def _route_matrix(bins, stops, use_fleet_cache=True):
+    return _route_array(bins, stops, use_fleet_cache).tolist()
+
+
+def solver_time_limit(n_nodes):
+    """
+    Search budget in seconds, growing with the number of nodes
+    """
+    budget = config.SOLVER_MIN_SECONDS + config.SOLVER_SECONDS_PER_NODE * n_nodes
+    return min(config.SOLVER_MAX_SECONDS, budget)
+
+
+def _search_parameters(n_nodes):
+    from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+    search_params = pywrapcp.DefaultRoutingSearchParameters()
+    search_params.first_solution_strategy = (
+        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    )
+    search_params.local_search_metaheuristic = (
+        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    )
+    search_params.time_limit.FromMilliseconds(int(solver_time_limit(n_nodes) * 1000))
+    return search_params
+
+
+def _stop(location):
+    return {
+        "name": location["name"],
+        "latitude": location["latitude"],
+        "longitude": location["longitude"],
+        "fill_level": location.get("fill_level", None)
+    }
 
 
 def optimize_route(bins, threshold=70):
     """
     Takes list of bin dicts, returns optimized collection route
     Only includes bins above threshold fill level
-    
+
     bins = [
         {"id": 1, "name": "Bin A", "latitude": 28.57, "longitude": 77.32, "fill_level": 85},
         ...
     ]
+
+    An identical bin set is answered from the solution cache. When only a
+    few bins joined or left since the last solve, the previous route (with
+    those stops inserted/removed) seeds the search instead of starting
+    from scratch. "solve" in the response says which path was taken.
     """
-    # Depot = municipal office in Noida (Sector 6)
-    depot = {"name": "Depot (Municipal Office)", "latitude": 28.5706, "longitude": 77.3219}
+    depot = DEPOT
 
     # Filter bins that need collection
     priority_bins = [b for b in bins if b["fill_level"] >= threshold]
@@ -64,13 +237,28 @@ def optimize_route(bins, threshold=70):
 
     # Build location list — depot first
     all_locations = [depot] + priority_bins
-    coords = [(loc["latitude"], loc["longitude"]) for loc in all_locations]
 
     # Build distance matrix
-    distance_matrix = build_distance_matrix(coords)
+    distance_matrix = _route_matrix(bins, priority_bins)
+
+    # Warm start / caching needs stable bin ids
+    cache_key = None
+    if all("id" in b for b in bins):
+        fingerprint = fleet_fingerprint(bins)
+        cache_key = (fingerprint, frozenset(b["id"] for b in priority_bins))
+        node_of_id = {b["id"]: node for node, b in enumerate(priority_bins, start=1)}
 
-    # OR-Tools setup
-    manager = pywrapcp.RoutingIndexManager(len(coords), 1, 0)
+        with _solution_lock:
+            cached = _solution_cache.get(cache_key)
+            if cached is not None:
+                _solution_cache.move_to_end(cache_key)
+        if cached is not None:
+            order, total_distance = cached
+            return _route_result(all_locations, [0] + [node_of_id[i] for i in order], total_distance, "cached")
+
+    # OR-Tools setup (imported here: web workers that never solve skip loading it)
+    from ortools.constraint_solver import pywrapcp
+    manager = pywrapcp.RoutingIndexManager(len(all_locations), 1, 0)
     routing = pywrapcp.RoutingModel(manager)
 
     def distance_callback(from_index, to_index):
@@ -82,17 +270,27 @@ def optimize_route(bins, threshold=70):
     routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
 
     # Search parameters
-    search_params = pywrapcp.DefaultRoutingSearchParameters()
-    search_params.first_solution_strategy = (
-        routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-    )
-    search_params.local_search_metaheuristic = (
-        routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
-    )
-    search_params.time_limit.seconds = 5
+    search_params = _search_parameters(len(all_locations))
+
+    # Seed from the previous route if the bin set barely changed
+    seed = _warm_start_seed(cache_key, node_of_id, distance_matrix) if cache_key else None
 
     # Solve
-    solution = routing.SolveWithParameters(search_params)
+    if seed:
+        search_params.time_limit.FromMilliseconds(
+            int(solver_time_limit(len(all_locations)) * config.WARM_START_TIME_FRACTION * 1000)
+        )
+        routing.CloseModelWithParameters(search_params)
+        initial = routing.ReadAssignmentFromRoutes([[manager.NodeToIndex(node) for node in seed]], True)
+        if initial:
+            solution = routing.SolveFromAssignmentWithParameters(initial, search_params)
+            solve = "warm"
+        else:
+            solution = routing.SolveWithParameters(search_params)
+            solve = "cold"
+    else:
+        solution = routing.SolveWithParameters(search_params)
+        solve = "cold"
 
     if not solution:
         return {
@@ -103,35 +301,472 @@ def optimize_route(bins, threshold=70):
         }
 
     # Extract route
-    route = []
+    nodes = []
     total_distance = 0
     index = routing.Start(0)
 
     while not routing.IsEnd(index):
-        node = manager.IndexToNode(index)
-        location = all_locations[node]
-        route.append({
-            "name": location["name"],
-            "latitude": location["latitude"],
-            "longitude": location["longitude"],
-            "fill_level": location.get("fill_level", None)
-        })
+        nodes.append(manager.IndexToNode(index))
         next_index = solution.Value(routing.NextVar(index))
         total_distance += distance_matrix[manager.IndexToNode(index)][manager.IndexToNode(next_index)]
         index = next_index
 
+    if cache_key:
+        order = [all_locations[node]["id"] for node in nodes[1:]]
+        with _solution_lock:
+            _solution_cache[cache_key] = (order, total_distance)
+            while len(_solution_cache) > config.SOLUTION_CACHE_SIZE:
+                _solution_cache.popitem(last=False)
+            _last_solution.update(fingerprint=cache_key[0], order=order)
+
+    return _route_result(all_locations, nodes, total_distance, solve)
+
+
+def _route_result(all_locations, nodes, total_distance, solve):
+    """
+    Response for a single-truck route visiting nodes (depot first)
+    """
+    route = [_stop(all_locations[node]) for node in nodes]
+
     # Add depot at end (return journey)
-    route.append({
-        "name": depot["name"],
-        "latitude": depot["latitude"],
-        "longitude": depot["longitude"],
-        "fill_level": None
-    })
+    route.append(_stop(DEPOT))
 
+    bins_in_route = len(all_locations) - 1
     return {
         "status": "SUCCESS",
-        "message": f"Optimal route calculated for {len(priority_bins)} bins",
-        "total_bins_in_route": len(priority_bins),
+        "message": f"Optimal route calculated for {bins_in_route} bins",
+        "total_bins_in_route": bins_in_route,
         "route": route,
+        "total_distance_km": round(total_distance / 1000, 2),
+        "solve": solve
+    }
+
+
+def _warm_start_seed(cache_key, node_of_id, distance_matrix):
+    """
+    Previous route adapted to the current bin set, as node indices
+    (without the depot), or None if there is nothing close enough to reuse
+    Removed bins are dropped; new bins go in at their cheapest position
+    """
+    fingerprint, current = cache_key
+    with _solution_lock:
+        if _last_solution["fingerprint"] != fingerprint or not _last_solution["order"]:
+            return None
+        previous = list(_last_solution["order"])
+
+    added = current - set(previous)
+    removed = set(previous) - current
+    if len(added) + len(removed) > config.WARM_START_MAX_CHANGES or len(removed) == len(previous):
+        return None
+
+    seed = [node_of_id[bin_id] for bin_id in previous if bin_id in current]
+    for bin_id in added:
+        node = node_of_id[bin_id]
+        tour = [0] + seed + [0]
+        costs = [
+            distance_matrix[tour[k]][node] + distance_matrix[node][tour[k + 1]] - distance_matrix[tour[k]][tour[k + 1]]
+            for k in range(len(tour) - 1)
+        ]
+        position = costs.index(min(costs))
+        seed.insert(position, node)
+    return seed
+
+
+def optimize_fleet(bins, threshold=70, vehicles=None, capacity=None, shift_minutes=None,
+                   use_fleet_cache=True):
+    """
+    Capacitated multi-truck routing (CVRP) over bins above threshold
+
+    Each bin's demand is its fill level (a full bin = 100 units) and every
+    truck carries `capacity` units. A stop costs its travel time plus a
+    service time (the bin's "service_minutes", else BIN_SERVICE_MINUTES), and
+    no truck may exceed `shift_minutes`. Bins that cannot fit in any truck
+    are returned under "dropped" instead of failing the whole solve.
+    use_fleet_cache=False builds a private matrix instead of the shared
+    fleet matrix (used for sub-problems such as city clusters).
+    """
+    vehicles = vehicles or config.FLEET_VEHICLES
+    capacity = capacity or config.TRUCK_CAPACITY
+    shift_minutes = shift_minutes or config.SHIFT_MAX_MINUTES
+    depot = DEPOT
+
+    priority_bins = [b for b in bins if b["fill_level"] >= threshold]
+
+    if not priority_bins:
+        return {
+            "status": "NO_COLLECTION_NEEDED",
+            "message": f"All bins below {threshold}% — no collection needed",
+            "routes": [],
+            "total_distance_km": 0
+        }
+
+    all_locations = [depot] + priority_bins
+    distance_matrix = _route_matrix(bins, priority_bins, use_fleet_cache)
+
+    demands = [0] + [max(1, int(round(b["fill_level"]))) for b in priority_bins]
+    service = [0] + [int(b.get("service_minutes", config.BIN_SERVICE_MINUTES) * 60) for b in priority_bins]
+    meters_per_second = config.TRUCK_SPEED_KMH * 1000 / 3600
+
+    from ortools.constraint_solver import pywrapcp
+    manager = pywrapcp.RoutingIndexManager(len(all_locations), vehicles, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    def distance_callback(from_index, to_index):
+        from_node = manager.IndexToNode(from_index)
+        to_node = manager.IndexToNode(to_index)
+        return distance_matrix[from_node][to_node]
+
+    def time_callback(from_index, to_index):
+        from_node = manager.IndexToNode(from_index)
+        to_node = manager.IndexToNode(to_index)
+        return service[from_node] + int(distance_matrix[from_node][to_node] / meters_per_second)
+
+    def demand_callback(from_index):
+        return demands[manager.IndexToNode(from_index)]
+
+    transit_callback_index = routing.RegisterTransitCallback(distance_callback)
+    routing.SetArcCostEvaluatorOfAllVehicles(transit_callback_index)
+
+    demand_callback_index = routing.RegisterUnaryTransitCallback(demand_callback)
+    routing.AddDimensionWithVehicleCapacity(
+        demand_callback_index, 0, [capacity] * vehicles, True, "Capacity"
+    )
+
+    time_callback_index = routing.RegisterTransitCallback(time_callback)
+    routing.AddDimension(time_callback_index, 0, int(shift_minutes * 60), True, "Time")
+    time_dimension = routing.GetDimensionOrDie("Time")
+
+    # Dropping a bin costs far more than any detour, so it only happens when infeasible
+    drop_penalty = 1000 * (max(max(row) for row in distance_matrix) + 1)
+    for node in range(1, len(all_locations)):
+        routing.AddDisjunction([manager.NodeToIndex(node)], drop_penalty)
+
+    solution = routing.SolveWithParameters(_search_parameters(len(all_locations)))
+
+    if not solution:
+        return {
+            "status": "NO_SOLUTION",
+            "message": "Could not find a feasible plan for the fleet",
+            "routes": [],
+            "total_distance_km": 0
+        }
+
+    routes = []
+    served = set()
+    total_distance = 0
+    for vehicle in range(vehicles):
+        index = routing.Start(vehicle)
+        if routing.IsEnd(solution.Value(routing.NextVar(index))):
+            continue
+
+        route = []
+        load = 0
+        distance = 0
+        while not routing.IsEnd(index):
+            node = manager.IndexToNode(index)
+            served.add(node)
+            load += demands[node]
+            route.append(_stop(all_locations[node]))
+            next_index = solution.Value(routing.NextVar(index))
+            distance += distance_matrix[node][manager.IndexToNode(next_index)]
+            index = next_index
+        route.append(_stop(depot))
+
+        total_distance += distance
+        routes.append({
+            "vehicle": vehicle + 1,
+            "route": route,
+            "bins": len(route) - 2,
+            "load": load,
+            "distance_km": round(distance / 1000, 2),
+            "duration_min": round(solution.Value(time_dimension.CumulVar(index)) / 60, 1)
+        })
+
+    dropped = [
+        {"id": b.get("id"), "name": b["name"], "fill_level": b["fill_level"]}
+        for node, b in enumerate(priority_bins, start=1) if node not in served
+    ]
+
+    return {
+        "status": "SUCCESS" if not dropped else "PARTIAL",
+        "message": f"{len(routes)} truck(s) cover {len(priority_bins) - len(dropped)} of {len(priority_bins)} bins",
+        "vehicles": vehicles,
+        "capacity": capacity,
+        "total_bins_in_route": len(priority_bins) - len(dropped),
+        "routes": routes,
+        "dropped": dropped,
         "total_distance_km": round(total_distance / 1000, 2)
-    }
\ No newline at end of file
+    }
+
+
+
+# ─────────────────────────────────────────
+# FAST HEURISTIC MODE + BACKGROUND REFINEMENT
+# ─────────────────────────────────────────
+def fast_route(bins, threshold=70, refine=True):
+    """
+    Returns a route in milliseconds from nearest neighbour + 2-opt/Or-opt
+    (bounded by FAST_ROUTE_BUDGET_MS), then queues a full guided local
+    search in the background. Poll get_refined_route(job_id) for it.
+    Same response shape as optimize_route, plus "mode" and "job_id".
+    """
+    started = time.perf_counter()
+    priority_bins = [b for b in bins if b["fill_level"] >= threshold]
+
+    if not priority_bins:
+        return {
+            "status": "NO_COLLECTION_NEEDED",
+            "message": f"All bins below {threshold}% — no collection needed",
+            "route": [],
+            "total_distance_km": 0
+        }
+
+    all_locations = [DEPOT] + priority_bins
+    coords = [(loc["latitude"], loc["longitude"]) for loc in all_locations]
+    budget = config.FAST_ROUTE_BUDGET_MS / 1000
+
+    # A warm fleet matrix is used directly (slicing it is O(n^2) too). A cold
+    # one is left to the refinement job: only the stops get a matrix here,
+    # and too many stops for that get a strip tour with no matrix at all
+    cached = fleet_distance_matrix(bins, build=False) if all("id" in b for b in bins) else None
+    if cached is not None:
+        index, matrix = cached
+        nodes = [0] + [index[b["id"]] for b in priority_bins]
+    elif len(all_locations) <= config.FAST_ROUTE_NN_MAX_NODES:
+        matrix = haversine_matrix(coords)
+        nodes = list(range(len(all_locations)))
+    else:
+        matrix = None
+        nodes = list(range(len(all_locations)))
+    location_of = dict(zip(nodes, all_locations))
+
+    if matrix is None:
+        tour = strip_tour(nodes, coords)
+        distance = int(haversine_legs([coords[node] for node in tour + [tour[0]]]).sum())
+    else:
+        remaining = max(0.0, budget - (time.perf_counter() - started))
+        tour = heuristic_tour(
+            matrix, nodes, remaining,
+            coords=coords, nn_max_nodes=config.FAST_ROUTE_NN_MAX_NODES
+        )
+        distance = tour_length(matrix, tour)
+
+    route = [_stop(location_of[node]) for node in tour] + [_stop(DEPOT)]
+    result = {
+        "status": "SUCCESS",
+        "mode": "fast",
+        "message": f"Heuristic route for {len(priority_bins)} bins",
+        "total_bins_in_route": len(priority_bins),
+        "route": route,
+        "total_distance_km": round(distance / 1000, 2),
+        "compute_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+    if refine:
+        job_id = _submit_refinement(bins, priority_bins, threshold, result)
+        if job_id is not None:
+            result["job_id"] = job_id
+    return result
+
+
+def _submit_refinement(bins, priority_bins, threshold, fast_result):
+    """
+    Queues one OR-Tools refinement per distinct (fleet, stop set): repeated
+    clicks share the job already in flight. Returns None when the queue is
+    full, and the caller just keeps the heuristic route
+    """
+    if all("id" in b for b in bins):
+        key = job_key(fleet_fingerprint(bins), sorted(b["id"] for b in priority_bins))
+    else:
+        key = job_key([(b["latitude"], b["longitude"]) for b in priority_bins])
+    try:
+        job, _ = job_manager.submit("refine", bins, threshold, fast_result, key=key, preview=fast_result)
+    except JobQueueFull:
+        print("[Optimizer] Refinement queue full, serving the heuristic route only")
+        return None
+    return job.id
+
+
+def _refine(bins, threshold, fast_result):
+    try:
+        refined = optimize_route(bins, threshold)
+        # Guided local search is usually better, but never hand back a worse route
+        if refined["status"] != "SUCCESS" or refined["total_distance_km"] > fast_result["total_distance_km"]:
+            refined = dict(fast_result)
+    except Exception as e:
+        print(f"[Optimizer Error] Refinement: {e}")
+        refined = dict(fast_result, error=str(e))
+    refined["mode"] = "refined"
+    refined.pop("job_id", None)
+    return refined
+
+
+job_manager.register("refine", _refine, limit=config.JOB_LIMIT_REFINE, max_pending=config.JOB_MAX_PENDING_REFINE)
+
+
+def get_refined_route(job_id):
+    """
+    Returns {"job_id", "status": RUNNING|DONE|FAILED, "result"} or None if unknown/expired
+    While RUNNING, result is the fast heuristic route
+    """
+    job = job_manager.get(job_id)
+    if job is None or job.type != "refine":
+        return None
+    if not job.done.is_set():
+        return {"job_id": job_id, "status": "RUNNING", "result": job.preview}
+    status = "FAILED" if job.result is None or "error" in job.result else "DONE"
+    return {"job_id": job_id, "status": status, "result": job.result}
+
+
+# ─────────────────────────────────────────
+# CITY-SCALE DECOMPOSITION
+# ─────────────────────────────────────────
+def partition_bins(bins, n_clusters, iterations=25, seed=0):
+    """
+    k-means on lat/lng (longitude scaled by cos(latitude) so clusters are
+    round on the ground). Deterministic k-means++ seeding.
+    Returns a cluster label per bin.
+    """
+    points = np.array([(b["latitude"], b["longitude"]) for b in bins], dtype=np.float64)
+    points[:, 1] *= np.cos(np.radians(points[:, 0].mean()))
+    n_clusters = max(1, min(n_clusters, len(points)))
+
+    rng = np.random.default_rng(seed)
+    centers = [points[rng.integers(len(points))]]
+    closest = ((points - centers[0]) ** 2).sum(axis=1)
+    for _ in range(1, n_clusters):
+        probabilities = closest / closest.sum() if closest.sum() > 0 else None
+        centers.append(points[rng.choice(len(points), p=probabilities)])
+        closest = np.minimum(closest, ((points - centers[-1]) ** 2).sum(axis=1))
+    centers = np.array(centers)
+
+    labels = np.zeros(len(points), dtype=np.int64)
+    for _ in range(iterations):
+        distances = ((points[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        new_labels = distances.argmin(axis=1)
+        if np.array_equal(new_labels, labels) and _ > 0:
+            break
+        labels = new_labels
+        for k in range(n_clusters):
+            members = points[labels == k]
+            if len(members):
+                centers[k] = members.mean(axis=0)
+    return labels
+
+
+def _allocate_vehicles(demands, capacity, total_vehicles):
+    """
+    Trucks per cluster: enough to carry each cluster's load, or exactly
+    total_vehicles split as one per cluster plus a share of the rest
+    proportional to load (largest remainder)
+    """
+    needed = [max(1, math.ceil(d / capacity)) for d in demands]
+    if not total_vehicles:
+        return needed
+    if total_vehicles < len(demands):
+        raise ValueError(f"{total_vehicles} vehicles cannot cover {len(demands)} clusters")
+
+    spare = total_vehicles - len(demands)
+    total_demand = sum(demands) or 1
+    quotas = [spare * d / total_demand for d in demands]
+    shares = [1 + int(q) for q in quotas]
+    remainders = sorted(range(len(quotas)), key=lambda k: quotas[k] - int(quotas[k]), reverse=True)
+    for k in remainders[:total_vehicles - sum(shares)]:
+        shares[k] += 1
+    return shares
+
+
+def _solve_cluster(payload):
+    cluster_bins, vehicles, capacity, shift_minutes = payload
+    started = time.perf_counter()
+    result = optimize_fleet(
+        cluster_bins, threshold=0, vehicles=vehicles, capacity=capacity,
+        shift_minutes=shift_minutes, use_fleet_cache=False
+    )
+    result["solve_seconds"] = round(time.perf_counter() - started, 3)
+    return result
+
+
+def _get_city_pool():
+    global _city_pool
+    with _city_pool_lock:
+        if _city_pool is None:
+            # spawn: never fork a process that holds SQLite connections and threads
+            _city_pool = ProcessPoolExecutor(
+                max_workers=config.CITY_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _city_pool
+
+
+def optimize_city(bins, threshold=70, clusters=None, vehicles=None, capacity=None,
+                  shift_minutes=None, parallel=True):
+    """
+    Decomposed CVRP for city-scale fleets: bins over threshold are split
+    into geographic clusters (k-means), each cluster is solved as its own
+    CVRP in a process pool, and the per-truck routes are stitched together
+    Reports total distance and the seconds spent in each stage
+    """
+    capacity = capacity or config.TRUCK_CAPACITY
+    timings = {}
+    started = time.perf_counter()
+
+    priority_bins = [b for b in bins if b["fill_level"] >= threshold]
+    if not priority_bins:
+        return {
+            "status": "NO_COLLECTION_NEEDED",
+            "message": f"All bins below {threshold}% — no collection needed",
+            "routes": [],
+            "total_distance_km": 0
+        }
+
+    # 1. Partition
+    n_clusters = clusters or math.ceil(len(priority_bins) / config.CITY_CLUSTER_SIZE)
+    if vehicles:
+        # Every cluster needs a truck: never split into more clusters than the fleet
+        n_clusters = min(n_clusters, vehicles)
+    labels = partition_bins(priority_bins, n_clusters)
+    groups = [[b for b, label in zip(priority_bins, labels) if label == k] for k in range(labels.max() + 1)]
+    groups = [group for group in groups if group]
+    demands = [sum(max(1, int(round(b["fill_level"]))) for b in group) for group in groups]
+    fleet = _allocate_vehicles(demands, capacity, vehicles)
+    timings["partition_s"] = round(time.perf_counter() - started, 3)
+
+    # 2. Solve clusters in parallel
+    stage = time.perf_counter()
+    payloads = [(group, v, capacity, shift_minutes) for group, v in zip(groups, fleet)]
+    if parallel and len(payloads) > 1:
+        results = list(_get_city_pool().map(_solve_cluster, payloads))
+    else:
+        results = [_solve_cluster(payload) for payload in payloads]
+    timings["solve_s"] = round(time.perf_counter() - stage, 3)
+    timings["cluster_solve_s"] = [r.get("solve_seconds") for r in results]
+
+    # 3. Stitch per-truck routes
+    stage = time.perf_counter()
+    routes = []
+    dropped = []
+    total_distance_km = 0
+    for cluster, result in enumerate(results):
+        for route in result.get("routes", []):
+            routes.append(dict(route, vehicle=len(routes) + 1, cluster=cluster))
+            total_distance_km += route["distance_km"]
+        dropped.extend(result.get("dropped", []))
+        if result["status"] == "NO_SOLUTION":
+            dropped.extend({"id": b.get("id"), "name": b["name"], "fill_level": b["fill_level"]} for b in groups[cluster])
+    timings["stitch_s"] = round(time.perf_counter() - stage, 3)
+    timings["total_s"] = round(time.perf_counter() - started, 3)
+
+    served = len(priority_bins) - len(dropped)
+    return {
+        "status": "SUCCESS" if not dropped else "PARTIAL",
+        "message": f"{len(routes)} truck(s) across {len(groups)} clusters cover {served} of {len(priority_bins)} bins",
+        "clusters": len(groups),
+        "vehicles": sum(fleet),
+        "capacity": capacity,
+        "total_bins_in_route": served,
+        "routes": routes,
+        "dropped": dropped,
+        "total_distance_km": round(total_distance_km, 2),
+        "timings": timings
+    }
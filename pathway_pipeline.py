@@ -1,126 +1,71 @@
-import sqlite3
-import random
-import time
+import json
 import threading
-from datetime import datetime
-import os
-
-# Use /tmp for Render deployment, local database folder otherwise
-if os.environ.get("RENDER"):
-    DB_PATH = "/tmp/waste.db"
-else:
-    DB_PATH = os.path.join(os.path.dirname(__file__), 'database', 'waste.db')
-
-
-# ─────────────────────────────────────────
-# BIN SENSOR SCHEMA
-# ─────────────────────────────────────────
-class BinSensorSchema:
-    def __init__(self, bin_id, fill_level, timestamp, location):
-        self.bin_id = bin_id
-        self.fill_level = fill_level
-        self.timestamp = timestamp
-        self.location = location
-
+import time
+from collections import deque
+from datetime import datetime, timezone
+import config
+from database import ingest_readings, get_lease, get_fill_levels
+from leader import LeaderElector
+from retention import start_retention_thread, stop_retention_thread
+from sensor_sources import BinSensorSchema, MicroBatcher, open_source
 
-# ─────────────────────────────────────────
-# LIVE SENSOR DATA GENERATOR
-# ─────────────────────────────────────────
-def generate_sensor_data():
-    bins = [
-        {"id": 1, "location": "Sector 18 Market"},
-        {"id": 2, "location": "Sector 62 Metro"},
-        {"id": 3, "location": "Botanical Garden"},
-        {"id": 4, "location": "Sector 15 Park"},
-        {"id": 5, "location": "DLF Mall Noida"},
-        {"id": 6, "location": "Sector 29 Market"},
-    ]
-
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, fill_level FROM bins")
-    current_levels = {row[0]: row[1] for row in cursor.fetchall()}
-    conn.close()
-
-    readings = []
-    for bin in bins:
-        bin_id = bin["id"]
-        current = current_levels.get(bin_id, 0)
-        increase = random.uniform(0.5, 3.0)
-        new_level = min(100, current + increase)
-
-        readings.append(BinSensorSchema(
-            bin_id=bin_id,
-            fill_level=round(new_level, 2),
-            timestamp=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            location=bin["location"]
-        ))
-
-    return readings
+LEASE_NAME = "pipeline"
 
 
 # ─────────────────────────────────────────
 # STREAM PROCESSOR
 # ─────────────────────────────────────────
-def process_stream(reading):
+def process_batch(readings):
+    """
+    Writes a micro-batch in one transaction, then alerts on full bins
+    """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "UPDATE bins SET fill_level=?, last_updated=? WHERE id=?",
-            (reading.fill_level, reading.timestamp, reading.bin_id)
+        over_threshold = ingest_readings(
+            [(r.bin_id, r.fill_level, r.timestamp) for r in readings]
         )
-        cursor.execute(
-            "INSERT INTO fill_history (bin_id, fill_level) VALUES (?,?)",
-            (reading.bin_id, reading.fill_level)
-        )
-        conn.commit()
-        conn.close()
 
-        status = "🔴 CRITICAL" if reading.fill_level >= 80 else "🟡 HIGH" if reading.fill_level >= 60 else "🟢 NORMAL"
-        print(f"[Stream] Bin {reading.bin_id} | {reading.location} | {reading.fill_level}% | {status}")
+        # Per-reading lines only for small batches; high-rate sources log a summary
+        if len(readings) <= config.PIPELINE_LOG_READINGS:
+            for reading in readings:
+                status = "🔴 CRITICAL" if reading.fill_level >= 80 else "🟡 HIGH" if reading.fill_level >= 60 else "🟢 NORMAL"
+                print(f"[Stream] Bin {reading.bin_id} | {reading.location or '-'} | {reading.fill_level}% | {status}")
+        else:
+            print(f"[Stream] {len(readings)} readings, {len(over_threshold)} bins over threshold")
+
+        locations = {r.bin_id: r.location for r in readings}
+        from alerts import hours_to_overflow
+        overflow = hours_to_overflow([bin["bin_id"] for bin in over_threshold])
+        for bin in over_threshold:
+            trigger_alert(bin["bin_id"], locations.get(bin["bin_id"]) or bin["location"], bin["fill_level"], bin["name"],
+                          overflow.get(bin["bin_id"]))
 
-        if reading.fill_level >= 80:
-            trigger_alert(reading.bin_id, reading.location, reading.fill_level)
+        return over_threshold
 
     except Exception as e:
         print(f"[Stream Error] {e}")
+        return []
+
+
+def process_stream(reading):
+    return process_batch([reading])
 
 
 # ─────────────────────────────────────────
 # ALERT TRIGGER
 # ─────────────────────────────────────────
-def trigger_alert(bin_id, location, fill_level):
+def trigger_alert(bin_id, location, fill_level, name=None, hours_to_overflow=None):
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT COUNT(*) FROM alerts
-            WHERE bin_id=?
-            AND sent_at > datetime('now', '-30 minutes')
-        """, (bin_id,))
-        already_alerted = cursor.fetchone()[0] > 0
-        conn.close()
-
-        if not already_alerted:
-            from alerts import send_whatsapp_alert
-            send_whatsapp_alert(
-                bin_name=f"Bin {bin_id}",
-                location=location,
-                fill_level=fill_level
-            )
-
-            conn = sqlite3.connect(DB_PATH)
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO alerts (bin_id, message) VALUES (?,?)",
-                (bin_id, f"Auto stream alert — {fill_level}%")
-            )
-            conn.commit()
-            conn.close()
-
-            print(f"[Alert] WhatsApp sent for Bin {bin_id} at {fill_level}%")
+        from alerts import policy
+        # Suppression window and digest batching are handled in memory by the policy
+        if policy.submit(
+            bin_id,
+            name=name or f"Bin {bin_id}",
+            location=location,
+            fill_level=fill_level,
+            hours_to_overflow=hours_to_overflow,
+            log_message=f"Auto stream alert — {fill_level}%"
+        ):
+            print(f"[Alert] WhatsApp queued for Bin {bin_id} at {fill_level}%")
 
     except Exception as e:
         print(f"[Alert Error] {e}")
@@ -129,35 +74,196 @@ def trigger_alert(bin_id, location, fill_level):
 # ─────────────────────────────────────────
 # MAIN STREAMING PIPELINE
 # ─────────────────────────────────────────
-def run_pathway_pipeline():
+# The batcher currently running in this process, and its throughput / lag
+_current = {"batcher": None}
+stats = {"source": None, "started_at": None, "cycles": 0, "readings": 0,
+         "last_cycle_at": None, "lag_s": None, "cycle_times": deque(maxlen=60)}
+
+
+def run_pathway_pipeline(source=None):
+    """
+    Streams readings from `source` (default: config.PIPELINE_SOURCE) through
+    the micro-batcher into process_batch until the source ends or
+    stop_pipeline() is called
+    """
+    source = source or open_source(config.PIPELINE_SOURCE)
+    batcher = MicroBatcher(
+        source, _handle_batch,
+        batch_size=config.PIPELINE_BATCH_SIZE,
+        max_delay=config.PIPELINE_BATCH_MAX_DELAY_MS / 1000,
+        queue_size=config.PIPELINE_QUEUE_SIZE
+    )
+    _current["batcher"] = batcher
+    stats.update(source=source.name, started_at=time.time(), cycles=0, readings=0,
+                 last_cycle_at=None, lag_s=None)
+    stats["cycle_times"].clear()
+
     print("=" * 50)
     print("🚀 Real-Time Streaming Pipeline Started")
-    print("📡 Ingesting live bin sensor data...")
-    print("🔄 Update interval: 10 seconds")
+    print(f"📡 Ingesting live bin sensor data from {source.name}...")
+    print(f"🔄 Micro-batches: {config.PIPELINE_BATCH_SIZE} readings / {config.PIPELINE_BATCH_MAX_DELAY_MS} ms")
     print("=" * 50)
 
-    cycle = 0
-    while True:
-        cycle += 1
-        print(f"\n[Pipeline] Cycle {cycle} — {datetime.now().strftime('%H:%M:%S')}")
+    result = batcher.run()
+    print(f"[Pipeline] Source ended — {result['readings']} readings in {result['batches']} batches")
+    return result
+
+
+def stop_pipeline():
+    batcher = _current["batcher"]
+    if batcher is not None:
+        batcher.stop()
+
+
+def _handle_batch(readings):
+    print(f"\n[Pipeline] Batch — {datetime.now().strftime('%H:%M:%S')}")
+    process_batch(readings)
+    print(f"[Pipeline] ✅ {len(readings)} readings processed")
 
-        readings = generate_sensor_data()
-        for reading in readings:
-            process_stream(reading)
+    now = time.time()
+    stats["cycles"] += 1
+    stats["readings"] += len(readings)
+    stats["last_cycle_at"] = now
+    stats["cycle_times"].append((now, len(readings)))
+    stats["lag_s"] = _lag(readings[0].timestamp, now)
 
-        print(f"[Pipeline] ✅ {len(readings)} bins updated")
-        time.sleep(10)
+
+def _lag(timestamp, now):
+    """
+    Seconds between a reading's own (UTC) timestamp and its processing
+    """
+    try:
+        recorded = datetime.fromisoformat(str(timestamp))
+        if recorded.tzinfo is None:
+            recorded = recorded.replace(tzinfo=timezone.utc)
+        return round(now - recorded.timestamp(), 2)
+    except ValueError:
+        return None
+
+
+def _rates():
+    """
+    (cycles per minute, readings per second) over the last 60 cycles
+    """
+    times = stats["cycle_times"]
+    if len(times) < 2:
+        return None, None
+    span = times[-1][0] - times[0][0]
+    if span <= 0:
+        return None, None
+    readings = sum(count for _, count in list(times)[1:])
+    return round((len(times) - 1) / span * 60, 2), round(readings / span, 2)
+
+
+def pipeline_info():
+    cycles_per_min, readings_per_s = _rates()
+    batcher = _current["batcher"]
+    return {
+        "source": stats["source"],
+        "started_at": stats["started_at"],
+        "cycles": stats["cycles"],
+        "readings": stats["readings"],
+        "cycles_per_min": cycles_per_min,
+        "readings_per_s": readings_per_s,
+        "last_cycle_at": stats["last_cycle_at"],
+        "lag_s": stats["lag_s"],
+        "queue_depth": batcher.queue.qsize() if batcher is not None else 0
+    }
 
 
 # ─────────────────────────────────────────
-# START AS BACKGROUND THREAD
+# LEADER-ONLY BACKGROUND WORK
 # ─────────────────────────────────────────
-def start_pipeline_thread():
-    thread = threading.Thread(target=run_pathway_pipeline, daemon=True)
+# Only the elected process runs the pipeline and the retention job, however
+# many gunicorn workers (or standalone runners) are up
+_spec = {"source": None}
+_workers = {"pipeline": None, "retention": None}
+finished = threading.Event()
+
+
+def _run_source():
+    result = run_pathway_pipeline(open_source(_spec["source"]) if _spec["source"] else None)
+    if not (_current["batcher"] and _current["batcher"].stop_event.is_set()):
+        finished.set()
+    return result
+
+
+def _start_background():
+    thread = threading.Thread(target=_run_source, daemon=True, name="pipeline")
     thread.start()
+    _workers.update(pipeline=thread, retention=start_retention_thread())
     print("[Pipeline] Background streaming thread started")
-    return thread
+
+
+def _background_alive():
+    # Retention is optional (RETENTION_INTERVAL_MINUTES=0 starts no thread)
+    pipeline, retention = _workers["pipeline"], _workers["retention"]
+    return (pipeline is not None and pipeline.is_alive()
+            and (retention is None or retention.is_alive()))
+
+
+def _stop_background():
+    stop_pipeline()
+    stop_retention_thread()
+
+
+elector = LeaderElector(LEASE_NAME, _start_background, _stop_background, status=pipeline_info,
+                        healthy=_background_alive)
+
+
+def start_pipeline_thread():
+    """
+    Joins the leader election for the pipeline; a no-op with PIPELINE_EMBEDDED=0
+    """
+    if not config.PIPELINE_EMBEDDED:
+        print("[Pipeline] Embedded pipeline disabled (run python -m pathway_pipeline)")
+        return None
+    return elector.start()
+
+
+def get_pipeline_status():
+    """
+    Leader, heartbeat and throughput of the pipeline, from the lease row
+    """
+    lease = get_lease(LEASE_NAME)
+    now = time.time()
+    if lease is None:
+        return {"status": "STOPPED", "leader": None, "is_leader": False,
+                "embedded": config.PIPELINE_EMBEDDED, "bins_monitored": len(get_fill_levels())}
+
+    if elector.is_leader:
+        info = pipeline_info()
+    else:
+        info = json.loads(lease["info"]) if lease["info"] else {}
+    alive = lease["expires_at"] > now
+    running = alive and info.get("last_cycle_at") is not None
+    return dict(
+        info,
+        status="RUNNING" if running else "STARTING" if alive else "STALE",
+        leader=lease["holder"],
+        is_leader=elector.is_leader,
+        embedded=config.PIPELINE_EMBEDDED,
+        leader_since=lease["acquired_at"],
+        heartbeat_age_s=round(now - lease["renewed_at"], 2),
+        lease_expires_in_s=round(lease["expires_at"] - now, 2),
+        seconds_since_cycle=round(now - info["last_cycle_at"], 2) if info.get("last_cycle_at") else None,
+        bins_monitored=len(get_fill_levels())
+    )
 
 
 if __name__ == "__main__":
-    run_pathway_pipeline()
\ No newline at end of file
+    # Standalone runner: python -m pathway_pipeline [source spec]
+    # Competes for the same lease as embedded workers, so run any number of them
+    import sys
+    from database import init_db
+    init_db()
+    if len(sys.argv) > 1:
+        _spec["source"] = sys.argv[1]
+    elector.start()
+    try:
+        # Sources like synthetic never end; replay files do
+        while not finished.wait(1):
+            pass
+    except KeyboardInterrupt:
+        pass
+    elector.stop()
@@ -1,47 +1,15 @@
-from database import get_fill_history
+from database import get_fill_history, get_recent_history_many, get_estimates
 from datetime import datetime
+import numpy as np
 
-def predict_overflow(bin_id):
-    """
-    Looks at fill history of a bin and predicts
-    how many hours until it overflows (reaches 100%)
-    """
-    history = get_fill_history(bin_id)
-
-    if len(history) < 2:
-        return {
-            "bin_id": bin_id,
-            "prediction": "Not enough data",
-            "hours_to_overflow": None,
-            "urgency": "UNKNOWN"
-        }
-
-    # Get fill levels in order (oldest first)
-    levels = [(row[0], row[1]) for row in reversed(history)]
-
-    # Calculate average fill rate per hour
-    fill_rates = []
-    for i in range(1, len(levels)):
-        level_diff = levels[i][0] - levels[i-1][0]
-
-        time1 = datetime.strptime(levels[i-1][1], "%Y-%m-%d %H:%M:%S")
-        time2 = datetime.strptime(levels[i][1], "%Y-%m-%d %H:%M:%S")
-        time_diff = (time2 - time1).total_seconds() / 3600  # in hours
-
-        if time_diff > 0:
-            rate = level_diff / time_diff
-            fill_rates.append(rate)
+# Readings per bin used to estimate the fill rate
+HISTORY_WINDOW = 20
 
-    if not fill_rates:
-        return {
-            "bin_id": bin_id,
-            "prediction": "Cannot calculate",
-            "hours_to_overflow": None,
-            "urgency": "UNKNOWN"
-        }
 
-    avg_rate = sum(fill_rates) / len(fill_rates)
-    current_fill = levels[-1][0]
+def _build_prediction(bin_id, current_fill, avg_rate):
+    """
+    Turns a current level + average fill rate into the prediction dict
+    """
     remaining = 100 - current_fill
 
     if avg_rate <= 0:
@@ -78,17 +46,153 @@ def predict_overflow(bin_id):
     }
 
 
+def _no_data(bin_id):
+    return {
+        "bin_id": bin_id,
+        "prediction": "Not enough data",
+        "hours_to_overflow": None,
+        "urgency": "UNKNOWN"
+    }
+
+
+def _no_rate(bin_id):
+    return {
+        "bin_id": bin_id,
+        "prediction": "Cannot calculate",
+        "hours_to_overflow": None,
+        "urgency": "UNKNOWN"
+    }
+
+
+def predict_overflow(bin_id):
+    """
+    Looks at fill history of a bin and predicts
+    how many hours until it overflows (reaches 100%)
+    """
+    history = get_fill_history(bin_id)
+
+    if len(history) < 2:
+        return _no_data(bin_id)
+
+    # Get fill levels in order (oldest first)
+    levels = [(row[0], row[1]) for row in reversed(history)]
+
+    # Calculate average fill rate per hour
+    fill_rates = []
+    for i in range(1, len(levels)):
+        level_diff = levels[i][0] - levels[i-1][0]
+
+        time1 = datetime.strptime(levels[i-1][1], "%Y-%m-%d %H:%M:%S")
+        time2 = datetime.strptime(levels[i][1], "%Y-%m-%d %H:%M:%S")
+        time_diff = (time2 - time1).total_seconds() / 3600  # in hours
+
+        if time_diff > 0:
+            rate = level_diff / time_diff
+            fill_rates.append(rate)
+
+    if not fill_rates:
+        return _no_rate(bin_id)
+
+    avg_rate = sum(fill_rates) / len(fill_rates)
+    current_fill = levels[-1][0]
+
+    return _build_prediction(bin_id, current_fill, avg_rate)
+
+
+def predict_fleet(bin_ids, window=HISTORY_WINDOW):
+    """
+    Same results as predict_overflow for every bin, from one history
+    query and array maths over a (bins x window) matrix
+    Returned in the order of bin_ids
+    """
+    bin_ids = list(bin_ids)
+    if not bin_ids:
+        return []
+
+    ids = np.array(sorted(set(bin_ids)), dtype=np.int64)
+    n = len(ids)
+
+    levels = np.full((n, window), np.nan)
+    times = np.full((n, window), np.nan)
+    counts = np.zeros(n, dtype=np.int64)
+
+    rows = get_recent_history_many(ids.tolist(), window)
+    if rows:
+        data = np.array(rows, dtype=np.float64)
+        row_bins = data[:, 0].astype(np.int64)
+
+        # Rows arrive grouped by bin, oldest first: column = position within the group
+        uniq, start, group_size = np.unique(row_bins, return_index=True, return_counts=True)
+        col = np.arange(len(rows)) - np.repeat(start, group_size)
+        row = np.searchsorted(ids, row_bins)
+
+        levels[row, col] = data[:, 1]
+        times[row, col] = data[:, 2]
+        counts[np.searchsorted(ids, uniq)] = group_size
+
+    # Pairwise rates; missing or non-increasing timestamps are skipped, as in predict_overflow
+    level_diff = levels[:, 1:] - levels[:, :-1]
+    time_diff = (times[:, 1:] - times[:, :-1]) / 3600
+    valid = time_diff > 0
+    rates = np.where(valid, level_diff / np.where(valid, time_diff, 1), 0.0)
+
+    # Column-by-column Neumaier summation, the same algorithm sum() uses for
+    # floats since Python 3.12, so both paths agree to the last bit there
+    rate_sum = np.zeros(n)
+    compensation = np.zeros(n)
+    for j in range(window - 1):
+        x = rates[:, j]
+        t = rate_sum + x
+        compensation += np.where(np.abs(rate_sum) >= np.abs(x), (rate_sum - t) + x, (x - t) + rate_sum)
+        rate_sum = t
+    rate_sum = rate_sum + compensation
+    rate_count = valid.sum(axis=1)
+
+    current = levels[np.arange(n), np.maximum(counts - 1, 0)]
+
+    by_id = {}
+    for i, bin_id in enumerate(ids.tolist()):
+        if counts[i] < 2:
+            by_id[bin_id] = _no_data(bin_id)
+        elif rate_count[i] == 0:
+            by_id[bin_id] = _no_rate(bin_id)
+        else:
+            by_id[bin_id] = _build_prediction(bin_id, float(current[i]), float(rate_sum[i] / rate_count[i]))
+
+    return [dict(by_id[int(bin_id)], bin_id=bin_id) for bin_id in bin_ids]
+
+
+def predict_from_estimates(bin_ids):
+    """
+    Predictions from the online estimates kept at ingest time
+    Bins with no rate yet (no estimate, first reading since an emptying,
+    or history from before the estimator existed) fall back to
+    predict_fleet over their history
+    """
+    bin_ids = list(bin_ids)
+    estimates = get_estimates(bin_ids)
+
+    missing = [bin_id for bin_id in bin_ids if bin_id not in estimates or estimates[bin_id].rate is None]
+    fallback = {r["bin_id"]: r for r in predict_fleet(missing)} if missing else {}
+
+    results = []
+    for bin_id in bin_ids:
+        if bin_id in fallback:
+            results.append(fallback[bin_id])
+        else:
+            estimate = estimates[bin_id]
+            results.append(_build_prediction(bin_id, estimate.level, estimate.rate))
+    return results
+
+
 def predict_all_bins(bin_ids):
     """
     Predict overflow for all bins at once
     Returns sorted by urgency (most critical first)
     """
-    results = []
-    for bin_id in bin_ids:
-        result = predict_overflow(bin_id)
-        results.append(result)
+    results = predict_from_estimates(bin_ids)
 
     # Sort by hours to overflow (critical first)
     results.sort(key=lambda x: x.get("hours_to_overflow") or 9999)
 
-    return results
\ No newline at end of file
+    return results
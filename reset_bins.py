@@ -1,12 +1,6 @@
-import sqlite3
-import os
-
-DB_PATH = os.path.join(os.path.dirname(__file__), 'database', 'waste.db')
+from database import transaction, refresh_live_state, SQL_INSERT_CHANGE
 
 def reset_bins():
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
     # Reset all bins to low levels for fresh demo
     starting_levels = [
         (1, 12.5),   # Bin A — Sector 18 Market
@@ -17,20 +11,26 @@ def reset_bins():
         (6, 31.2),   # Bin F — Sector 29 Market
     ]
     
-    for bin_id, level in starting_levels:
-        cursor.execute(
+    with transaction() as cursor:
+        cursor.executemany(
             "UPDATE bins SET fill_level=?, last_updated=CURRENT_TIMESTAMP WHERE id=?",
-            (level, bin_id)
+            [(level, bin_id) for bin_id, level in starting_levels]
         )
-    
-    # Clear alert history for fresh demo
-    cursor.execute("DELETE FROM alerts")
-    
-    # Clear fill history for clean predictions
-    cursor.execute("DELETE FROM fill_history")
-    
-    conn.commit()
-    conn.close()
+        # Live dashboards pick the reset up from the change stream
+        cursor.executemany(SQL_INSERT_CHANGE, [(bin_id, level, None) for bin_id, level in starting_levels])
+
+        # Clear alert history for fresh demo
+        cursor.execute("DELETE FROM alerts")
+
+        # Clear fill history for clean predictions
+        cursor.execute("DELETE FROM fill_history")
+        cursor.execute("DELETE FROM fill_history_hourly")
+        cursor.execute("DELETE FROM fill_history_daily")
+        cursor.execute("DELETE FROM fill_estimates")
+        cursor.execute("UPDATE history_watermarks SET level=NULL, stored_ts=NULL")
+
+    # Push the new levels into the live store; running workers drop their cached responses
+    refresh_live_state()
     
     print("=" * 50)
     print("✅ Bins reset for demo day!")
@@ -0,0 +1,60 @@
+import threading
+from datetime import datetime
+import config
+from database import rollup_and_prune
+
+
+# ─────────────────────────────────────────
+# RETENTION JOB
+# ─────────────────────────────────────────
+def run_retention():
+    """
+    One rollup + prune pass with the configured windows
+    """
+    try:
+        result = rollup_and_prune(
+            raw_hours=config.HISTORY_RAW_RETENTION_HOURS,
+            hourly_days=config.HISTORY_HOURLY_RETENTION_DAYS,
+            daily_days=config.HISTORY_DAILY_RETENTION_DAYS,
+            alert_days=config.ALERT_RETENTION_DAYS,
+            changes_minutes=config.STREAM_CHANGES_RETENTION_MINUTES
+        )
+        print(f"[Retention] {datetime.now().strftime('%H:%M:%S')} {result}")
+        return result
+    except Exception as e:
+        print(f"[Retention Error] {e}")
+        return None
+
+
+def run_retention_loop(stop_event):
+    while not stop_event.is_set():
+        run_retention()
+        stop_event.wait(config.RETENTION_INTERVAL_MINUTES * 60)
+
+
+# ─────────────────────────────────────────
+# START AS BACKGROUND THREAD
+# ─────────────────────────────────────────
+_stop_event = None
+
+
+def start_retention_thread():
+    global _stop_event
+    if config.RETENTION_INTERVAL_MINUTES <= 0:
+        print("[Retention] Disabled")
+        return None
+    # Each thread gets its own event so a restart never revives a stopping loop
+    _stop_event = threading.Event()
+    thread = threading.Thread(target=run_retention_loop, args=(_stop_event,), daemon=True)
+    thread.start()
+    print(f"[Retention] Background job started (every {config.RETENTION_INTERVAL_MINUTES} min)")
+    return thread
+
+
+def stop_retention_thread():
+    if _stop_event is not None:
+        _stop_event.set()
+
+
+if __name__ == "__main__":
+    run_retention()
@@ -0,0 +1,131 @@
+import time
+import numpy as np
+
+
+# ─────────────────────────────────────────
+# CONSTRUCTION
+# ─────────────────────────────────────────
+def nearest_neighbour(matrix, nodes, deadline=None):
+    """
+    Greedy tour over `nodes` (matrix indices) from nodes[0], always driving
+    to the closest unvisited node. Returns the order without the return leg
+    Past the deadline the unvisited nodes are appended in their given order
+    """
+    remaining = np.asarray(nodes[1:])
+    tour = [nodes[0]]
+    current = nodes[0]
+    while len(remaining):
+        if deadline is not None and time.perf_counter() >= deadline:
+            return tour + remaining.tolist()
+        k = int(np.argmin(matrix[current, remaining]))
+        current = int(remaining[k])
+        tour.append(current)
+        remaining = np.delete(remaining, k)
+    return tour
+
+
+def strip_tour(nodes, coords):
+    """
+    O(n log n) tour: stops cut into ~sqrt(n/2) latitude strips, walked
+    west-east and east-west alternately (boustrophedon), depot first
+    coords = (lat, lng) per node, aligned with nodes
+    """
+    coords = np.asarray(coords, dtype=np.float64)[1:]
+    n_strips = max(1, int(np.sqrt(len(coords) / 2)))
+
+    lat = coords[:, 0]
+    span = lat.max() - lat.min() or 1.0
+    strip = np.minimum(((lat - lat.min()) / span * n_strips).astype(np.int64), n_strips - 1)
+
+    # Odd strips run the other way
+    lng = np.where(strip % 2 == 0, coords[:, 1], -coords[:, 1])
+    order = np.lexsort((lng, strip))
+    return [nodes[0]] + [nodes[i + 1] for i in order]
+
+
+def tour_length(matrix, tour):
+    closed = np.append(tour, tour[0])
+    return int(matrix[closed[:-1], closed[1:]].sum())
+
+
+# ─────────────────────────────────────────
+# IMPROVEMENT
+# ─────────────────────────────────────────
+def two_opt(matrix, tour, deadline):
+    """
+    Reverses segments while that shortens the closed tour
+    Each pass scores every second edge for a fixed first edge in one array op
+    Assumes a symmetric matrix; node 0 stays at the front
+    """
+    tour = np.asarray(tour)
+    n = len(tour)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for i in range(0, n - 2):
+            if time.perf_counter() >= deadline:
+                break
+            a, b = tour[i], tour[i + 1]
+            c = tour[i + 2:]
+            d = np.append(tour[i + 3:], tour[0])
+            delta = matrix[a, c] + matrix[b, d] - matrix[a, b] - matrix[c, d]
+            j = int(np.argmin(delta))
+            if delta[j] < 0:
+                j += i + 2
+                tour[i + 1:j + 1] = tour[i + 1:j + 1][::-1].copy()
+                improved = True
+    return tour.tolist()
+
+
+def or_opt(matrix, tour, deadline, max_segment=3):
+    """
+    Moves runs of 1..max_segment stops to the cheapest other place in the tour
+    """
+    tour = list(tour)
+    improved = True
+    while improved and time.perf_counter() < deadline:
+        improved = False
+        for seg_len in range(1, max_segment + 1):
+            i = 1
+            while i + seg_len <= len(tour) and time.perf_counter() < deadline:
+                prev, first = tour[i - 1], tour[i]
+                last = tour[i + seg_len - 1]
+                nxt = tour[(i + seg_len) % len(tour)]
+                removed_gain = matrix[prev, first] + matrix[last, nxt] - matrix[prev, nxt]
+
+                rest = tour[:i] + tour[i + seg_len:]
+                rest_arr = np.asarray(rest)
+                after = np.append(rest_arr[1:], rest_arr[0])
+                insert_cost = matrix[rest_arr, first] + matrix[last, after] - matrix[rest_arr, after]
+
+                k = int(np.argmin(insert_cost))
+                if insert_cost[k] < removed_gain:
+                    segment = tour[i:i + seg_len]
+                    tour = rest[:k + 1] + segment + rest[k + 1:]
+                    improved = True
+                else:
+                    i += 1
+    return tour
+
+
+def heuristic_tour(matrix, nodes, budget_seconds, coords=None, nn_max_nodes=2000):
+    """
+    Builds a tour over `nodes` (indices into matrix, depot first), then
+    improves it with 2-opt and Or-opt until the time budget runs out
+    Nearest neighbour is O(n^2), so above nn_max_nodes (and when coords
+    are given) the cheaper strip tour seeds the search instead; it also
+    stops at the deadline, so construction never overruns the budget
+    Returns matrix indices starting at the depot, without the return leg
+    """
+    deadline = time.perf_counter() + budget_seconds
+    nodes = [int(node) for node in nodes]
+    if len(nodes) <= 3:
+        return nodes
+
+    if coords is not None and len(nodes) > nn_max_nodes:
+        tour = strip_tour(nodes, coords)
+    else:
+        tour = nearest_neighbour(matrix, nodes, deadline)
+    tour = two_opt(matrix, tour, deadline)
+    tour = or_opt(matrix, tour, deadline)
+    return [int(node) for node in tour]
@@ -0,0 +1,321 @@
+import csv
+import json
+import queue
+import random
+import socket
+import socketserver
+import threading
+import time
+from datetime import datetime
+from database import get_all_bins
+
+
+# ─────────────────────────────────────────
+# BIN SENSOR SCHEMA
+# ─────────────────────────────────────────
+class BinSensorSchema:
+    def __init__(self, bin_id, fill_level, timestamp, location):
+        self.bin_id = bin_id
+        self.fill_level = fill_level
+        self.timestamp = timestamp
+        self.location = location
+
+
+def parse_reading(record):
+    """
+    One reading from a dict ({"bin_id", "fill_level", "timestamp"?, "location"?})
+    or a text line: JSON object or "bin_id,fill_level[,timestamp]"
+    Timestamps are UTC "YYYY-MM-DD HH:MM:SS", the format SQLite's CURRENT_TIMESTAMP uses
+    Returns None for blank or malformed input
+    """
+    try:
+        if isinstance(record, (bytes, str)):
+            line = record.decode() if isinstance(record, bytes) else record
+            line = line.strip()
+            if not line:
+                return None
+            if line.startswith("{"):
+                record = json.loads(line)
+            else:
+                fields = [f.strip() for f in line.split(",")]
+                record = {"bin_id": fields[0], "fill_level": fields[1],
+                          "timestamp": fields[2] if len(fields) > 2 else None}
+
+        return BinSensorSchema(
+            bin_id=int(record["bin_id"]),
+            fill_level=round(min(100.0, max(0.0, float(record["fill_level"]))), 2),
+            timestamp=record.get("timestamp") or None,
+            location=record.get("location")
+        )
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+# ─────────────────────────────────────────
+# SOURCES
+# ─────────────────────────────────────────
+class SensorSource:
+    """
+    Iterable of BinSensorSchema readings. Iteration ends when the source is
+    exhausted or close() is called
+    """
+
+    name = "source"
+
+    def __init__(self):
+        self._closed = threading.Event()
+
+    def __iter__(self):
+        raise NotImplementedError
+
+    def close(self):
+        self._closed.set()
+
+    @property
+    def closed(self):
+        return self._closed.is_set()
+
+
+class SyntheticSource(SensorSource):
+    """
+    Random fill increments for every bin, one round every `interval` seconds
+    Bins and their levels are read once and then tracked in memory
+    interval=0 emits rounds back to back (load testing)
+    """
+
+    name = "synthetic"
+
+    def __init__(self, interval=10, rounds=None, seed=None):
+        super().__init__()
+        self.interval = interval
+        self.rounds = rounds
+        self.rng = random.Random(seed)
+
+    def __iter__(self):
+        bins = get_all_bins()
+        locations = {bin[0]: bin[2] for bin in bins}
+        levels = {bin[0]: bin[5] or 0 for bin in bins}
+
+        done = 0
+        while not self.closed and (self.rounds is None or done < self.rounds):
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime())
+            for bin_id in levels:
+                levels[bin_id] = min(100, levels[bin_id] + self.rng.uniform(0.5, 3.0))
+                yield BinSensorSchema(bin_id, round(levels[bin_id], 2), timestamp, locations[bin_id])
+            done += 1
+            if self.interval and self._closed.wait(self.interval):
+                break
+
+
+class ReplaySource(SensorSource):
+    """
+    Replays readings from a JSONL or CSV file (header: bin_id,fill_level[,timestamp])
+    speed=0 replays as fast as the pipeline accepts; speed=N replays at N x the
+    recorded pace, using the timestamps in the file
+    """
+
+    name = "replay"
+
+    def __init__(self, path, speed=0, loop=False):
+        super().__init__()
+        self.path = path
+        self.speed = speed
+        self.loop = loop
+
+    def _records(self, f):
+        if self.path.endswith(".csv"):
+            return csv.DictReader(f)
+        return f
+
+    def __iter__(self):
+        while not self.closed:
+            previous = None
+            with open(self.path, newline="") as f:
+                for record in self._records(f):
+                    if self.closed:
+                        return
+                    reading = parse_reading(record)
+                    if reading is None:
+                        continue
+                    if self.speed and reading.timestamp:
+                        recorded = datetime.strptime(reading.timestamp, "%Y-%m-%d %H:%M:%S")
+                        if previous is not None and recorded > previous:
+                            self._closed.wait((recorded - previous).total_seconds() / self.speed)
+                        previous = recorded
+                    yield reading
+            if not self.loop:
+                return
+
+
+class SocketSource(SensorSource):
+    """
+    Listens on a local UDP or TCP port for newline-separated readings
+    (JSON objects or "bin_id,fill_level[,timestamp]" lines)
+    A UDP datagram may carry several lines. Received readings wait in a
+    bounded buffer; when it is full, UDP readings are dropped and counted,
+    TCP senders block
+    """
+
+    name = "socket"
+
+    def __init__(self, host="127.0.0.1", port=9999, protocol="udp", buffer_size=10000):
+        super().__init__()
+        self.host = host
+        self.port = port
+        self.protocol = protocol
+        self.buffer = queue.Queue(maxsize=buffer_size)
+        self.dropped = 0
+        self._server = None
+
+    def _start(self):
+        source = self
+
+        if self.protocol == "tcp":
+            class Handler(socketserver.StreamRequestHandler):
+                def handle(self):
+                    for line in self.rfile:
+                        if source.closed:
+                            return
+                        reading = parse_reading(line)
+                        if reading is not None:
+                            source.buffer.put(reading)
+
+            server_class = socketserver.ThreadingTCPServer
+        else:
+            class Handler(socketserver.BaseRequestHandler):
+                def handle(self):
+                    for line in self.request[0].splitlines():
+                        reading = parse_reading(line)
+                        if reading is None:
+                            continue
+                        try:
+                            source.buffer.put_nowait(reading)
+                        except queue.Full:
+                            source.dropped += 1
+
+            server_class = socketserver.UDPServer
+
+        server_class.allow_reuse_address = True
+        server_class.daemon_threads = True
+        self._server = server_class((self.host, self.port), Handler)
+        if self.protocol == "udp":
+            # Let bursts queue in the kernel rather than being dropped
+            self._server.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.2}, daemon=True).start()
+        print(f"[Source] Listening on {self.protocol}://{self.host}:{self.port}")
+
+    def __iter__(self):
+        if self._server is None:
+            self._start()
+        while not self.closed:
+            try:
+                yield self.buffer.get(timeout=0.2)
+            except queue.Empty:
+                continue
+
+    def close(self):
+        super().close()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+
+def open_source(spec):
+    """
+    Source from a spec string:
+      synthetic[:interval]      e.g. synthetic:10
+      replay:<path>[@speed]     e.g. replay:readings.jsonl@60
+      udp:<host>:<port> / tcp:<host>:<port>
+    """
+    kind, _, rest = spec.partition(":")
+    if kind == "synthetic":
+        return SyntheticSource(interval=float(rest) if rest else 10)
+    if kind == "replay":
+        path, _, speed = rest.partition("@")
+        return ReplaySource(path, speed=float(speed) if speed else 0)
+    if kind in ("udp", "tcp"):
+        host, _, port = rest.rpartition(":")
+        return SocketSource(host or "127.0.0.1", int(port), protocol=kind)
+    raise ValueError(f"Unknown sensor source '{spec}'")
+
+
+# ─────────────────────────────────────────
+# MICRO-BATCHING
+# ─────────────────────────────────────────
+_END = object()
+
+
+class MicroBatcher:
+    """
+    Runs a source on a producer thread into a bounded queue and hands the
+    consumer micro-batches of up to batch_size readings, or whatever arrived
+    within max_delay seconds of the first reading in the batch
+    A full queue blocks the producer (backpressure onto the source)
+    """
+
+    def __init__(self, source, handle_batch, batch_size=500, max_delay=0.2, queue_size=10000):
+        self.source = source
+        self.handle_batch = handle_batch
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.stats = {"readings": 0, "batches": 0, "max_queue": 0}
+
+    def _produce(self):
+        try:
+            for reading in self.source:
+                while not self.stop_event.is_set():
+                    try:
+                        self.queue.put(reading, timeout=0.2)
+                        break
+                    except queue.Full:
+                        continue
+                if self.stop_event.is_set():
+                    break
+        except Exception as e:
+            print(f"[Source Error] {self.source.name}: {e}")
+        finally:
+            self.queue.put(_END)
+
+    def _next_batch(self):
+        """
+        Returns (batch, ended)
+        """
+        first = self.queue.get()
+        if first is _END:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self.queue.get(timeout=remaining) if remaining > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _END:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def run(self):
+        """
+        Consumes until the source ends or stop() is called
+        """
+        producer = threading.Thread(target=self._produce, daemon=True, name=f"source-{self.source.name}")
+        producer.start()
+
+        ended = False
+        while not ended:
+            self.stats["max_queue"] = max(self.stats["max_queue"], self.queue.qsize())
+            batch, ended = self._next_batch()
+            if batch:
+                self.handle_batch(batch)
+                self.stats["readings"] += len(batch)
+                self.stats["batches"] += 1
+        return self.stats
+
+    def stop(self):
+        self.stop_event.set()
+        self.source.close()
@@ -1,62 +1,150 @@
 let alertsCount = 0;
 
 // ─── LOAD BINS ───
-async function loadBins() {
-    const res = await fetch('/api/bins');
-    const bins = await res.json();
-
-    let html = '';
-    let critical = 0;
-    let totalFill = 0;
+let binState = {};
+let loading = null;
+
+function loadBins() {
+    // Concurrent callers share one request
+    if (!loading) {
+        loading = fetch('/api/bins')
+            .then(res => res.json())
+            .then(renderBins)
+            .finally(() => { loading = null; });
+    }
+    return loading;
+}
 
-    // Clear bin select options except first
-    const select = document.getElementById('bin-select');
-    select.innerHTML = '<option value="">Select Bin...</option>';
+function renderBins(bins) {
+    const ids = bins.map(bin => String(bin.id));
+    const sameBins = ids.length === Object.keys(binState).length && ids.every(id => id in binState);
+    binState = {};
+    bins.forEach(bin => { binState[bin.id] = bin; });
+
+    if (sameBins) {
+        // Same bins as before: patch the cards instead of rebuilding the list
+        bins.forEach(updateBinCard);
+    } else {
+        document.getElementById('bin-list').innerHTML = bins.map(bin =>
+            `<div class="bin-card" id="bin-card-${bin.id}">${binCardHtml(bin)}</div>`
+        ).join('');
+        bins.forEach(updateBinCard);
+
+        // Clear bin select options except first
+        const select = document.getElementById('bin-select');
+        select.innerHTML = '<option value="">Select Bin...</option>';
+        bins.forEach(bin => {
+            const opt = document.createElement('option');
+            opt.value = bin.id;
+            opt.text = `${bin.name} — ${bin.location}`;
+            select.appendChild(opt);
+        });
+    }
 
-    bins.forEach(bin => {
-        const fill = bin.fill_level;
-        totalFill += fill;
-        if (fill >= 80) critical++;
+    updateStats();
+    updateMapMarkers(bins, true);
+}
 
-        const cardClass = fill >= 80 ? 'critical' : fill >= 60 ? 'high' : '';
-        const barColor = getFillColor(fill);
-        const status = fill >= 80 ? '🔴 CRITICAL' : fill >= 60 ? '🟡 HIGH' : '🟢 NORMAL';
+function binCardHtml(bin) {
+    const fill = bin.fill_level;
+    const barColor = getFillColor(fill);
+    const status = fill >= 80 ? '🔴 CRITICAL' : fill >= 60 ? '🟡 HIGH' : '🟢 NORMAL';
+
+    return `
+        <div class="bin-header">
+            <div>
+                <div class="bin-name">${bin.name}</div>
+                <div class="bin-location">📍 ${bin.location}</div>
+            </div>
+            <div style="text-align:right;">
+                <div style="font-size:18px;font-weight:bold;color:${barColor}">${fill}%</div>
+                <div style="font-size:11px;">${status}</div>
+            </div>
+        </div>
+        <div class="fill-bar-bg">
+            <div class="fill-bar" style="width:${fill}%;background:${barColor};"></div>
+        </div>
+        <div class="fill-info">
+            <span>Last updated: ${bin.last_updated || 'N/A'}</span>
+            <span>Bin ID: ${bin.id}</span>
+        </div>`;
+}
 
-        html += `
-            <div class="bin-card ${cardClass}">
-                <div class="bin-header">
-                    <div>
-                        <div class="bin-name">${bin.name}</div>
-                        <div class="bin-location">📍 ${bin.location}</div>
-                    </div>
-                    <div style="text-align:right;">
-                        <div style="font-size:18px;font-weight:bold;color:${barColor}">${fill}%</div>
-                        <div style="font-size:11px;">${status}</div>
-                    </div>
-                </div>
-                <div class="fill-bar-bg">
-                    <div class="fill-bar" style="width:${fill}%;background:${barColor};"></div>
-                </div>
-                <div class="fill-info">
-                    <span>Last updated: ${bin.last_updated || 'N/A'}</span>
-                    <span>Bin ID: ${bin.id}</span>
-                </div>
-            </div>`;
+function updateBinCard(bin) {
+    const card = document.getElementById(`bin-card-${bin.id}`);
+    if (!card) return;
+    const fill = bin.fill_level;
+    card.className = 'bin-card ' + (fill >= 80 ? 'critical' : fill >= 60 ? 'high' : '');
+    card.innerHTML = binCardHtml(bin);
+}
 
-        // Populate bin select
-        const opt = document.createElement('option');
-        opt.value = bin.id;
-        opt.text = `${bin.name} — ${bin.location}`;
-        select.appendChild(opt);
-    });
+function updateStats() {
+    const bins = Object.values(binState);
+    const critical = bins.filter(bin => bin.fill_level >= 80).length;
+    const totalFill = bins.reduce((sum, bin) => sum + bin.fill_level, 0);
 
-    document.getElementById('bin-list').innerHTML = html;
+    document.getElementById('total-bins').textContent = bins.length;
     document.getElementById('critical-bins').textContent = critical;
-    document.getElementById('avg-fill').textContent = Math.round(totalFill / bins.length) + '%';
+    document.getElementById('avg-fill').textContent = bins.length ? Math.round(totalFill / bins.length) + '%' : '—';
     document.getElementById('last-updated').textContent = 'Updated: ' + new Date().toLocaleTimeString();
+}
 
-    // Update map markers
-    updateMapMarkers(bins);
+// ─── LIVE UPDATES ───
+function applyChanges(changes) {
+    if (loading) {
+        // A full reload is in flight; apply on top of its result
+        loading.then(() => applyChanges(changes));
+        return;
+    }
+    if (changes.some(change => !(change.id in binState))) {
+        loadBins();
+        return;
+    }
+
+    const changed = changes.map(change => {
+        const bin = binState[change.id];
+        bin.fill_level = change.fill_level;
+        bin.last_updated = change.last_updated;
+        updateBinCard(bin);
+        return bin;
+    });
+
+    updateStats();
+    updateMapMarkers(changed);
+}
+
+let polling = null;
+
+function startPolling() {
+    if (polling) return;
+    loadBins();
+    polling = setInterval(loadBins, 30000);
+}
+
+// Consecutive stream errors before giving up on it and polling instead
+const STREAM_MAX_ERRORS = 3;
+
+function connectStream() {
+    // The first render never waits on the stream
+    loadBins();
+    if (!window.EventSource) { startPolling(); return; }
+
+    // hello: fresh subscription, reset: too far behind to backfill; both reload everything
+    const source = new EventSource('/api/stream');
+    let errors = 0;
+    source.onopen = () => { errors = 0; };
+    source.addEventListener('hello', loadBins);
+    source.addEventListener('reset', loadBins);
+    source.addEventListener('bins', e => { errors = 0; applyChanges(JSON.parse(e.data)); });
+    source.onerror = () => {
+        // Dropped connections retry with Last-Event-ID on their own; a stream
+        // that keeps failing (e.g. a proxy that buffers it) or is CLOSED is abandoned
+        errors += 1;
+        if (source.readyState === EventSource.CLOSED || errors >= STREAM_MAX_ERRORS) {
+            source.close();
+            startPolling();
+        }
+    };
 }
 
 // ─── IMAGE PREVIEW ───
@@ -144,6 +232,5 @@ async function optimizeRoute() {
     summary.innerHTML = `✅ ${data.total_bins_in_route} bins | Total distance: ${data.total_distance_km} km`;
 }
 
-// ─── AUTO REFRESH EVERY 30 SECONDS ───
-loadBins();
-setInterval(loadBins, 30000);
\ No newline at end of file
+// ─── LIVE STREAM, POLLING EVERY 30 SECONDS AS FALLBACK ───
+connectStream();
\ No newline at end of file
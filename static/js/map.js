@@ -22,28 +22,46 @@ function createBinIcon(fill) {
     });
 }
 
-function updateMapMarkers(bins) {
-    // Clear old markers
-    Object.values(markers).forEach(m => map.removeLayer(m));
-    markers = {};
+function binPopupHtml(bin) {
+    const fill = bin.fill_level;
+    const status = fill >= 80 ? '🔴 CRITICAL' : fill >= 60 ? '🟡 HIGH' : '🟢 NORMAL';
+    return `
+        <b>${bin.name}</b><br>
+        ${bin.location}<br>
+        Fill: <b>${fill}%</b><br>
+        Status: ${status}
+    `;
+}
 
-    bins.forEach(bin => {
-        const fill = bin.fill_level;
-        const status = fill >= 80 ? '🔴 CRITICAL' : fill >= 60 ? '🟡 HIGH' : '🟢 NORMAL';
+function updateMapMarkers(bins, complete = false) {
+    // Markers are updated in place; with complete=true, bins not listed are removed
+    const seen = new Set();
 
-        const marker = L.marker([bin.latitude, bin.longitude], {
-            icon: createBinIcon(fill)
+    bins.forEach(bin => {
+        seen.add(String(bin.id));
+        const marker = markers[bin.id];
+        if (marker) {
+            // Stream changes carry no coordinates; full reloads do and may move a bin
+            if (bin.latitude != null && bin.longitude != null) {
+                marker.setLatLng([bin.latitude, bin.longitude]);
+            }
+            marker.setIcon(createBinIcon(bin.fill_level));
+            marker.setPopupContent(binPopupHtml(bin));
+            return;
+        }
+        markers[bin.id] = L.marker([bin.latitude, bin.longitude], {
+            icon: createBinIcon(bin.fill_level)
         })
         .addTo(map)
-        .bindPopup(`
-            <b>${bin.name}</b><br>
-            ${bin.location}<br>
-            Fill: <b>${fill}%</b><br>
-            Status: ${status}
-        `);
-
-        markers[bin.id] = marker;
+        .bindPopup(binPopupHtml(bin));
     });
+
+    if (complete) {
+        Object.keys(markers).filter(id => !seen.has(id)).forEach(id => {
+            map.removeLayer(markers[id]);
+            delete markers[id];
+        });
+    }
 }
 
 function drawRoute(route) {
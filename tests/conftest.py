@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# Modules live at the repo root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def temp_db(tmp_path, monkeypatch):
+    """
+    Points database.py at a throwaway file for the test
+    """
+    import database
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "waste.db"))
+    database.init_db()
+    yield database
+    database.close_connection()
@@ -0,0 +1,109 @@
+import time
+
+import pytest
+
+import config
+from alerts import AlertDispatcher, FakeTransport, TokenBucket
+
+
+def test_rate_limited_recipient_does_not_block_others(temp_db, monkeypatch):
+    monkeypatch.setattr(config, "ALERT_RATE_PER_MINUTE", 60)
+    monkeypatch.setattr(config, "ALERT_BURST", 1)
+    transport = FakeTransport()
+    dispatcher = AlertDispatcher(transport=transport, workers=1)
+
+    for i in range(3):
+        dispatcher.enqueue_message("+100", f"busy {i}", [(1, "busy")])
+    dispatcher.enqueue_message("+200", "other", [(2, "other")])
+
+    deadline = time.monotonic() + 0.5
+    while len(transport.sent) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [m["body"] for m in transport.sent] == ["busy 0", "other"]
+
+    dispatcher.drain(5)
+    assert [m["body"] for m in transport.sent][2:] == ["busy 1", "busy 2"]
+
+
+def test_retries_are_rescheduled_not_slept(temp_db, monkeypatch):
+    monkeypatch.setattr(config, "ALERT_RETRY_BASE_SECONDS", 0.01)
+    transport = FakeTransport(fail_first=2)
+    dispatcher = AlertDispatcher(transport=transport, workers=1)
+    dispatcher.enqueue_message("+100", "hello", [(1, "hello")])
+    dispatcher.drain(5)
+    assert len(transport.sent) == 1
+    assert dispatcher.stats["retries"] == 2
+    assert dispatcher.stats["logged"] == 1
+
+
+def test_zero_rate_means_no_limit():
+    bucket = TokenBucket(0, 0)
+    assert [bucket.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+
+
+class RecordingDispatcher:
+    def __init__(self):
+        self.messages = []
+
+    def enqueue_message(self, to, body, log_rows):
+        self.messages.append((to, body, [bin_id for bin_id, _ in log_rows]))
+        return True
+
+
+@pytest.fixture
+def policy(temp_db, monkeypatch):
+    from alerts import AlertPolicy
+    monkeypatch.setattr(config, "ALERT_SUPPRESS_MINUTES", 30)
+    monkeypatch.setattr(config, "ALERT_DIGEST_SECONDS", 3600)
+    monkeypatch.setattr(config, "DRIVER_PHONE_NUMBER", "+100")
+    monkeypatch.setattr(config, "DRIVER_ASSIGNMENTS", {"+200": [3]})
+    policy = AlertPolicy(RecordingDispatcher())
+    yield policy
+    policy.flush()
+
+
+def test_bin_is_suppressed_within_the_window(policy):
+    assert policy.submit(1, "Bin 1", "A", 90)
+    assert not policy.submit(1, "Bin 1", "A", 95)
+    assert policy.submit(1, "Bin 1", "A", 95, force=True)
+    assert policy.stats["suppressed"] == 1
+
+
+def test_window_expires(policy, monkeypatch):
+    assert policy.submit(1, "Bin 1", "A", 90)
+    monkeypatch.setattr(config, "ALERT_SUPPRESS_MINUTES", 0)
+    assert policy.submit(1, "Bin 1", "A", 90)
+
+
+def test_alerts_logged_by_other_workers_suppress(policy, temp_db, monkeypatch):
+    assert policy.submit(1, "Bin 1", "A", 90)
+    temp_db.log_alerts([(2, "sent by another worker", None)])
+    monkeypatch.setattr(config, "ALERT_RESEED_SECONDS", 0)
+    assert not policy.submit(2, "Bin 2", "B", 90)
+
+
+def test_digest_per_driver_most_urgent_first(policy):
+    policy.submit(1, "Bin 1", "A", 95, hours_to_overflow=5.0)
+    policy.submit(2, "Bin 2", "B", 85, hours_to_overflow=1.0)
+    policy.submit(4, "Bin 4", "D", 99)
+    policy.submit(3, "Bin 3", "C", 90)
+    policy.flush()
+
+    sent = {to: bin_ids for to, _, bin_ids in policy.dispatcher.messages}
+    assert sent == {"+100": [2, 1, 4], "+200": [3]}
+    assert policy.stats["digests"] == 2
+
+
+def test_check_and_alert_orders_by_overflow_time(policy, temp_db, monkeypatch):
+    import alerts
+    monkeypatch.setattr(alerts, "policy", policy)
+    # Bin 1 is fuller but fills slowly; bin 2 will overflow first
+    temp_db.ingest_readings([
+        (1, 94.0, "2026-01-01 00:00:00"), (1, 95.0, "2026-01-01 01:00:00"),
+        (2, 70.0, "2026-01-01 00:00:00"), (2, 85.0, "2026-01-01 01:00:00"),
+    ])
+    bins = [b for b in temp_db.get_all_bins() if b[0] in (1, 2)]
+    alerts.check_and_alert(bins, force=True)
+    ((_, body, bin_ids),) = policy.dispatcher.messages
+    assert bin_ids == [2, 1]
+    assert "overflow in 1.0h" in body
@@ -0,0 +1,61 @@
+import detector
+from detect_cache import ResultCache
+
+
+def test_entry_limit_evicts_least_recently_used():
+    cache = ResultCache(max_entries=2, max_bytes=10_000)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    assert cache.evictions == 1
+
+
+def test_byte_limit_evicts_and_skips_oversized_results():
+    # Each entry is 1 + 12 bytes: two fit, a third pushes the oldest out
+    cache = ResultCache(max_entries=100, max_bytes=30)
+    cache.put("a", "x" * 10)
+    cache.put("b", "y" * 10)
+    cache.put("c", "z" * 10)
+    stats = cache.stats()
+    assert stats["bytes"] == 26
+    assert cache.get("a") is None and cache.get("c") == "z" * 10
+
+    cache.put("huge", "w" * 100)
+    assert cache.get("huge") is None
+    assert cache.get("c") == "z" * 10
+
+
+def test_replacing_a_key_keeps_the_byte_count_right():
+    cache = ResultCache(max_entries=10, max_bytes=1000)
+    cache.put("a", "x" * 10)
+    cache.put("a", "x" * 20)
+    assert cache.stats()["entries"] == 1
+    assert cache.stats()["bytes"] == len("a") + len('"' + "x" * 20 + '"')
+
+
+def test_disk_tier_survives_a_new_cache(temp_db):
+    ResultCache(max_entries=10, max_bytes=1000, persist=True).put("k", {"fill_level": 42})
+    fresh = ResultCache(max_entries=10, max_bytes=1000, persist=True)
+    assert fresh.get("k") == {"fill_level": 42}
+    assert (fresh.disk_hits, fresh.hits) == (1, 0)
+    assert fresh.get("k") == {"fill_level": 42}
+    assert fresh.hits == 1
+
+
+def test_key_changes_with_detector_version_and_decode_flag(monkeypatch):
+    image = b"same bytes"
+    key = detector._cache_key(image)
+    assert key.startswith(detector.DETECTOR_VERSION + ":")
+
+    # Flipping the decode flag gives a new version; the same settings give the same one
+    fast = detector._detector_version(True)
+    assert detector._detector_version(False) != fast
+    assert detector._detector_version(True) == fast
+
+    monkeypatch.setattr(detector, "DETECTOR_VERSION", "other")
+    assert detector._cache_key(image) != key
+    monkeypatch.setattr(detector, "EDGE_WEIGHT", 0.31)
+    assert detector._detector_version(True) != fast
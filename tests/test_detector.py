@@ -0,0 +1,192 @@
+import cv2
+import numpy as np
+import pytest
+
+import config
+import detector
+
+
+# ─────────────────────────────────────────
+# FIXED IMAGE SET
+# ─────────────────────────────────────────
+def _bin_image(width, height, fill, color, noise=0, seed=0):
+    """
+    Light background with the bottom `fill` share painted in `color` (BGR)
+    """
+    rng = np.random.RandomState(seed)
+    img = np.full((height, width, 3), 230, np.uint8)
+    img[int(height * (1 - fill)):, :] = color
+    if noise:
+        img = np.clip(img.astype(np.int16) + rng.randint(-noise, noise + 1, img.shape), 0, 255).astype(np.uint8)
+    return img
+
+
+def _encode(img, ext):
+    ok, buf = cv2.imencode(ext, img)
+    assert ok
+    return buf.tobytes()
+
+
+# Kept under 800 px on the short side so every image takes the full-resolution decode
+IMAGES = {
+    "empty_png": _encode(_bin_image(300, 400, 0.0, (230, 230, 230)), ".png"),
+    "quarter_dark_png": _encode(_bin_image(300, 400, 0.25, (20, 20, 20)), ".png"),
+    "half_brown_jpg": _encode(_bin_image(480, 640, 0.5, (40, 90, 140)), ".jpg"),
+    "full_green_jpg": _encode(_bin_image(360, 480, 1.0, (40, 140, 60)), ".jpg"),
+    "noisy_jpg": _encode(_bin_image(600, 700, 0.6, (30, 60, 90), noise=40, seed=3), ".jpg"),
+    "random_png": _encode(np.random.RandomState(7).randint(0, 256, (420, 320, 3), np.uint8), ".png"),
+}
+
+
+def _reference_fill_level(image_bytes):
+    """
+    The original per-row scan, kept as the reference the optimized detector must match
+    """
+    img = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return 0
+    img = cv2.resize(img, (300, 400))
+    height, width = img.shape[:2]
+
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    dark_mask = cv2.inRange(hsv, np.array([0, 0, 0]), np.array([180, 255, 100]))
+    waste_mask = cv2.inRange(hsv, np.array([10, 30, 30]), np.array([80, 255, 200]))
+    combined_mask = cv2.bitwise_or(dark_mask, waste_mask)
+
+    fill_rows = 0
+    for row in range(height - 1, -1, -1):
+        if np.sum(combined_mask[row, :]) > width * 0.3 * 255:
+            fill_rows += 1
+        else:
+            break
+    fill_percentage = (fill_rows / height) * 100
+
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    edges = cv2.Canny(gray, 50, 150)
+    edge_density = np.sum(edges) / (height * width * 255)
+    return round(min(100, (fill_percentage * 0.7) + (edge_density * 100 * 0.3)), 2)
+
+
+# ─────────────────────────────────────────
+# TESTS
+# ─────────────────────────────────────────
+@pytest.mark.parametrize("name", sorted(IMAGES))
+def test_single_image_matches_reference(name):
+    assert detector.detect_fill_level(IMAGES[name]) == _reference_fill_level(IMAGES[name])
+
+
+def test_fixed_set_spans_fill_range():
+    levels = {name: detector.detect_fill_level(data) for name, data in IMAGES.items()}
+    assert levels["empty_png"] < 5
+    assert levels["quarter_dark_png"] < levels["half_brown_jpg"] < levels["full_green_jpg"]
+    assert levels["full_green_jpg"] >= 70
+
+
+def test_batch_matches_analyze_bin_image(temp_db):
+    names = sorted(IMAGES)
+    batch = detector.detect_fill_levels([IMAGES[name] for name in names])
+    single = [detector.analyze_bin_image(IMAGES[name])["fill_level"] for name in names]
+    assert batch == single
+
+
+def test_batch_through_process_pool(temp_db, monkeypatch):
+    monkeypatch.setattr(config, "DETECT_POOL_MIN_BATCH", 2)
+    monkeypatch.setattr(config, "DETECT_POOL_WORKERS", 2)
+    monkeypatch.setattr(detector, "_decode_pool", None)
+    names = sorted(IMAGES)
+    try:
+        batch = detector.detect_fill_levels([IMAGES[name] for name in names])
+    finally:
+        if detector._decode_pool is not None:
+            detector._decode_pool.shutdown()
+            detector._decode_pool = None
+    assert batch == [_reference_fill_level(IMAGES[name]) for name in names]
+
+
+def test_unreadable_image_scores_zero():
+    images = [b"not an image", IMAGES["half_brown_jpg"]]
+    assert detector.detect_fill_levels(images) == [0, detector.detect_fill_level(IMAGES["half_brown_jpg"])]
+
+
+# ─────────────────────────────────────────
+# JPEG HEADER + REDUCED-RESOLUTION DECODE
+# ─────────────────────────────────────────
+def _with_exif(jpeg):
+    # APP1/Exif segment (plus fill bytes) between SOI and the rest, as cameras write it
+    exif = b"Exif\x00\x00" + bytes(200)
+    return jpeg[:2] + b"\xff\xe1" + (len(exif) + 2).to_bytes(2, "big") + exif + b"\xff\xff" + jpeg[2:]
+
+
+@pytest.mark.parametrize("progressive", [0, 1])
+def test_jpeg_header_size(progressive):
+    jpeg = cv2.imencode(".jpg", _bin_image(333, 222, 0.5, (20, 20, 20)),
+                        [cv2.IMWRITE_JPEG_PROGRESSIVE, progressive])[1].tobytes()
+    sof = b"\xff\xc2" if progressive else b"\xff\xc0"
+    assert sof in jpeg
+    assert detector.read_image_size(jpeg) == (333, 222)
+    assert detector.read_image_size(_with_exif(jpeg)) == (333, 222)
+
+
+def test_image_header_edge_cases():
+    assert detector.read_image_size(IMAGES["empty_png"]) == (300, 400)
+    assert detector.read_image_size(IMAGES["half_brown_jpg"][:20]) is None
+    assert detector.read_image_size(b"\xff\xd8garbage") is None
+    assert detector.read_image_size(b"GIF89a") is None
+
+
+@pytest.mark.parametrize("short_side, flag", [
+    (3200, "IMREAD_REDUCED_COLOR_8"),
+    (3199, "IMREAD_REDUCED_COLOR_4"),
+    (1600, "IMREAD_REDUCED_COLOR_4"),
+    (1599, "IMREAD_REDUCED_COLOR_2"),
+    (800, "IMREAD_REDUCED_COLOR_2"),
+    (799, "IMREAD_COLOR"),
+])
+def test_reduced_decode_flag_by_size(short_side, flag):
+    # The short side decides, so a rotated (portrait) photo still covers the frame
+    jpeg = IMAGES["half_brown_jpg"]
+    assert detector._decode_flag(jpeg, (short_side, 5000)) == getattr(cv2, flag)
+    assert detector._decode_flag(jpeg, (5000, short_side)) == getattr(cv2, flag)
+
+
+def test_reduced_decode_only_for_jpeg_when_enabled(monkeypatch):
+    assert detector._decode_flag(IMAGES["empty_png"], (4000, 4000)) == cv2.IMREAD_COLOR
+    assert detector._decode_flag(IMAGES["half_brown_jpg"], None) == cv2.IMREAD_COLOR
+    monkeypatch.setattr(config, "DETECT_FAST_DECODE", False)
+    assert detector._decode_flag(IMAGES["half_brown_jpg"], (4000, 4000)) == cv2.IMREAD_COLOR
+
+
+@pytest.mark.parametrize("width, height", [(1700, 2200), (3300, 3300)])
+def test_reduced_decode_scores_close_to_full_decode(width, height):
+    jpeg = _encode(_bin_image(width, height, 0.5, (40, 90, 140), noise=10, seed=1), ".jpg")
+    assert detector._decode_flag(jpeg, detector.read_image_size(jpeg)) != cv2.IMREAD_COLOR
+    assert detector.detect_fill_level(jpeg) == pytest.approx(_reference_fill_level(jpeg), abs=2)
+
+
+# ─────────────────────────────────────────
+# UPLOAD CAPS
+# ─────────────────────────────────────────
+def test_caps_raise_image_too_large(monkeypatch):
+    jpeg = IMAGES["half_brown_jpg"]
+    monkeypatch.setattr(config, "DETECT_MAX_UPLOAD_BYTES", len(jpeg) - 1)
+    with pytest.raises(detector.ImageTooLarge):
+        detector.detect_fill_level(jpeg)
+
+    monkeypatch.setattr(config, "DETECT_MAX_UPLOAD_BYTES", len(jpeg))
+    monkeypatch.setattr(config, "DETECT_MAX_PIXELS", 480 * 640 - 1)
+    with pytest.raises(detector.ImageTooLarge):
+        detector.detect_fill_level(jpeg)
+
+
+def test_detect_endpoint_answers_413(temp_db, monkeypatch):
+    import io
+    monkeypatch.setattr(config, "START_BACKGROUND_ON_IMPORT", False)
+    import app
+    monkeypatch.setattr(config, "DETECT_MAX_PIXELS", 1000)
+    # Not one of IMAGES: a result cached by an earlier test would skip the caps
+    jpeg = _encode(_bin_image(120, 90, 0.5, (20, 20, 20)), ".jpg")
+    response = app.app.test_client().post("/api/detect", data={
+        "bin_id": "1", "image": (io.BytesIO(jpeg), "bin.jpg")
+    })
+    assert response.status_code == 413
+    assert "pixels" in response.get_json()["error"]
@@ -0,0 +1,86 @@
+import pytest
+
+from estimator import FillEstimate, update_estimate
+
+
+def test_first_reading_has_no_rate():
+    state = update_estimate(None, 40.0, 1000.0)
+    assert (state.level, state.rate, state.last_ts) == (40.0, None, 1000.0)
+
+
+def test_rate_from_two_readings():
+    state = update_estimate(update_estimate(None, 40.0, 0.0), 50.0, 3600.0)
+    assert state.rate == pytest.approx(10.0)
+    assert state.samples == 1
+
+
+def test_sub_interval_reading_updates_level():
+    state = FillEstimate(50.0, 4.0, 1000.0, 3)
+    state = update_estimate(state, 60.0, 1000.0)
+    assert (state.level, state.rate, state.samples) == (60.0, 4.0, 3)
+
+
+def test_late_reading_updates_level_only():
+    state = FillEstimate(50.0, 4.0, 1000.0, 3)
+    state = update_estimate(state, 55.0, 500.0)
+    assert (state.level, state.rate, state.last_ts, state.samples) == (55.0, 4.0, 1000.0, 3)
+
+
+def test_emptying_restarts_rate():
+    state = update_estimate(FillEstimate(90.0, 5.0, 0.0, 4), 5.0, 3600.0)
+    assert (state.level, state.rate, state.samples) == (5.0, None, 0)
+
+
+def test_batch_ingest_keeps_latest_level(temp_db):
+    import time
+    from predictor import predict_all_bins
+    hours_ago = lambda h: time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - h * 3600))
+    temp_db.ingest_readings([(2, 40.0, hours_ago(2)), (2, 45.0, hours_ago(1))])
+    temp_db.ingest_readings([(2, 50.0, None), (2, 60.0, None), (2, 70.0, None)])
+    bin_2 = next(p for p in predict_all_bins([2]) if p["bin_id"] == 2)
+    assert bin_2["current_fill"] == 70.0
+
+
+def test_batch_ingest_uses_reading_timestamps(temp_db):
+    temp_db.ingest_readings([
+        (3, 40.0, "2026-01-01 00:00:00"),
+        (3, 50.0, "2026-01-01 01:00:00"),
+    ])
+    estimate = temp_db.get_estimates([3])[3]
+    assert estimate.level == 50.0
+    assert estimate.rate == pytest.approx(10.0)
+
+
+def test_pipeline_then_api_readings_keep_updating(temp_db, monkeypatch):
+    # Source timestamps and the CURRENT_TIMESTAMP default must share a clock,
+    # whatever the host's time zone is
+    import time
+    from sensor_sources import SyntheticSource
+    monkeypatch.setenv("TZ", "Asia/Kolkata")
+    time.tzset()
+    try:
+        reading = next(iter(SyntheticSource(interval=0, rounds=1, seed=1)))
+        temp_db.ingest_readings([(reading.bin_id, reading.fill_level, reading.timestamp)])
+        temp_db.ingest_readings([(reading.bin_id, 95.0, None)])
+        estimate = temp_db.get_estimates([reading.bin_id])[reading.bin_id]
+        assert estimate.level == 95.0
+        assert abs(estimate.last_ts - time.time()) < 60
+    finally:
+        monkeypatch.delenv("TZ")
+        time.tzset()
+
+
+def test_bin_without_rate_falls_back_to_history(temp_db):
+    import time
+    from predictor import predict_all_bins
+    conn = temp_db.get_connection()
+    conn.executemany(
+        "INSERT INTO fill_history (bin_id, fill_level, recorded_at) VALUES (4, ?, ?)",
+        [(40.0, "2026-01-01 00:00:00"), (50.0, "2026-01-01 01:00:00")]
+    )
+    # First reading after a deploy: an estimate exists but has no rate yet
+    conn.execute(
+        "INSERT INTO fill_estimates (bin_id, level, rate, last_ts, samples) VALUES (4, 50.0, NULL, ?, 0)",
+        (time.time(),)
+    )
+    assert predict_all_bins([4])[0]["fill_rate_per_hour"] == pytest.approx(10.0, abs=0.01)
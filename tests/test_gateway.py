@@ -0,0 +1,46 @@
+from gateway import Coalescer
+
+
+def test_array_items_that_are_not_readings_are_rejected():
+    buffer = Coalescer()
+    assert buffer.add_lines([5]) == (0, 1)
+    assert buffer.add_lines([{"bin_id": 1, "fill_level": 50}, None, [1]]) == (1, 2)
+    assert list(buffer.pending) == [1]
+
+
+def test_blank_lines_are_not_rejections():
+    buffer = Coalescer()
+    assert buffer.add_lines([b"1,20", b"", b"  ", b"oops"]) == (1, 1)
+
+
+def test_readings_for_one_bin_coalesce():
+    buffer = Coalescer()
+    buffer.add_lines(['{"bin_id": 2, "fill_level": 10}', '{"bin_id": 2, "fill_level": 30}'])
+    (reading,) = buffer.take()
+    assert reading.fill_level == 30
+    assert buffer.stats["coalesced"] == 1
+
+
+def _backfill(since, until):
+    import asyncio
+    from concurrent.futures import ThreadPoolExecutor
+    from gateway import ChangeStream
+    stream = ChangeStream(ThreadPoolExecutor(max_workers=1))
+    try:
+        return asyncio.run(stream.backfill(since, until))
+    finally:
+        stream.shutdown()
+
+
+def test_backfill_replays_missed_changes(temp_db):
+    temp_db.ingest_readings([(1, 11.0), (2, 22.0)])
+    _, newest = temp_db.get_change_bounds()
+    (event,) = _backfill(newest - 1, newest)
+    assert b'"fill_level": 22.0' in event
+    assert _backfill(newest, newest) == []
+
+
+def test_client_ahead_of_the_log_gets_a_reset(temp_db):
+    temp_db.ingest_readings([(1, 11.0)])
+    _, newest = temp_db.get_change_bounds()
+    assert _backfill(newest + 50, newest) is None
@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+import config
+from jobs import DONE, JobManager, JobQueueFull, UnknownJobType
+
+
+release = threading.Event()
+
+
+@pytest.fixture
+def manager(temp_db):
+    manager = JobManager(max_workers=4, ttl_seconds=60, max_pending=3)
+    yield manager
+    release.set()
+    if manager._executor is not None:
+        manager._executor.shutdown(wait=True)
+
+
+def _blocking(value):
+    release.wait(5)
+    return value
+
+
+@pytest.fixture(autouse=True)
+def _reset_release():
+    release.clear()
+    yield
+    release.set()
+
+
+def _wait_running(manager, job_type, n):
+    deadline = time.monotonic() + 2
+    while manager.stats()[job_type]["running"] < n and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_per_type_limit_queues_extra_jobs(manager):
+    manager.register("slow", _blocking, limit=1)
+    first, _ = manager.submit("slow", 1)
+    second, _ = manager.submit("slow", 2)
+    _wait_running(manager, "slow", 1)
+    assert manager.stats()["slow"] == {"running": 1, "queued": 1, "limit": 1}
+
+    release.set()
+    assert manager.wait(second.id, 2).result == 2
+    assert first.status == second.status == DONE
+
+
+def test_identical_submissions_share_a_job(manager):
+    manager.register("slow", _blocking)
+    job, deduplicated = manager.submit("slow", 1, key="same")
+    again, deduplicated_again = manager.submit("slow", 1, key="same")
+    assert (deduplicated, deduplicated_again) == (False, True)
+    assert again is job
+
+    release.set()
+    manager.wait(job.id, 2)
+    fresh, deduplicated = manager.submit("slow", 1, key="same")
+    assert fresh is not job and not deduplicated
+
+
+def test_pending_cap_and_own_budget(manager):
+    manager.register("slow", _blocking)
+    manager.register("internal", _blocking, max_pending=1)
+    for i in range(3):
+        manager.submit("slow", i)
+    with pytest.raises(JobQueueFull):
+        manager.submit("slow", 99)
+
+    # A type with its own budget is counted apart from the shared cap
+    manager.submit("internal", 0)
+    with pytest.raises(JobQueueFull):
+        manager.submit("internal", 1)
+
+
+def test_unknown_type(manager):
+    with pytest.raises(UnknownJobType):
+        manager.submit("nope")
+
+
+def test_finished_jobs_expire_after_ttl(manager):
+    manager.register("fast", lambda value: value)
+    job, _ = manager.submit("fast", 7)
+    assert manager.wait(job.id, 2).result == 7
+
+    # Age it past the TTL both in memory and in the shared table
+    job.finished -= manager.ttl_seconds + 1
+    manager._save(job)
+    assert manager.get(job.id) is None
+
+
+def test_other_worker_reads_and_waits_on_the_job_row(manager, monkeypatch):
+    monkeypatch.setattr(config, "JOB_POLL_SECONDS", 0.01)
+    manager.register("slow", _blocking)
+    job, _ = manager.submit("slow", {"answer": 42})
+    _wait_running(manager, "slow", 1)
+
+    # A second manager stands in for another gunicorn worker: it only has the table
+    other = JobManager(max_workers=1, ttl_seconds=60, max_pending=3)
+    remote = other.get(job.id)
+    assert remote.fn is None and not remote.done.is_set()
+
+    threading.Timer(0.05, release.set).start()
+    remote = other.wait(job.id, 2)
+    assert remote.status == DONE
+    assert remote.result == {"answer": 42}
+
+
+def test_full_queue_answers_503(manager, monkeypatch):
+    monkeypatch.setattr(config, "START_BACKGROUND_ON_IMPORT", False)
+    import app
+    manager.register("predict", _blocking)
+    monkeypatch.setattr(app, "job_manager", manager)
+    for i in range(3):
+        manager.submit("predict", i)
+
+    response = app.app.test_client().post("/api/jobs/predict")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "5"
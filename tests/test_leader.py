@@ -0,0 +1,38 @@
+from leader import LeaderElector
+
+
+def _elector(events, healthy):
+    elector = LeaderElector(
+        "test", lambda: events.append("elected"), lambda: events.append("demoted"),
+        ttl=30, retry=1, healthy=lambda: healthy["ok"]
+    )
+    elector.holder = "worker-a"
+    return elector
+
+
+def test_leader_renews_while_work_is_alive(temp_db):
+    events, healthy = [], {"ok": True}
+    elector = _elector(events, healthy)
+    elector._tick()
+    elector._tick()
+    assert elector.is_leader
+    assert events == ["elected"]
+    assert temp_db.get_lease("test")["holder"] == "worker-a"
+
+
+def test_leader_with_dead_work_releases_the_lease(temp_db):
+    events, healthy = [], {"ok": True}
+    elector = _elector(events, healthy)
+    elector._tick()
+
+    healthy["ok"] = False
+    elector._tick()
+    assert not elector.is_leader
+    assert events == ["elected", "demoted"]
+    assert temp_db.get_lease("test") is None
+
+    # Another candidate can take over straight away
+    other = LeaderElector("test", lambda: None, lambda: None, ttl=30, retry=1)
+    other.holder = "worker-b"
+    other._tick()
+    assert other.is_leader
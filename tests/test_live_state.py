@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+import config
+from database import _deadband
+from live_state import LiveState
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LiveState(str(tmp_path / "live"))
+    store.load([(i, 28.5, 77.3, 0.0, 0.0) for i in range(1, 101)])
+    yield store
+    store.close()
+
+
+# ── seqlock ──
+def test_snapshot_waits_out_a_write_in_progress(store):
+    in_write = threading.Event()
+
+    def slow_write():
+        with store._exclusive():
+            store._header["seq"] += 1
+            store._records["fill_level"][:100] = 7.0
+            in_write.set()
+            time.sleep(0.05)
+            store._records["last_updated"][:100] = 7.0
+            store._header["seq"] += 1
+
+    writer = threading.Thread(target=slow_write)
+    writer.start()
+    in_write.wait()
+    rows = store.snapshot()
+    writer.join()
+    assert (rows["last_updated"] == 7.0).all()
+    assert int(store._header["seq"]) % 2 == 0
+
+
+def test_snapshot_repairs_a_writer_that_died_mid_update(store):
+    store._header["seq"] += 1
+    assert len(store.snapshot()) == 100
+    assert int(store._header["seq"]) % 2 == 0
+
+
+def test_readers_never_see_a_torn_update(store, tmp_path):
+    stop = threading.Event()
+
+    def write():
+        value = 0.0
+        while not stop.is_set():
+            value += 1
+            store.update([(i, value, value) for i in range(1, 101)])
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        # A second handle maps the same file, like another process would
+        reader = LiveState(str(tmp_path / "live"))
+        for _ in range(500):
+            rows = reader.snapshot()
+            assert len(set(rows["fill_level"].tolist())) == 1
+            assert (rows["fill_level"] == rows["last_updated"]).all()
+        reader.close()
+    finally:
+        stop.set()
+        writer.join()
+
+
+# ── version (ETag) ──
+def test_version_changes_on_every_write(store):
+    seen = {store.version()}
+    store.update([(1, 50.0, 1.0)])
+    seen.add(store.version())
+    store.bump_version()
+    seen.add(store.version())
+    store.load([(1, 28.5, 77.3, 0.0, 0.0)])
+    seen.add(store.version())
+    assert len(seen) == 4
+
+
+def test_rebuilt_file_never_repeats_a_version(tmp_path):
+    first = LiveState(str(tmp_path / "a"))
+    second = LiveState(str(tmp_path / "b"))
+    assert first.version() != second.version()
+    first.close()
+    second.close()
+
+
+def test_update_reports_unknown_bins(store):
+    assert store.update([(1, 10.0, 1.0), (999, 10.0, 1.0)]) == [999]
+    assert store.snapshot()[0]["fill_level"] == 10.0
+
+
+# ── fill_history deadband ──
+@pytest.fixture
+def deadband(monkeypatch):
+    monkeypatch.setattr(config, "HISTORY_DEADBAND", 2.0)
+    monkeypatch.setattr(config, "HISTORY_MAX_INTERVAL_MINUTES", 30)
+    monkeypatch.setattr(config, "EMPTYING_DROP", 20.0)
+
+
+def _written(rows, watermarks, now=10_000.0):
+    history, _ = _deadband([(bin_id, level, None) for bin_id, level in rows], watermarks, now)
+    return history
+
+
+def test_first_reading_is_always_written(deadband):
+    assert _written([(1, 40.0)], {}) == [(1, 40.0)]
+
+
+def test_small_moves_inside_the_deadband_are_skipped(deadband):
+    watermarks = {1: (40.0, 9_900.0, None)}
+    assert _written([(1, 41.5)], watermarks) == []
+    assert _written([(1, 42.5)], watermarks) == [(1, 42.5)]
+
+
+def test_max_interval_forces_a_write(deadband):
+    watermarks = {1: (40.0, 10_000.0 - 30 * 60, None)}
+    assert _written([(1, 40.0)], watermarks) == [(1, 40.0)]
+
+
+def test_emptying_is_always_written(deadband):
+    # A per-bin tolerance wider than the drop would otherwise hide it
+    watermarks = {1: (90.0, 9_900.0, 50.0)}
+    assert _written([(1, 65.0)], watermarks) == [(1, 65.0)]
+    assert _written([(1, 75.0)], watermarks) == []
+
+
+def test_negative_tolerance_writes_everything(deadband):
+    watermarks = {1: (40.0, 9_900.0, -1.0)}
+    assert _written([(1, 40.0), (1, 40.0)], watermarks) == [(1, 40.0), (1, 40.0)]
+
+
+def test_readings_in_one_batch_compare_to_each_other(deadband):
+    assert _written([(1, 40.0), (1, 41.0), (1, 43.0)], {}) == [(1, 40.0), (1, 43.0)]
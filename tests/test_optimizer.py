@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+import optimizer
+from optimizer import _allocate_vehicles, calculate_distance, haversine_matrix
+
+
+def test_allocation_without_fleet_size_follows_capacity():
+    assert _allocate_vehicles([250, 30], 100, None) == [3, 1]
+
+
+@pytest.mark.parametrize("demands, total", [([100, 1, 1], 3), ([100, 50, 50], 7), ([10, 10], 2)])
+def test_allocation_uses_exactly_the_requested_fleet(demands, total):
+    shares = _allocate_vehicles(demands, 100, total)
+    assert sum(shares) == total
+    assert min(shares) >= 1
+
+
+def test_allocation_rejects_fleet_smaller_than_cluster_count():
+    with pytest.raises(ValueError):
+        _allocate_vehicles([10, 10, 10], 100, 2)
+
+
+def test_haversine_blocks_match_scalar_distance(monkeypatch):
+    # A block smaller than one row of output forces several blocks
+    monkeypatch.setattr(optimizer, "_HAVERSINE_BLOCK", 7)
+    rng = np.random.default_rng(0)
+    a = np.column_stack([28.5 + rng.random(23) * 0.2, 77.3 + rng.random(23) * 0.2])
+    b = a[:11]
+    expected = [[calculate_distance(p, q) for q in b] for p in a]
+    assert haversine_matrix(a, b).tolist() == expected
+    assert haversine_matrix(a).dtype == np.int32
+
+
+def _fleet(n, frac, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{"id": i, "name": f"Bin {i}", "latitude": 28.5 + rng.random() * 0.1,
+             "longitude": 77.3 + rng.random() * 0.1, "fill_level": 90 if rng.random() < frac else 10}
+            for i in range(n)]
+
+
+@pytest.mark.parametrize("frac", [0.2, 1.0])
+def test_cold_fast_route_never_builds_the_fleet_matrix(temp_db, monkeypatch, frac):
+    monkeypatch.setattr(optimizer, "_fleet_matrix", {"fingerprint": None, "index": None, "matrix": None})
+    monkeypatch.setattr(optimizer.config, "FAST_ROUTE_NN_MAX_NODES", 50)
+    bins = _fleet(300, frac)
+    result = optimizer.fast_route(bins, refine=False)
+    assert result["status"] == "SUCCESS"
+    assert len(result["route"]) == result["total_bins_in_route"] + 2
+    assert optimizer._fleet_matrix["fingerprint"] is None
+
+
+def test_nearest_neighbour_stops_at_the_deadline():
+    from route_heuristics import nearest_neighbour
+    matrix = haversine_matrix(np.random.default_rng(1).random((20, 2)))
+    assert nearest_neighbour(matrix, list(range(20)), deadline=0) == list(range(20))
+    assert sorted(nearest_neighbour(matrix, list(range(20)))) == list(range(20))
@@ -0,0 +1,162 @@
+import argparse
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+import config
+from database import update_fill_level
+from detector import score_frame
+
+
+# ─────────────────────────────────────────
+# CAMERA FEED
+# ─────────────────────────────────────────
+class CameraFeed:
+    """
+    One fixed camera pointed at one bin
+    source = local video file path, device index or stream URL
+    """
+
+    def __init__(self, bin_id, source, frame_skip=None, window=None,
+                 min_change=None, queue_size=None, loop=False):
+        self.bin_id = bin_id
+        self.source = source
+        self.frame_skip = config.VIDEO_FRAME_SKIP if frame_skip is None else frame_skip
+        self.min_change = config.VIDEO_MIN_CHANGE if min_change is None else min_change
+        self.loop = loop
+
+        self.levels = deque(maxlen=window or config.VIDEO_SMOOTHING_WINDOW)
+        self.last_written = None
+
+        # Frames in flight for this camera; a full slot set drops new frames
+        self.slots = threading.BoundedSemaphore(queue_size or config.VIDEO_QUEUE_SIZE)
+        self.lock = threading.Lock()
+
+        self.frames_read = 0
+        self.frames_scored = 0
+        self.frames_dropped = 0
+        self.updates_written = 0
+
+    def record(self, fill_level):
+        """
+        Adds a frame score to the window, writes the smoothed level
+        to the database when it moved by more than min_change
+        """
+        with self.lock:
+            self.frames_scored += 1
+            self.levels.append(fill_level)
+            smoothed = round(sum(self.levels) / len(self.levels), 2)
+
+            if self.last_written is not None and abs(smoothed - self.last_written) <= self.min_change:
+                return None
+            self.last_written = smoothed
+            self.updates_written += 1
+
+        update_fill_level(self.bin_id, smoothed)
+        print(f"[Camera] Bin {self.bin_id} | {smoothed}% (window of {len(self.levels)})")
+        return smoothed
+
+    def stats(self):
+        return {
+            "bin_id": self.bin_id,
+            "source": str(self.source),
+            "frames_read": self.frames_read,
+            "frames_scored": self.frames_scored,
+            "frames_dropped": self.frames_dropped,
+            "updates_written": self.updates_written,
+            "last_written": self.last_written
+        }
+
+
+# ─────────────────────────────────────────
+# FRAME READER + SCORING POOL
+# ─────────────────────────────────────────
+def _score(feed, frame):
+    try:
+        feed.record(score_frame(frame))
+    except Exception as e:
+        print(f"[Camera Error] Bin {feed.bin_id}: {e}")
+    finally:
+        feed.slots.release()
+
+
+def _read_camera(feed, pool, stop_event):
+    cap = cv2.VideoCapture(feed.source)
+    if not cap.isOpened():
+        print(f"[Camera Error] Cannot open {feed.source} for Bin {feed.bin_id}")
+        return
+
+    print(f"[Camera] Reading {feed.source} for Bin {feed.bin_id}")
+    position = 0
+    while not stop_event.is_set():
+        # grab() only demuxes; skipped frames are never decoded
+        if not cap.grab():
+            if feed.loop:
+                cap.release()
+                cap = cv2.VideoCapture(feed.source)
+                continue
+            break
+
+        position += 1
+        if (position - 1) % (feed.frame_skip + 1):
+            continue
+
+        ok, frame = cap.retrieve()
+        if not ok:
+            continue
+        feed.frames_read += 1
+
+        if not feed.slots.acquire(blocking=False):
+            feed.frames_dropped += 1
+            continue
+        pool.submit(_score, feed, frame)
+
+    cap.release()
+    print(f"[Camera] Stopped Bin {feed.bin_id}: {feed.stats()}")
+
+
+def run_cameras(feeds, workers=None, stop_event=None):
+    """
+    Reads every feed on its own thread and scores frames in a shared pool
+    Blocks until all finite sources are exhausted or stop_event is set
+    """
+    stop_event = stop_event or threading.Event()
+    pool = ThreadPoolExecutor(max_workers=workers or config.VIDEO_WORKERS)
+
+    readers = []
+    for feed in feeds:
+        thread = threading.Thread(target=_read_camera, args=(feed, pool, stop_event), daemon=True)
+        thread.start()
+        readers.append(thread)
+
+    try:
+        while any(thread.is_alive() for thread in readers):
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        stop_event.set()
+    finally:
+        pool.shutdown(wait=True)
+
+    return [feed.stats() for feed in feeds]
+
+
+def _parse_feed(spec, loop):
+    bin_id, _, source = spec.partition("=")
+    if not source:
+        raise argparse.ArgumentTypeError(f"Expected BIN_ID=SOURCE, got {spec}")
+    # A bare number is a local capture device
+    return CameraFeed(int(bin_id), int(source) if source.isdigit() else source, loop=loop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Score bin camera feeds")
+    parser.add_argument("feeds", nargs="+", help="BIN_ID=SOURCE, e.g. 3=cam3.mp4")
+    parser.add_argument("--loop", action="store_true", help="Restart file sources at the end")
+    args = parser.parse_args()
+
+    results = run_cameras([_parse_feed(spec, args.loop) for spec in args.feeds])
+    for stats in results:
+        print(stats)